@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""校验计算基准
+
+比较 hashlib.md5 与 CRC64-ECMA （当前实现和纯 Python 实现）分块计算大文件校验的吞吐量
+
+用法：
+
+    python benchmarks/checksum.py [文件大小（ MiB ）]
+
+"""
+
+import os
+import sys
+import tempfile
+import time
+from hashlib import md5
+from typing import Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.crc64 import crc64, crc64_combine, crc64_impl, crc64_python
+
+
+# 与 FileManager 默认的读缓冲区大小一致
+chunk_size: int = 1024 * 1024
+
+
+def measure(path: str, update: Callable[[bytes], None]) -> float:
+    """分块读取文件并计算校验
+
+    Args:
+        path: 文件路径
+        update: 处理每一块数据的方法
+
+    Returns:
+        吞吐量（ MiB/s ）
+
+    """
+
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            update(chunk)
+    return size / (time.perf_counter() - start) / 1024 / 1024
+
+
+def main() -> None:
+    size_mib = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+
+    with tempfile.NamedTemporaryFile(delete=False) as file:
+        for _ in range(size_mib):
+            file.write(os.urandom(1024 * 1024))
+        path = file.name
+
+    try:
+        # 先读一遍，让文件进入页缓存
+        measure(path, lambda chunk: None)
+
+        state = {'md5': md5(), 'crc64': 0, 'crc64_python': 0}
+
+        def update_md5(chunk: bytes) -> None:
+            state['md5'].update(chunk)
+
+        def update_crc64(chunk: bytes) -> None:
+            state['crc64'] = crc64(chunk, state['crc64'])
+
+        def update_crc64_python(chunk: bytes) -> None:
+            state['crc64_python'] = crc64_python(chunk, state['crc64_python'])
+
+        print(f'文件大小： {size_mib} MiB ，当前 CRC64 实现： {crc64_impl}')
+        print(f'{"md5":<16} {measure(path, update_md5):>10.1f} MiB/s')
+        print(f'{"crc64":<16} {measure(path, update_crc64):>10.1f} MiB/s')
+        if crc64_impl != 'python':
+            print(f'{"crc64 (python)":<16} {measure(path, update_crc64_python):>10.1f} MiB/s')
+
+        # 合并两半的 CRC64 应与整体一致
+        with open(path, 'rb') as file:
+            first = file.read(size_mib * 1024 * 1024 // 2)
+            second = file.read()
+        assert crc64_combine(crc64(first), crc64(second), len(second)) == state['crc64']
+
+        start = time.perf_counter()
+        for _ in range(1000):
+            crc64_combine(state['crc64'], state['crc64'], size_mib * 1024 * 1024)
+        print(f'{"crc64_combine":<16} {1000 / (time.perf_counter() - start):>10.0f} 次/秒')
+
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+"""传输引擎基准
+
+在本地模拟的阿里云 OSS 服务上，比较线程池和 asyncio 两种传输引擎上传、下载大量小文件的速度。
+模拟服务为每个请求增加固定的延迟，相当于访问 OSS 的网络往返时间，此时同时进行的请求数决定了速度
+
+需要安装 requests 和 aiohttp
+
+用法：
+
+    python benchmarks/engine.py [文件数] [文件大小（字节）] [延迟（毫秒）]
+
+"""
+
+import asyncio
+import base64
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from hashlib import md5
+from typing import Dict, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from oss.aliyun_oss import AliyunOssBucket
+from oss.aliyun_oss_async import AsyncAliyunOssBucket
+from utils import FileManager, OSSSynchronizer
+from utils.crc64 import crc64
+
+
+# 与 main.py 相同，以 INFO 级别运行
+logger: logging.Logger = logging.getLogger('oss_sync.benchmark')
+logger.setLevel(logging.INFO)
+
+bucket_name: str = 'benchmark-bucket'
+
+# 每页列出的对象数，与阿里云 OSS 的上限相同
+max_keys: int = 1000
+
+
+class StandInOss(object):
+    def __init__(self, latency: float) -> None:
+        """初始化
+
+        只实现同步用到的列出、上传、下载、复制和删除对象，不校验签名。
+        服务运行在子进程中，不与被测的客户端争用 GIL
+
+        Args:
+            latency: 每个请求增加的延迟（秒）
+
+        """
+
+        self.latency: float = latency
+        self.port: int = 0
+
+        # 收到的请求数，由子进程累加
+        self._requests: multiprocessing.Value = multiprocessing.Value('l', 0)
+        self._process: Optional[multiprocessing.Process] = None
+
+        # 以对象 Key 为键的 (内容, 响应头)，只在子进程中使用
+        self.objects: Dict[str, Tuple[bytes, Dict[str, str]]] = {}
+
+    @property
+    def requests(self) -> int:
+        """收到的请求数
+        """
+
+        return self._requests.value
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self._requests.value += 1
+        await asyncio.sleep(self.latency)
+
+        key = request.path[1:]
+        if not key:
+            return self.list_objects(request.query.get('prefix', ''), request.query.get('marker', ''))
+
+        if request.method == 'PUT':
+            source = request.headers.get('x-oss-copy-source')
+            if source is not None:
+                # '/bucket/key'
+                self.objects[key] = self.objects[source.split('/', 2)[2]]
+                return web.Response()
+
+            # 不受 request.read() 的大小限制
+            data = await request.content.read()
+            content_md5 = base64.b64encode(md5(data).digest()).decode('ascii')
+            if request.headers.get('Content-MD5', content_md5) != content_md5:
+                return web.Response(status=400, text='InvalidDigest')
+
+            headers = {
+                'ETag': f'"{md5(data).hexdigest().upper()}"',
+                'x-oss-hash-crc64ecma': str(crc64(data)),
+                **{
+                    name: value
+                    for name, value
+                    in request.headers.items()
+                    if name.lower().startswith('x-oss-meta-') or name.lower() == 'content-encoding'
+                },
+            }
+            self.objects[key] = (data, headers)
+            return web.Response(headers=headers)
+
+        if key not in self.objects:
+            return web.Response(status=404, text='NoSuchKey')
+
+        if request.method == 'DELETE':
+            del self.objects[key]
+            return web.Response(status=204)
+
+        data, headers = self.objects[key]
+        return web.Response(body=data, headers=headers)
+
+    def list_objects(self, prefix: str, marker: str) -> web.Response:
+        keys = sorted(key for key in self.objects if key.startswith(prefix) and key > marker)
+        contents = ''.join(
+            f'<Contents><Key>{escape(key)}</Key><LastModified>2024-01-01T00:00:00.000Z</LastModified>'
+            f'<ETag>{self.objects[key][1]["ETag"]}</ETag><Size>{len(self.objects[key][0])}</Size>'
+            f'<Type>Normal</Type></Contents>'
+            for key
+            in keys[:max_keys]
+        )
+        next_marker = f'<NextMarker>{escape(keys[max_keys - 1])}</NextMarker>' if len(keys) > max_keys else ''
+        return web.Response(
+            text=f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult>{contents}{next_marker}</ListBucketResult>',
+            content_type='application/xml'
+        )
+
+    def start(self) -> None:
+        """在子进程中启动服务，对象为空
+        """
+
+        # 先在当前进程中绑定端口，子进程继承该套接字
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.port = sock.getsockname()[1]
+
+        self._requests.value = 0
+        self._process = multiprocessing.Process(target=self.serve_forever, args=(sock,), daemon=True)
+        self._process.start()
+        sock.close()
+
+        # 等待服务开始接受连接
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', self.port)).close()
+                return
+            except ConnectionRefusedError:
+                time.sleep(0.01)
+
+    def stop(self) -> None:
+        """停止服务
+        """
+
+        self._process.terminate()
+        self._process.join()
+
+    def serve_forever(self, sock: socket.socket) -> None:
+        asyncio.run(self.serve(sock))
+
+    async def serve(self, sock: socket.socket) -> None:
+        # 与 OSS 一样原样保存压缩上传的内容
+        runner = web.ServerRunner(web.Server(self.handle, auto_decompress=False), access_log=None)
+        await runner.setup()
+        await web.SockSite(runner, sock, backlog=4096).start()
+        await asyncio.Event().wait()
+
+
+def make_files(root_dir: str, count: int, size: int) -> None:
+    """生成测试文件，每个文件夹 100 个
+
+    Args:
+        root_dir: 根目录
+        count: 文件数
+        size: 文件大小（字节）
+
+    """
+
+    for i in range(count):
+        path = os.path.join(root_dir, f'{i // 100:04d}', f'{i:06d}.bin')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(os.urandom(size))
+
+
+def run(engine: str, server: StandInOss, src_dir: str, dst_dir: str, max_requests: int) -> Tuple[float, float]:
+    """用指定的传输引擎上传 src_dir 再下载到 dst_dir
+
+    Args:
+        engine: 'thread' 或 'asyncio'
+        server: 模拟服务
+        src_dir: 上传的本地文件夹
+        dst_dir: 下载的本地文件夹，需要为空
+        max_requests: asyncio 引擎同时进行的请求数上限
+
+    Returns:
+        (上传耗时, 下载耗时) （秒）
+
+    """
+
+    bucket = AliyunOssBucket({
+        'host': f'127.0.0.1:{server.port}',
+        'bucket': bucket_name,
+        'access_key_id': 'benchmark-access-key-id',
+        'access_key_secret': 'benchmark-access-key-secret',
+        'scheme': 'http',
+    })
+    async_bucket = AsyncAliyunOssBucket(bucket, max_requests) if engine == 'asyncio' else None
+
+    times = []
+    for local_dir, direction in [(src_dir, 'sync_from_local_to_oss'), (dst_dir, 'sync_from_oss_to_local')]:
+        synchronizer = OSSSynchronizer(FileManager(local_dir), bucket, async_bucket=async_bucket)
+        start = time.perf_counter()
+        getattr(synchronizer, direction)()
+        times.append(time.perf_counter() - start)
+
+    return times[0], times[1]
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.05
+
+    server = StandInOss(latency)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        src_dir = os.path.join(temp_dir, 'src')
+        make_files(src_dir, count, size)
+
+        print(f'{count} 个 {size} 字节的文件，每个请求延迟 {latency * 1000:.0f} 毫秒')
+        for engine, max_requests in [('thread', 0), ('asyncio', 256), ('asyncio', 1000)]:
+            dst_dir = os.path.join(temp_dir, f'dst-{engine}-{max_requests}')
+            os.makedirs(dst_dir)
+
+            server.start()
+            try:
+                put_time, get_time = run(engine, server, src_dir, dst_dir, max_requests)
+            finally:
+                server.stop()
+
+            name = engine if engine == 'thread' else f'{engine} ({max_requests})'
+            print(
+                f'{name:<18} 上传 {put_time:>7.2f} 秒（ {count / put_time:>8,.0f} 个/秒） '
+                f'下载 {get_time:>7.2f} 秒（ {count / get_time:>8,.0f} 个/秒） 共 {server.requests} 个请求'
+            )
+
+
+if __name__ == '__main__':
+    main()
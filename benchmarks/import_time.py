@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""启动耗时基准
+
+使用 `python -X importtime` 测量导入 main 模块的耗时，并检查启动时没有导入任何 OSS 后端的 SDK
+
+用法：
+
+    python benchmarks/import_time.py
+
+如果启动时导入了重型依赖，以非 0 状态码退出
+
+"""
+
+import os
+import subprocess
+import sys
+from typing import Dict
+
+
+# 启动时不应该被导入的模块（它们只应在对应 OSS 类型或 asyncio 传输引擎被使用时导入）
+lazy_modules = ['qcloud_cos', 'requests', 'oss.aliyun_oss', 'oss.tencent_cos', 'asyncio']
+
+project_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def measure_import_time() -> Dict[str, int]:
+    """测量导入 main 模块的耗时
+
+    Returns:
+        模块名 -> 累计导入耗时（微秒）
+
+    """
+
+    ret = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=project_dir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True
+    )
+
+    # 每行格式为： "import time:       self |  cumulative | module"
+    times = {}
+    for line in ret.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        times[fields[2].strip()] = int(fields[1].strip())
+
+    return times
+
+
+def main() -> None:
+    times = measure_import_time()
+
+    print(f'import main: {times.get("main", 0) / 1000:.2f} ms （累计）')
+
+    imported = [
+        name
+        for name
+        in times
+        if any(name == m or name.startswith(f'{m}.') for m in lazy_modules)
+    ]
+    if imported:
+        print(f'启动时导入了不应导入的模块： {imported}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
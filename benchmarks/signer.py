@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""请求签名基准
+
+比较每次重新计算 HMAC 密钥和时间的签名方式与 AliyunOssSigner 每秒能完成的签名数
+
+用法：
+
+    python benchmarks/signer.py [秒数]
+
+"""
+
+import base64
+import hmac
+import logging
+import os
+import sys
+import time
+from hashlib import sha1
+from typing import Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from oss.aliyun_signer import AliyunOssSigner
+
+
+# 与 main.py 相同，以 INFO 级别运行
+logger: logging.Logger = logging.getLogger('oss_sync.benchmark')
+logger.setLevel(logging.INFO)
+
+access_key_id: str = 'benchmark-access-key-id'
+access_key_secret: str = 'benchmark-access-key-secret'
+bucket: str = 'benchmark-bucket'
+
+request_headers = {
+    'Host': f'{bucket}.oss-cn-hangzhou.aliyuncs.com',
+    'Content-Type': 'text/html',
+    'Content-MD5': '1B2M2Y8AsgTpgAmY7PhCfg==',
+    'x-oss-meta-oss-sync-mtime': '1700000000.0',
+}
+
+
+def naive_sign() -> str:
+    """原来的签名方式
+
+    调用方和签名各格式化一次时间，每次用密钥重新初始化 HMAC ，并且无论日志级别都格式化调试日志
+    """
+
+    oss_headers = {'x-oss-meta-oss-sync-mtime': request_headers['x-oss-meta-oss-sync-mtime']}
+    headers = {
+        'Host': request_headers['Host'],
+        'Date': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime()),
+        'Content-Type': request_headers['Content-Type'],
+        'Content-MD5': request_headers['Content-MD5'],
+        **oss_headers,
+    }
+
+    verb = 'PUT'
+    content_md5 = headers['Content-MD5']
+    content_type = headers['Content-Type']
+    date = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime())
+    canonicalized_oss_headers = ''.join(f'{key}:{oss_headers[key]}\n' for key in sorted(oss_headers))
+    canonicalized_resource = f'/{bucket}/path/to/index.html'
+
+    for message in [
+        f'verb = \'{verb}\'',
+        f'content_md5 = \'{content_md5}\'',
+        f'content_type = \'{content_type}\'',
+        f'date = \'{date}\'',
+        f'canonicalized_oss_headers = \'{canonicalized_oss_headers}\'',
+        f'canonicalized_resource = \'{canonicalized_resource}\'',
+    ]:
+        logger.debug(message)
+
+    string_to_sign = (
+        f'{verb}\n{content_md5}\n{content_type}\n{date}\n{canonicalized_oss_headers}{canonicalized_resource}'
+    )
+    logger.debug(f'string_to_sign = \'{string_to_sign}\'')
+
+    signature = base64.b64encode(
+        hmac.new(access_key_secret.encode('utf-8'), string_to_sign.encode('utf-8'), sha1).digest()
+    ).decode('utf-8')
+
+    headers['Authorization'] = f'OSS {access_key_id}:{signature}'
+    logger.debug(f'auth_header = \'{headers["Authorization"]}\'')
+
+    return headers['Authorization']
+
+
+def measure(func: Callable[[], object], seconds: float) -> float:
+    """测量每秒调用次数
+
+    Args:
+        func: 被测方法
+        seconds: 测量时长（秒）
+
+    Returns:
+        每秒调用次数
+
+    """
+
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(1000):
+            func()
+        count += 1000
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
+
+
+def main() -> None:
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+
+    v1_signer = AliyunOssSigner(access_key_id, access_key_secret, bucket)
+    v4_signer = AliyunOssSigner(access_key_id, access_key_secret, bucket, 'v4', 'cn-hangzhou')
+
+    cases = [
+        ('naive v1', naive_sign),
+        ('signer v1', lambda: v1_signer.sign('PUT', 'path/to/index.html', request_headers)),
+        ('signer v4', lambda: v4_signer.sign('PUT', 'path/to/index.html', request_headers)),
+        ('presign v1', lambda: v1_signer.presign_url(request_headers['Host'], 'GET', 'path/to/index.html')),
+    ]
+
+    for name, func in cases:
+        print(f'{name:<12} {measure(func, seconds):>12,.0f} 次/秒')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,14 +10,23 @@
 import argparse
 import json
 import logging
+import logging.handlers
 import os
+import queue
+import re
+import signal
 import sys
-from typing import Callable, Dict, List, Optional, Union
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
-from oss import AliyunOssBucket, QcloudCosBucket
-from utils import FileManager, OSSSynchronizer
+from oss import OssBucket, get_oss_bucket_class, oss_bucket_registry
+from utils import (
+    DownloadCache, FileManager, HashIndex, MemoryBudget, OSSSynchronizer, PathFilter, SyncPlan, ThroughputHistory,
+    TokenBucket, compare_modes, dump_plans, load_plans
+)
+from utils.progress import format_duration
 
 
 # 日志配置
@@ -36,6 +45,10 @@ debug_console_handler = logging.StreamHandler()
 debug_console_handler.setFormatter(debug_formatter)
 debug_console_handler.setLevel(logging.DEBUG)
 
+# 同步线程只把日志记录放入队列，由监听线程格式化并输出，避免各线程争用输出流的锁
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+queue_handler = logging.handlers.QueueHandler(log_queue)
+
 
 # 定义一些类型别名
 UnitConfig = Dict[str, str]
@@ -47,6 +60,61 @@ ConfigValidator = Callable[[Config], Config]
 default_main_config_path: str = 'config/config.json'
 default_config_encoding: str = 'utf-8'
 
+# 主配置中每个同步单元可用的字段
+unit_config_keys: List[str] = [
+    'oss_type',
+    'oss_config',
+    'local_dir',
+    'direction',
+    'compress',
+    'hardlink',
+    'compare_mode',
+    'include',
+    'exclude',
+    'remote_prefix',
+    'upload_limit',
+    'download_limit',
+    'append',
+    'dest_oss_type',
+    'dest_oss_config',
+    'dest_remote_prefix',
+    'pack_threshold',
+]
+
+# 可用的传输引擎：
+# - thread: 每个同步单元 32 个传输线程
+# - asyncio: 在事件循环中同时进行最多 --max-requests 个请求，需要安装 aiohttp ，只支持阿里云 OSS
+engines: List[str] = ['thread', 'asyncio']
+
+# 带宽限制中可用的单位
+size_units: Dict[str, int] = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(size: Union[int, str]) -> int:
+    """解析带宽限制
+
+    Args:
+        size: 每秒字节数，可以是整数，也可以是带单位的字符串，比如 '512K' 、 '10M' 。 0 表示不限速
+
+    Returns:
+        每秒字节数
+
+    Raises:
+        ValueError: 无法解析
+
+    """
+
+    if isinstance(size, int) and not isinstance(size, bool):
+        if size < 0:
+            raise ValueError(f'带宽限制不能为负数： {size}')
+        return size
+
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?', str(size).strip(), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f'无法解析带宽限制： "{size}" （预期格式如 "512K" 、 "10M" ）')
+
+    return int(float(match.group(1)) * size_units[match.group(2).upper()])
+
 
 def main_config_validator(config: Config) -> Config:
     """主配置校验器
@@ -57,8 +125,23 @@ def main_config_validator(config: Config) -> Config:
 
     - oss_type: OSS 类型，只能是 'tencent-cos' 或 'aliyun-oss' 。
     - oss_config: OSS 配置，必须是一个已经存在文件。
-    - local_dir: 本地文件路径，必须是一个已经存在的文件夹。
-    - direction: 同步方向，只能是 'local-to-remote' 或 'remote-to-local' 。
+    - local_dir: 本地文件路径，必须是一个已经存在的文件夹。同步方向为 'remote-to-remote' 时不需要。
+    - direction: 同步方向，只能是 'local-to-remote' 、 'remote-to-local' 或 'remote-to-remote' 。
+    - compress: 可选，上传时是否用 gzip 压缩文本等适合压缩的内容，必须是布尔值，默认为 false 。
+    - compare_mode: 可选，判断文件是否被修改的方式，只能是 'checksum' 、 'size-only' 或 'size+mtime' ，默认为 'checksum' 。
+    - include: 可选，包含规则（ glob ）列表，若指定则只同步匹配其中至少一条规则的文件。
+    - exclude: 可选，排除规则（ glob ）列表，匹配其中任意一条规则的文件不会被同步。
+    - remote_prefix: 可选，对象 Key 前缀，本地文件会同步到 Bucket 中该前缀下，默认为空（整个 Bucket ）。
+    - hardlink: 可选，从 OSS 同步到本地时，本地已有相同内容的文件是否以硬链接代替复制，必须是布尔值，默认为 false 。
+    - upload_limit: 可选，该同步单元的上传带宽限制（每秒字节数），可以带单位，比如 "10M" ，默认为 0 （不限速）。
+    - download_limit: 可选，该同步单元的下载带宽限制，格式同 upload_limit 。
+    - append: 可选，追加上传规则（ glob ，语法同 exclude ）列表，匹配的文件只在末尾增加了内容时只上传增加的部分，
+      只支持阿里云 OSS ，且只能在 compare_mode 为 'checksum' 时使用。
+    - dest_oss_type: 同步方向为 'remote-to-remote' 时必需，目标 OSS 类型，取值同 oss_type 。
+    - dest_oss_config: 同步方向为 'remote-to-remote' 时必需，目标 OSS 配置，必须是一个已经存在文件。
+    - dest_remote_prefix: 可选，目标 Bucket 中的对象 Key 前缀，默认为空（整个 Bucket ）。
+    - pack_threshold: 可选，小文件打包的大小阈值（字节），可以带单位，比如 "4K" ，默认为 0 （不打包）。
+      上传时同一文件夹中小于该大小的文件打包成少量对象，下载时按打包索引还原，不能用于 'remote-to-remote' 。
 
     Notes:
         - 如果配置是字典类型，会转换为列表方便统一处理
@@ -93,6 +176,19 @@ def main_config_validator(config: Config) -> Config:
         oss_config = config_item.get('oss_config')
         local_dir = config_item.get('local_dir')
         direction = config_item.get('direction')
+        compress = config_item.get('compress', False)
+        hardlink = config_item.get('hardlink', False)
+        compare_mode = config_item.get('compare_mode', 'checksum')
+        include = config_item.get('include', [])
+        exclude = config_item.get('exclude', [])
+        remote_prefix = config_item.get('remote_prefix', '')
+        upload_limit = config_item.get('upload_limit', 0)
+        download_limit = config_item.get('download_limit', 0)
+        append = config_item.get('append', [])
+        dest_oss_type = config_item.get('dest_oss_type')
+        dest_oss_config = config_item.get('dest_oss_config')
+        dest_remote_prefix = config_item.get('dest_remote_prefix', '')
+        pack_threshold = config_item.get('pack_threshold', 0)
 
         if not oss_type:
             raise KeyError('主配置缺少必要字段： "oss_type"')
@@ -100,14 +196,27 @@ def main_config_validator(config: Config) -> Config:
         if not oss_config:
             raise KeyError('主配置缺少必要字段： "oss_config_file"')
 
-        if not local_dir:
-            raise KeyError('主配置缺少必要字段： "local_dir"')
-
         if not direction:
             raise KeyError('主配置缺少必要字段： "direction"')
 
+        valid_direction = str(direction).lower().strip()
+        if valid_direction not in ['local-to-remote', 'remote-to-local', 'remote-to-remote']:
+            raise ValueError(
+                f'主配置字段 "direction" 的值不符合预期： "{direction}" '
+                '（预期值为 "local-to-remote" 、 "remote-to-local" 或 "remote-to-remote" ）'
+            )
+
+        if not local_dir and valid_direction != 'remote-to-remote':
+            raise KeyError('主配置缺少必要字段： "local_dir"')
+
+        if valid_direction == 'remote-to-remote':
+            if not dest_oss_type:
+                raise KeyError('主配置缺少必要字段： "dest_oss_type"')
+            if not dest_oss_config:
+                raise KeyError('主配置缺少必要字段： "dest_oss_config"')
+
         valid_oss_type = str(oss_type).lower().strip()
-        if valid_oss_type not in ['tencent-cos', 'aliyun-oss']:
+        if valid_oss_type not in oss_bucket_registry:
             raise ValueError(
                 f'主配置字段 "oss_type" 的值不符合预期： "{oss_type}" '
                 '（预期值为 "tencent-cos" （腾讯云 COS ） 或 "aliyun-oss" （阿里云 OSS ））'
@@ -119,34 +228,108 @@ def main_config_validator(config: Config) -> Config:
                 f'主配置字段 "oss_config" 的值： "{oss_config}" （ "{valid_oss_config}" ）所指向的路径不是一个文件'
             )
 
-        valid_local_dir = os.path.abspath(str(local_dir).strip())
-        if not os.path.isdir(valid_local_dir):
+        valid_local_dir = None
+        if valid_direction != 'remote-to-remote':
+            valid_local_dir = os.path.abspath(str(local_dir).strip())
+            if not os.path.isdir(valid_local_dir):
+                raise ValueError(
+                    f'主配置字段 "local_dir" 的值： "{local_dir}" （ "{valid_local_dir}" ）所指向的路径不是一个文件夹'
+                )
+
+        valid_dest_oss_type = None
+        valid_dest_oss_config = None
+        if valid_direction == 'remote-to-remote':
+            valid_dest_oss_type = str(dest_oss_type).lower().strip()
+            if valid_dest_oss_type not in oss_bucket_registry:
+                raise ValueError(
+                    f'主配置字段 "dest_oss_type" 的值不符合预期： "{dest_oss_type}" '
+                    '（预期值为 "tencent-cos" （腾讯云 COS ） 或 "aliyun-oss" （阿里云 OSS ））'
+                )
+
+            valid_dest_oss_config = os.path.abspath(str(dest_oss_config).strip())
+            if not os.path.isfile(valid_dest_oss_config):
+                raise ValueError(
+                    f'主配置字段 "dest_oss_config" 的值： "{dest_oss_config}" （ "{valid_dest_oss_config}" ）'
+                    '所指向的路径不是一个文件'
+                )
+
+        if not isinstance(compress, bool):
+            raise TypeError(f'主配置字段 "compress" 的值必须是布尔值，而非 {type(compress)}')
+
+        if not isinstance(hardlink, bool):
+            raise TypeError(f'主配置字段 "hardlink" 的值必须是布尔值，而非 {type(hardlink)}')
+
+        valid_compare_mode = str(compare_mode).lower().strip()
+        if valid_compare_mode not in compare_modes:
             raise ValueError(
-                f'主配置字段 "local_dir" 的值： "{local_dir}" （ "{valid_local_dir}" ）所指向的路径不是一个文件夹'
+                f'主配置字段 "compare_mode" 的值不符合预期： "{compare_mode}" '
+                '（预期值为 "checksum" 、 "size-only" 或 "size+mtime" ）'
             )
 
-        valid_direction = str(direction).lower().strip()
-        if valid_direction not in ['local-to-remote', 'remote-to-local']:
-            raise ValueError(
-                f'主配置字段 "direction" 的值不符合预期： "{direction}" '
-                '（预期值为 "local-to-remote" 或 "remote-to-local" ）'
-            )
+        if compress and valid_compare_mode != 'checksum':
+            raise ValueError('主配置字段 "compress" 只能在 "compare_mode" 为 "checksum" 时开启')
+
+        for key, rules in [('include', include), ('exclude', exclude), ('append', append)]:
+            if not isinstance(rules, list) or not all(isinstance(rule, str) and rule for rule in rules):
+                raise TypeError(f'主配置字段 "{key}" 的值必须是非空字符串的列表，而非 {rules}')
+
+        if append and valid_compare_mode != 'checksum':
+            raise ValueError('主配置字段 "append" 只能在 "compare_mode" 为 "checksum" 时使用')
+
+        if append and valid_direction != 'local-to-remote':
+            raise ValueError('主配置字段 "append" 只能在 "direction" 为 "local-to-remote" 时使用')
+
+        valid_prefixes = {}
+        for key, prefix in [('remote_prefix', remote_prefix), ('dest_remote_prefix', dest_remote_prefix)]:
+            if not isinstance(prefix, str):
+                raise TypeError(f'主配置字段 "{key}" 的值必须是字符串，而非 {type(prefix)}')
+
+            # 前缀总是表示一个“文件夹”
+            valid_prefixes[key] = prefix.strip().strip('/')
+            if valid_prefixes[key]:
+                valid_prefixes[key] += '/'
+
+        valid_limits = {}
+        for key, limit in [('upload_limit', upload_limit), ('download_limit', download_limit)]:
+            try:
+                valid_limits[key] = parse_size(limit)
+            except ValueError as err:
+                raise ValueError(f'主配置字段 "{key}" 的值不符合预期： {err}')
+
+        try:
+            valid_pack_threshold = parse_size(pack_threshold)
+        except ValueError as err:
+            raise ValueError(f'主配置字段 "pack_threshold" 的值不符合预期： {err}')
+
+        if valid_pack_threshold and valid_direction == 'remote-to-remote':
+            raise ValueError('主配置字段 "pack_threshold" 不能在 "direction" 为 "remote-to-remote" 时使用')
 
         # 有多余的字段
-        if len(config_item) > 4:
-            extra_keys = [
-                key
-                for key
-                in config_item.keys()
-                if key not in ['oss_type', 'oss_config', 'local_dir', 'direction']
-            ]
+        extra_keys = [
+            key
+            for key
+            in config_item.keys()
+            if key not in unit_config_keys
+        ]
+        if extra_keys:
             logger.warning(f'主配置中存在多余字段： {extra_keys}')
 
         valid_config.append({
             'oss_type': valid_oss_type,
             'oss_config': valid_oss_config,
             'local_dir': valid_local_dir,
-            'direction': valid_direction
+            'direction': valid_direction,
+            'compress': compress,
+            'hardlink': hardlink,
+            'compare_mode': valid_compare_mode,
+            'include': include,
+            'exclude': exclude,
+            'append': append,
+            'dest_oss_type': valid_dest_oss_type,
+            'dest_oss_config': valid_dest_oss_config,
+            'pack_threshold': valid_pack_threshold,
+            **valid_prefixes,
+            **valid_limits
         })
 
     return valid_config
@@ -232,10 +415,172 @@ def parser_args(args: Optional[List[str]] = None) -> argparse.Namespace:
         metavar='CHARSET'
     )
 
+    parser.add_argument(
+        '-v', '--verbose',
+        action='store_true',
+        help='为每个同步或跳过的文件输出一行日志（默认只输出失败的文件和汇总进度）'
+    )
+
+    parser.add_argument(
+        '--progress-interval',
+        type=float,
+        default=10,
+        help='定期输出汇总进度的间隔秒数， 0 表示只在每个同步单元结束时输出汇总（默认值： 10 ）',
+        metavar='SECONDS'
+    )
+
+    parser.add_argument(
+        '--upload-limit',
+        type=parse_size,
+        default=0,
+        help='所有同步单元总的上传带宽限制（每秒字节数，可以带单位，比如 "10M" ，默认值： 0 ，不限速）',
+        metavar='SIZE'
+    )
+
+    parser.add_argument(
+        '--download-limit',
+        type=parse_size,
+        default=0,
+        help='所有同步单元总的下载带宽限制（格式同 --upload-limit ）',
+        metavar='SIZE'
+    )
+
+    parser.add_argument(
+        '--max-memory',
+        type=parse_size,
+        default=0,
+        help='所有同步线程同时读入内存的数据量上限（字节数，可以带单位，比如 "512M" ，默认值： 0 ，不限制）',
+        metavar='SIZE'
+    )
+
+    parser.add_argument(
+        '--hash-index',
+        type=str,
+        required=False,
+        help='文件校验索引（ SQLite 数据库）路径，不要放在同步的本地目录中。'
+             '若指定，则大小和修改时间没有变化的文件不再重新计算 MD5',
+        metavar='FILE'
+    )
+
+    parser.add_argument(
+        '--dir-cache',
+        action='store_true',
+        help='在校验索引中记录文件夹内容，修改时间没有变化的文件夹不再重新遍历（需要 --hash-index ）。'
+             '在原有位置修改的文件不会被发现，需要定期使用 --full-scan'
+    )
+
+    parser.add_argument(
+        '--full-scan',
+        action='store_true',
+        help='与 --dir-cache 一起使用，忽略记录完整遍历本地文件夹并重新记录'
+    )
+
+    parser.add_argument(
+        '--download-cache',
+        type=str,
+        required=False,
+        help='下载缓存文件夹，由所有同步单元和多次同步共用，不要放在同步的本地目录中。'
+             '若指定，则从 OSS 同步到本地时 ETag 相同的对象只下载一次，之后从缓存复制',
+        metavar='DIR'
+    )
+
+    parser.add_argument(
+        '--download-cache-size',
+        type=parse_size,
+        default='10G',
+        help='下载缓存的总大小上限，超过时删除最久没有使用的文件（格式同 --max-memory ，默认值： 10G ）',
+        metavar='SIZE'
+    )
+
+    parser.add_argument(
+        '--crc64',
+        action='store_true',
+        help='不能用 MD5 校验的传输（比如分片上传的对象）同时计算 CRC64 并与服务端返回的 CRC64 比较'
+    )
+
+    parser.add_argument(
+        '--engine',
+        type=str,
+        choices=engines,
+        default='thread',
+        help='传输引擎： thread （线程池，默认）或 asyncio （同时进行大量请求，适合大量小文件。'
+             '需要安装 aiohttp ，只支持阿里云 OSS ，其它同步单元仍使用线程池）'
+    )
+
+    parser.add_argument(
+        '--max-requests',
+        type=int,
+        default=1000,
+        help='asyncio 传输引擎下每个同步单元同时进行的请求数上限（默认值： 1000 ）',
+        metavar='N'
+    )
+
+    parser.add_argument(
+        '--shard-index',
+        type=int,
+        default=0,
+        help='当前分片序号，从 0 开始（默认值： 0 ）',
+        metavar='I'
+    )
+
+    parser.add_argument(
+        '--shard-count',
+        type=int,
+        default=1,
+        help='分片总数。多台机器使用相同配置和不同的分片序号，各自只同步属于自己分片的文件（默认值： 1 ，不分片）',
+        metavar='N'
+    )
+
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='试运行：照常检查，输出需要执行的任务、上传和下载的字节数、各类请求数，不修改本地和 OSS'
+    )
+
+    parser.add_argument(
+        '--save-plan',
+        type=str,
+        required=False,
+        help='与 --dry-run 一起使用，把试运行得到的同步计划保存到文件',
+        metavar='FILE'
+    )
+
+    parser.add_argument(
+        '--apply-plan',
+        type=str,
+        required=False,
+        help='执行 --save-plan 保存的同步计划，不再比较本地和 OSS 。计划生成后发生的变化不会被发现，'
+             '不能用于打包小文件的同步单元',
+        metavar='FILE'
+    )
+
+    parser.add_argument(
+        '--history',
+        type=str,
+        required=False,
+        help='同步速度记录文件路径。若指定，则每次同步后记录速度，试运行时据此估计用时',
+        metavar='FILE'
+    )
+
     if args is None:
         args = sys.argv[1:]
 
-    return parser.parse_args(args)
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.dir_cache and not parsed_args.hash_index:
+        parser.error('--dir-cache 需要与 --hash-index 一起使用')
+    if parsed_args.max_requests < 1:
+        parser.error('--max-requests 至少为 1')
+    if parsed_args.shard_count < 1:
+        parser.error('--shard-count 至少为 1')
+    if not 0 <= parsed_args.shard_index < parsed_args.shard_count:
+        parser.error(f'--shard-index 必须在 [0, {parsed_args.shard_count}) 之间')
+    if parsed_args.save_plan and not parsed_args.dry_run:
+        parser.error('--save-plan 需要与 --dry-run 一起使用')
+    if parsed_args.apply_plan and parsed_args.dry_run:
+        parser.error('--apply-plan 不能与 --dry-run 一起使用')
+
+    return parsed_args
 
 
 def main() -> None:
@@ -246,14 +591,28 @@ def main() -> None:
     args = parser_args()
 
     # 开启调试模式
-    if args.debug:
-        logger.addHandler(debug_console_handler)
-        logger.setLevel(logging.DEBUG)
+    console_handler = debug_console_handler if args.debug else normal_console_handler
+    logger.addHandler(queue_handler)
+    logger.setLevel(logging.DEBUG if args.debug else logging.INFO)
+
+    queue_listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+    queue_listener.start()
+
+    try:
         logger.debug('DEBUG 模式已开启')
-    else:
-        logger.addHandler(normal_console_handler)
-        logger.setLevel(logging.INFO)
-        logger.debug('DEBUG 模式关闭')
+        sync_all(args)
+    finally:
+        # 输出队列中剩余的日志
+        queue_listener.stop()
+
+
+def sync_all(args: argparse.Namespace) -> None:
+    """按配置同步所有同步单元
+
+    Args:
+        args: 命令行参数
+
+    """
 
     main_config_path = args.config or default_main_config_path
     config_encoding = args.config_encoding or default_config_encoding
@@ -269,11 +628,50 @@ def main() -> None:
         logger.error(f'加载主配置文件 "{main_config_path}" 失败。')
         exit(1)
 
-    for config_item in config:
-        oss_type = config_item['oss_type']
-        oss_config_path = config_item['oss_config']
-        local_dir = config_item['local_dir']
-        direction = config_item['direction']
+    # 内存预算，由所有同步单元共用
+    memory_budget = MemoryBudget(args.max_memory)
+
+    # 全局带宽限制，由所有同步单元共用
+    global_upload_limiter = TokenBucket(args.upload_limit)
+    global_download_limiter = TokenBucket(args.download_limit)
+
+    # 每个同步单元的 (上传, 下载) 带宽限制
+    unit_limiters: List[Tuple[TokenBucket, TokenBucket]] = [
+        (TokenBucket(config_item['upload_limit']), TokenBucket(config_item['download_limit']))
+        for config_item
+        in config
+    ]
+
+    def reload_limits(signum: int, frame) -> None:
+        """收到 SIGHUP 时重新加载主配置，调整各同步单元的带宽限制
+        """
+
+        new_config = load_configs(
+            config_path=main_config_path,
+            validator=main_config_validator,
+            encoding=config_encoding
+        )
+        if new_config is None:
+            logger.error(f'重新加载主配置文件 "{main_config_path}" 失败，带宽限制保持不变。')
+            return
+
+        # 按顺序对应同步单元
+        for (upload_limiter, download_limiter), config_item in zip(unit_limiters, new_config):
+            upload_limiter.set_rate(config_item['upload_limit'])
+            download_limiter.set_rate(config_item['download_limit'])
+
+        logger.info('已重新加载带宽限制')
+
+    # Windows 上没有 SIGHUP
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, reload_limits)
+
+    # 使用同一个 Bucket 的同步单元共用一个 OssBucket （也就共用一个客户端和连接池）
+    buckets: Dict[Tuple[str, str], OssBucket] = {}
+
+    def get_bucket(oss_type: str, oss_config_path: str) -> Tuple[OssBucket, Dict]:
+        """加载 OSS 配置文件并获取对应的 OssBucket ，返回 (OssBucket, OSS 配置)
+        """
 
         # 加载 OSS 配置文件
         oss_config = load_configs(
@@ -285,20 +683,175 @@ def main() -> None:
             logger.error(f'加载 OSS 配置文件 "{oss_config_path}" 失败。')
             exit(1)
 
-        if oss_type == 'tencent-cos':
-            bucket = QcloudCosBucket(oss_config)
-        else:
-            bucket = AliyunOssBucket(oss_config)
+        # 只导入当前配置用到的 OSS 后端
+        bucket_id = (oss_type, json.dumps(oss_config, sort_keys=True))
+        if bucket_id not in buckets:
+            buckets[bucket_id] = get_oss_bucket_class(oss_type)(oss_config)
+        return buckets[bucket_id], oss_config
+
+    # asyncio 传输引擎的异步客户端只在使用时导入，没有安装 aiohttp 时也可以使用线程池
+    async_bucket_class = None
+    if args.engine == 'asyncio':
+        from oss.aliyun_oss_async import AsyncAliyunOssBucket, aiohttp
+        if aiohttp is None:
+            logger.error('asyncio 传输引擎需要安装 aiohttp 。')
+            exit(1)
+        async_bucket_class = AsyncAliyunOssBucket
+
+    # 文件校验索引，由所有同步单元共用
+    hash_index = HashIndex(args.hash_index) if args.hash_index else None
+
+    # 下载缓存，由所有同步单元共用
+    download_cache = (
+        DownloadCache(os.path.abspath(args.download_cache), args.download_cache_size)
+        if args.download_cache
+        else None
+    )
 
-        file_manager = FileManager(local_dir)
-        oss_synchronizer = OSSSynchronizer(file_manager, bucket)
+    # 同步速度记录
+    history = ThroughputHistory(args.history) if args.history else None
 
-        if direction == 'local-to-remote':
-            logger.info(f'开始同步 {local_dir}（本地）-> {oss_config.get("bucket", "Unknown Bucket")}（OSS）')
-            oss_synchronizer.sync_from_local_to_oss()
-        else:
-            logger.info(f'开始同步 {oss_config.get("bucket", "Unknown Bucket")}（OSS） -> {local_dir}（本地）')
-            oss_synchronizer.sync_from_oss_to_local()
+    # 要执行的同步计划和试运行得到的同步计划，以同步单元描述为键
+    plans: Optional[Dict[str, SyncPlan]] = None
+    if args.apply_plan:
+        try:
+            plans = load_plans(args.apply_plan)
+        except (OSError, ValueError) as err:
+            logger.error(f'加载同步计划 "{args.apply_plan}" 失败： {err}')
+            exit(1)
+    dry_run_plans: Dict[str, SyncPlan] = {}
+
+    try:
+        for config_item, (upload_limiter, download_limiter) in zip(config, unit_limiters):
+            oss_type = config_item['oss_type']
+            oss_config_path = config_item['oss_config']
+            local_dir = config_item['local_dir']
+            direction = config_item['direction']
+
+            # 同一个文件夹的打包索引只能由一台机器更新
+            if config_item['pack_threshold'] and args.shard_count > 1:
+                logger.error('主配置字段 "pack_threshold" 不能与 --shard-count 一起使用。')
+                exit(1)
+
+            # 打包任务需要根据检查时的打包索引执行
+            if config_item['pack_threshold'] and plans is not None:
+                logger.error('主配置字段 "pack_threshold" 不能与 --apply-plan 一起使用。')
+                exit(1)
+
+            bucket, oss_config = get_bucket(oss_type, oss_config_path)
+
+            dest_bucket, dest_oss_config = None, None
+            if direction == 'remote-to-remote':
+                dest_bucket, dest_oss_config = get_bucket(config_item['dest_oss_type'], config_item['dest_oss_config'])
+
+            async_bucket = None
+            if async_bucket_class is not None:
+                if oss_type == 'aliyun-oss':
+                    async_bucket = async_bucket_class(bucket, args.max_requests)
+                else:
+                    logger.warning(f'asyncio 传输引擎不支持 OSS 类型 "{oss_type}" ，该同步单元使用线程池。')
+
+            file_manager = FileManager(local_dir, hardlink=config_item['hardlink']) if local_dir else None
+            oss_synchronizer = OSSSynchronizer(
+                file_manager,
+                bucket,
+                compress=config_item['compress'],
+                compare_mode=config_item['compare_mode'],
+                path_filter=(
+                    PathFilter(config_item['include'], config_item['exclude'])
+                    if config_item['include'] or config_item['exclude']
+                    else None
+                ),
+                remote_prefix=config_item['remote_prefix'],
+                upload_limiters=[global_upload_limiter, upload_limiter],
+                download_limiters=[global_download_limiter, download_limiter],
+                shard_index=args.shard_index,
+                shard_count=args.shard_count,
+                memory_budget=memory_budget,
+                verbose=args.verbose,
+                progress_interval=args.progress_interval,
+                hash_index=hash_index,
+                verify_crc64=args.crc64,
+                append_patterns=config_item['append'],
+                dest_bucket=dest_bucket,
+                dest_prefix=config_item['dest_remote_prefix'],
+                dir_cache=args.dir_cache,
+                full_scan=args.full_scan,
+                pack_threshold=config_item['pack_threshold'],
+                download_cache=download_cache,
+                async_bucket=async_bucket,
+                dry_run=args.dry_run
+            )
+
+            bucket_name = f'{oss_config.get("bucket", "Unknown Bucket")}/{config_item["remote_prefix"]}'
+
+            if args.shard_count > 1:
+                bucket_name += f'（分片 {args.shard_index}/{args.shard_count}）'
+
+            # 同步单元描述，也用于对应同步计划和同步速度记录
+            if direction == 'local-to-remote':
+                unit = f'{local_dir}（本地）-> {bucket_name}（OSS）'
+                sync = oss_synchronizer.sync_from_local_to_oss
+            elif direction == 'remote-to-remote':
+                dest_bucket_name = (
+                    f'{dest_oss_config.get("bucket", "Unknown Bucket")}/{config_item["dest_remote_prefix"]}'
+                )
+                unit = f'{bucket_name}（OSS） -> {dest_bucket_name}（OSS）'
+                sync = oss_synchronizer.sync_from_oss_to_oss
+            else:
+                unit = f'{bucket_name}（OSS） -> {local_dir}（本地）'
+                sync = oss_synchronizer.sync_from_oss_to_local
+
+            plan = None
+            if plans is not None:
+                plan = plans.get(unit)
+                if plan is None:
+                    logger.warning(f'同步计划中没有 {unit} ，跳过该同步单元。')
+                    continue
+                logger.info(
+                    f'开始执行 {unit} 的同步计划（生成于 {format_duration(time.time() - plan.created)} 前）：'
+                    f'{plan.format_summary()}'
+                )
+            else:
+                logger.info(f'{"开始试运行" if args.dry_run else "开始同步"} {unit}')
+
+            sync(plan)
+
+            if not args.dry_run:
+                if history is not None:
+                    progress = oss_synchronizer.progress
+                    history.record(unit, direction, progress.done, progress.done_bytes, progress.elapsed)
+                continue
+
+            dry_run_plan = dry_run_plans[unit] = oss_synchronizer.plan
+            logger.info(f'试运行完成：{dry_run_plan.format_summary()}')
+
+            if history is not None:
+                estimate = history.estimate(
+                    unit,
+                    direction,
+                    len(dry_run_plan.entries),
+                    sum(entry.size for entry in dry_run_plan.entries)
+                )
+                if estimate is None:
+                    logger.info('没有同步速度记录，无法估计用时。')
+                else:
+                    reference = '同方向其它同步单元' if estimate.fallback else '该同步单元'
+                    logger.info(
+                        f'预计用时 {format_duration(estimate.seconds)}（按{reference}最近 {estimate.runs} 次同步的速度估计）'
+                    )
+
+    finally:
+        if hash_index is not None:
+            hash_index.close()
+
+    if args.save_plan:
+        try:
+            dump_plans(dry_run_plans, args.save_plan)
+        except OSError as err:
+            logger.error(f'保存同步计划到 "{args.save_plan}" 失败： {err}')
+            exit(1)
+        logger.info(f'同步计划已保存到 "{args.save_plan}"')
 
 
 if __name__ == '__main__':
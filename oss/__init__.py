@@ -1,11 +1,59 @@
 # -*- coding: utf-8 -*-
 
-from .abstract_oss import OssBucket
-from .aliyun_oss import AliyunOssBucket
-from .tencent_cos import QcloudCosBucket
+import importlib
+from typing import Dict, Tuple, Type
+
+from .abstract_oss import ObjectInfo, OssBucket
+
+# OSS 类型注册表： OSS 类型 -> (模块名, 类名)
+# 各后端模块只在对应类型被使用时才导入，避免每次启动都加载用不到的 SDK
+oss_bucket_registry: Dict[str, Tuple[str, str]] = {
+    'tencent-cos': ('.tencent_cos', 'QcloudCosBucket'),
+    'aliyun-oss': ('.aliyun_oss', 'AliyunOssBucket'),
+}
+
+
+def get_oss_bucket_class(oss_type: str) -> Type[OssBucket]:
+    """获取 OSS 类型对应的 OssBucket 子类
+
+    首次获取某个类型时才会导入其所在模块
+
+    Args:
+        oss_type: OSS 类型，必须是 oss_bucket_registry 中的键
+
+    Returns:
+        对应的 OssBucket 子类
+
+    Raises:
+        ValueError: 未注册的 OSS 类型
+
+    """
+
+    if oss_type not in oss_bucket_registry:
+        raise ValueError(f'未知的 OSS 类型： "{oss_type}"')
+
+    module_name, class_name = oss_bucket_registry[oss_type]
+    module = importlib.import_module(module_name, __name__)
+
+    return getattr(module, class_name)
+
+
+def __getattr__(name: str) -> Type[OssBucket]:
+    """按需导入 OssBucket 子类，兼容 `from oss import AliyunOssBucket` 的写法
+    """
+
+    for oss_type, (_, class_name) in oss_bucket_registry.items():
+        if class_name == name:
+            return get_oss_bucket_class(oss_type)
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 __all__ = [
+    'ObjectInfo',
     'OssBucket',
     'AliyunOssBucket',
     'QcloudCosBucket',
+    'oss_bucket_registry',
+    'get_oss_bucket_class',
 ]
@@ -5,7 +5,48 @@
 该模块定义了一个抽象的 OSS Bucket 类
 """
 
-from typing import Dict, List, Optional, Tuple
+import base64
+import logging
+from datetime import datetime, timezone
+from hashlib import md5
+from typing import BinaryIO, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+class ObjectInfo(NamedTuple):
+    """列出对象时得到的对象信息
+    """
+
+    # 对象 Key
+    key: str
+
+    # 对象 ETag （不含引号）
+    etag: str
+
+    # 对象大小（字节）
+    size: int
+
+    # 对象最后修改时间（ Unix 时间戳）
+    last_modified: float
+
+    # 是否是可追加的对象（由追加上传创建），这类对象的 ETag 不是内容的 MD5
+    appendable: bool = False
+
+
+def parse_last_modified(value: str) -> float:
+    """解析列出对象结果中的 LastModified 字段
+
+    Args:
+        value: ISO 8601 格式的 UTC 时间，比如 '2020-11-27T08:00:00.000Z'
+
+    Returns:
+        Unix 时间戳
+
+    """
+
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc).timestamp()
 
 
 class OssBucket:
@@ -353,18 +394,57 @@ class OssBucket:
         '.xap': 'application/x-silverlight-app',
     }
 
-    def list_objects(self) -> Optional[List[Tuple[str, str]]]:
+    # 可以压缩传输的 Content-Type （以 '/' 结尾的表示该类型下的所有子类型）
+    compressible_content_types: List[str] = [
+        'text/',
+        'application/x-javascript',
+        'application/javascript',
+        'application/json',
+        'application/xml',
+        'application/postscript',
+        'application/x-latex',
+        'application/x-perl',
+        'image/svg+xml',
+    ]
+
+    # 用户自定义元数据的请求头前缀，由子类指定
+    meta_prefix: str = 'x-oss-meta-'
+
+    # 保存原始内容（压缩前） MD5 的元数据名
+    content_md5_meta: str = 'oss-sync-md5'
+
+    # 保存本地文件修改时间（ Unix 时间戳）的元数据名
+    mtime_meta: str = 'oss-sync-mtime'
+
+    # 响应头中对象内容 CRC64-ECMA 的字段名（小写），由子类指定，不支持时为 None
+    crc64_header: Optional[str] = None
+
+    # 响应头中对象类型的字段名（小写），由子类指定，不支持时为 None
+    object_type_header: Optional[str] = None
+
+    # 是否支持追加上传（ .append_object ）
+    supports_append: bool = False
+
+    # 服务端复制（ .copy_object ）支持的最大对象大小（字节），由子类指定
+    copy_size_limit: int = 1024 ** 3
+
+    # 分片上传的最大分片数
+    max_parts: int = 10000
+
+    def list_objects(self, prefix: str = '') -> Optional[List[ObjectInfo]]:
         """列出对象
 
         列出 Bucket 中的对象
 
+        Args:
+            prefix: 只列出 Key 以此开头的对象（可选），默认列出所有对象
+
         Returns:
             正常的话返回以下格式内容
 
             [
-                (obj_key_1, obj_md5_1),
-                (obj_key_2, obj_md5_2),
-                (obj_key_3, obj_md5_3),
+                ObjectInfo(key=obj_key_1, etag=obj_md5_1, size=obj_size_1, last_modified=obj_mtime_1),
+                ObjectInfo(key=obj_key_2, etag=obj_md5_2, size=obj_size_2, last_modified=obj_mtime_2),
                 # ...
             ]
 
@@ -373,21 +453,79 @@ class OssBucket:
         """
         raise NotImplementedError('OSSBucket 的子类中 .list_objects 方法必须被实现')
 
-    def put_object(self, obj_key: str, data: bytes) -> bool:
+    def put_object(
+            self,
+            obj_key: str,
+            data: Union[bytes, BinaryIO],
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None,
+            content_md5: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
         """上传对象
 
         上传对象到 Bucket
 
         Args:
             obj_key: 对象 Key
-            data: 对象内容
+            data: 对象内容，可以是 bytes 或者实现了 .read() 和 __len__ 的流
+            metadata: 用户自定义元数据（可选），键不包含前缀
+            content_encoding: 对象的 Content-Encoding （可选），比如 'gzip'
+            content_md5: 对象内容的 MD5 （可选，十六进制）。 data 是流时，只有指定了才会让服务端校验内容
 
         Returns:
-            是否成功
+            如果成功返回响应头（键均为小写），否则返回 None
 
         """
         raise NotImplementedError('OSSBucket 的子类中 .put_object 方法必须被实现')
 
+    def append_object(
+            self,
+            obj_key: str,
+            data: Union[bytes, BinaryIO],
+            position: int,
+            metadata: Optional[Dict[str, str]] = None,
+            content_md5: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
+        """追加上传对象
+
+        把数据追加到可追加对象的末尾， position 为 0 时创建可追加对象。只有 supports_append 为真的子类需要实现
+
+        Notes:
+            - 已存在的普通对象（由上传或复制创建）不能追加，需要先删除
+            - position 必须等于对象当前的长度，否则会失败
+
+        Args:
+            obj_key: 对象 Key
+            data: 追加的内容，可以是 bytes 或者实现了 .read() 和 __len__ 的流
+            position: 追加的位置，即对象当前的长度
+            metadata: 用户自定义元数据（可选），键不包含前缀，只在创建对象时有效
+            content_md5: 追加的内容的 MD5 （可选，十六进制），由服务端校验
+
+        Returns:
+            如果成功返回响应头（键均为小写），否则返回 None
+
+        """
+        raise NotImplementedError(f'{type(self).__name__} 不支持追加上传')
+
+    def get_object_stream(self, obj_key: str, decode: bool = True) -> Optional[Tuple[BinaryIO, Dict[str, str]]]:
+        """以流的形式下载对象
+
+        下载 Bucket 中的对象，对象内容需要从返回的流中读取。
+        Content-Encoding 为 gzip 的对象，默认读取到的是解压后的内容
+
+        Notes:
+            - 读取完成后需要调用流的 .close() 方法
+
+        Args:
+            obj_key: 对象 Key
+            decode: 是否解压 Content-Encoding 为 gzip 的内容（可选），为 False 时读取到的是对象的原始内容
+
+        Returns:
+            如果成功返回 (对象内容流, 响应头（键均为小写）) ，否则返回 None
+
+        """
+        raise NotImplementedError('OSSBucket 的子类中 .get_object_stream 方法必须被实现')
+
     def get_object(self, obj_key: str) -> Optional[bytes]:
         """下载对象
 
@@ -400,7 +538,222 @@ class OssBucket:
             如果成功返回对象内容，否则返回 None
 
         """
-        raise NotImplementedError('OSSBucket 的子类中 .get_object 方法必须被实现')
+
+        ret = self.get_object_stream(obj_key)
+        if ret is None:
+            return None
+
+        stream, _ = ret
+        try:
+            return stream.read()
+        finally:
+            stream.close()
+
+    def get_object_range(self, obj_key: str, offset: int, size: int) -> Optional[bytes]:
+        """下载对象的一部分
+
+        下载对象原始内容（不解压）中 [offset, offset + size) 范围的数据
+
+        Args:
+            obj_key: 对象 Key
+            offset: 起始位置（字节）
+            size: 大小（字节），必须大于 0
+
+        Returns:
+            如果成功返回该范围的数据，否则返回 None
+
+        """
+        raise NotImplementedError(f'{type(self).__name__} 不支持范围下载')
+
+    def copy_object(self, src_key: str, dst_key: str, source_bucket: Optional['OssBucket'] = None) -> bool:
+        """复制对象
+
+        在服务端将 Bucket 中的对象复制为另一个对象，不需要传输对象内容
+
+        Args:
+            src_key: 源对象 Key
+            dst_key: 目标对象 Key
+            source_bucket: 源对象所在的 Bucket （可选），必须与当前 Bucket 是同一类型，默认为当前 Bucket 。
+                当前 Bucket 的账号需要有读取源 Bucket 的权限
+
+        Returns:
+            是否成功
+
+        """
+        raise NotImplementedError('OSSBucket 的子类中 .copy_object 方法必须被实现')
+
+    def init_multipart_upload(
+            self,
+            obj_key: str,
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None
+    ) -> Optional[str]:
+        """初始化分片上传
+
+        Args:
+            obj_key: 对象 Key
+            metadata: 用户自定义元数据（可选），键不包含前缀
+            content_encoding: 对象的 Content-Encoding （可选），比如 'gzip'
+
+        Returns:
+            如果成功返回 Upload ID ，否则返回 None
+
+        """
+        raise NotImplementedError('OSSBucket 的子类中 .init_multipart_upload 方法必须被实现')
+
+    def upload_part(
+            self,
+            obj_key: str,
+            upload_id: str,
+            part_number: int,
+            data: bytes,
+            content_md5: Optional[str] = None
+    ) -> Optional[str]:
+        """上传分片
+
+        Args:
+            obj_key: 对象 Key
+            upload_id: Upload ID
+            part_number: 分片序号，从 1 开始
+            data: 分片内容
+            content_md5: 分片内容的 MD5 （可选，十六进制），由服务端校验
+
+        Returns:
+            如果成功返回分片的 ETag ，否则返回 None
+
+        """
+        raise NotImplementedError('OSSBucket 的子类中 .upload_part 方法必须被实现')
+
+    def complete_multipart_upload(
+            self,
+            obj_key: str,
+            upload_id: str,
+            parts: List[Tuple[int, str]]
+    ) -> Optional[Dict[str, str]]:
+        """完成分片上传
+
+        Args:
+            obj_key: 对象 Key
+            upload_id: Upload ID
+            parts: (分片序号, 分片 ETag) 的列表，按分片序号排列
+
+        Returns:
+            如果成功返回响应头（键均为小写），否则返回 None
+
+        """
+        raise NotImplementedError('OSSBucket 的子类中 .complete_multipart_upload 方法必须被实现')
+
+    def abort_multipart_upload(self, obj_key: str, upload_id: str) -> bool:
+        """取消分片上传，已上传的分片会被删除
+
+        Args:
+            obj_key: 对象 Key
+            upload_id: Upload ID
+
+        Returns:
+            是否成功
+
+        """
+        raise NotImplementedError('OSSBucket 的子类中 .abort_multipart_upload 方法必须被实现')
+
+    def put_object_multipart(
+            self,
+            obj_key: str,
+            stream: BinaryIO,
+            size: int,
+            part_size: int,
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None,
+            verify: Optional[Callable[[], Optional[str]]] = None
+    ) -> Optional[Dict[str, str]]:
+        """以分片上传的方式上传流
+
+        依次读取并上传每个分片，同时只有一个分片在内存中，每个分片都带上 Content-MD5 由服务端校验。
+        分片数超过 max_parts 时会自动增大分片大小
+
+        Args:
+            obj_key: 对象 Key
+            stream: 对象内容流
+            size: 对象大小（字节）
+            part_size: 分片大小（字节）
+            metadata: 用户自定义元数据（可选），键不包含前缀
+            content_encoding: 对象的 Content-Encoding （可选），比如 'gzip'
+            verify: 校验方法（可选）。所有分片上传完成后、完成分片上传前调用，返回错误描述时放弃上传
+
+        Returns:
+            如果成功返回完成分片上传的响应头（键均为小写），否则返回 None
+
+        """
+
+        part_size = max(part_size, -(-size // self.max_parts))
+
+        upload_id = self.init_multipart_upload(obj_key, metadata, content_encoding)
+        if upload_id is None:
+            return None
+
+        completed = False
+        try:
+            parts = []
+            while True:
+                data = self._read_part(stream, part_size)
+                if not data:
+                    break
+
+                part_number = len(parts) + 1
+                etag = self.upload_part(obj_key, upload_id, part_number, data, md5(data).hexdigest())
+                if etag is None:
+                    return None
+                parts.append((part_number, etag))
+
+            error = verify() if verify is not None else None
+            if error is not None:
+                logger.error(f'分片上传 {obj_key} 前校验失败： {error}')
+                return None
+
+            headers = self.complete_multipart_upload(obj_key, upload_id, parts)
+            completed = headers is not None
+            return headers
+
+        finally:
+            # 失败时取消上传，避免已上传的分片占用存储空间
+            if not completed:
+                self.abort_multipart_upload(obj_key, upload_id)
+
+    @staticmethod
+    def _read_part(stream: BinaryIO, part_size: int) -> bytes:
+        """从流中读取一个分片，流的每次读取可能少于请求的字节数
+
+        Args:
+            stream: 对象内容流
+            part_size: 分片大小（字节）
+
+        Returns:
+            分片内容，读到末尾时返回 b''
+
+        """
+
+        chunks = []
+        remaining = part_size
+        while remaining > 0:
+            chunk = stream.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+
+        return b''.join(chunks)
+
+    def head_object(self, obj_key: str) -> Optional[Dict[str, str]]:
+        """查询对象元信息
+
+        Args:
+            obj_key: 对象 Key
+
+        Returns:
+            如果成功返回响应头（键均为小写），否则返回 None
+
+        """
+        raise NotImplementedError('OSSBucket 的子类中 .head_object 方法必须被实现')
 
     def del_object(self, obj_key: str) -> bool:
         """删除对象
@@ -429,3 +782,88 @@ class OssBucket:
 
         ext = f'.{obj_key.split(".")[-1]}' if '.' in obj_key else '.whatever'
         return self.content_type_map.get(ext, 'application/octet-stream')
+
+    def is_compressible(self, obj_key: str) -> bool:
+        """判断对象内容是否适合压缩传输
+
+        Args:
+            obj_key: 对象 Key
+
+        Returns:
+            对象的 Content-Type 是否属于 compressible_content_types
+
+        """
+
+        content_type = self.get_content_type(obj_key)
+        return any(
+            content_type.startswith(t) if t.endswith('/') else content_type == t
+            for t
+            in self.compressible_content_types
+        )
+
+    def verify_checksum(
+            self,
+            headers: Dict[str, str],
+            content_md5: Optional[str] = None,
+            crc64: Optional[int] = None,
+            decoded: bool = False
+    ) -> Optional[str]:
+        """校验传输的内容
+
+        把传输时计算的校验与响应头中的 Content-MD5 、 ETag （不是分片上传或追加上传的对象）和 CRC64 比较。
+        压缩上传的对象下载时读到的是解压后的内容，此时只能与元数据中记录的原始内容 MD5 比较
+
+        Args:
+            headers: 上传或下载的响应头（键均为小写）
+            content_md5: 传输的内容的 MD5 （可选，十六进制）
+            crc64: 传输的内容的 CRC64 （可选）
+            decoded: 传输的内容是否是按 Content-Encoding 解码后的内容
+
+        Returns:
+            不一致时返回描述，一致或无法校验时返回 None
+
+        """
+
+        if decoded and headers.get('content-encoding', '').lower() == 'gzip':
+            expected_md5 = headers.get(f'{self.meta_prefix}{self.content_md5_meta}')
+            crc64 = None
+        elif headers.get('content-md5'):
+            expected_md5 = base64.b64decode(headers['content-md5']).hex()
+        else:
+            etag = headers.get('etag', '').strip('"')
+            appendable = (
+                self.object_type_header is not None
+                and headers.get(self.object_type_header, '').lower() == 'appendable'
+            )
+            expected_md5 = etag if etag and '-' not in etag and not appendable else None
+
+        if content_md5 is not None and expected_md5 and content_md5 != expected_md5.lower():
+            return f'MD5 不一致（传输 {content_md5} ，服务端 {expected_md5.lower()}）'
+
+        expected_crc64 = headers.get(self.crc64_header) if self.crc64_header else None
+        if crc64 is not None and expected_crc64 and crc64 != int(expected_crc64):
+            return f'CRC64 不一致（传输 {crc64} ，服务端 {expected_crc64}）'
+
+        return None
+
+    def get_metadata(self, obj_key: str) -> Optional[Dict[str, str]]:
+        """获取对象的用户自定义元数据
+
+        Args:
+            obj_key: 对象 Key
+
+        Returns:
+            如果成功返回用户自定义元数据（键不包含前缀），否则返回 None
+
+        """
+
+        headers = self.head_object(obj_key)
+        if headers is None:
+            return None
+
+        return {
+            key[len(self.meta_prefix):]: value
+            for key, value
+            in headers.items()
+            if key.startswith(self.meta_prefix)
+        }
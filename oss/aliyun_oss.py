@@ -6,23 +6,58 @@
 """
 
 import base64
-import hmac
 import logging
-import time
-from hashlib import sha1, md5
-from typing import Dict, List, Optional, Tuple
+import re
+from hashlib import md5
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 from urllib.parse import quote
 from xml.etree import ElementTree
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from .abstract_oss import OssBucket
+from .abstract_oss import ObjectInfo, OssBucket, parse_last_modified
+from .aliyun_signer import AliyunOssSigner
 
 
 logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
 
 
+def parse_list_result(text: str) -> Tuple[List[ObjectInfo], Optional[str]]:
+    """解析列出对象（ GetBucket ）的响应
+
+    Args:
+        text: XML 格式的响应内容
+
+    Returns:
+        (本页的对象列表, 下一页开始的 Key) ，已经是最后一页时后者为 None
+
+    """
+
+    etree = ElementTree.fromstring(text)
+
+    objs_list = [
+        ObjectInfo(
+            key=content.find('Key').text,
+            etag=content.find('ETag').text[1:-1],
+            size=int(content.find('Size').text),
+            last_modified=parse_last_modified(content.find('LastModified').text),
+            appendable=content.findtext('Type') == 'Appendable'
+        )
+        for content
+        in etree.findall('Contents')
+    ]
+
+    marker = etree.findall('NextMarker')
+    return objs_list, marker[0].text if marker else None
+
+
 class AliyunOssBucket(OssBucket):
+    meta_prefix: str = 'x-oss-meta-'
+    crc64_header: str = 'x-oss-hash-crc64ecma'
+    object_type_header: str = 'x-oss-object-type'
+    supports_append: bool = True
+
     def __init__(self, config: Dict[str, str]) -> None:
         """初始化
 
@@ -41,65 +76,59 @@ class AliyunOssBucket(OssBucket):
         assert self.access_key_id, 'access_key_id 参数的值不能为空'
         assert self.access_key_secret, 'access_key_secret 参数的值不能为空'
 
-    def make_auth(self, auth_info: dict) -> str:
-        """计算签名
+        # 协议默认为 HTTPS ，使用本地模拟服务等场景时可以指定为 HTTP
+        self.scheme: str = str(config.get('scheme', 'https')).lower()
+        self.endpoint: str = f'{self.scheme}://{self.host}'
 
-        Args:
-            auth_info: 与签名相关的信息
-
-        Returns:
-            签名结果
+        assert self.scheme in ('http', 'https'), 'scheme 参数的值只能是 http 或 https'
 
-        """
+        # 签名版本和地域，地域默认从访问域名（比如 'bucket.oss-cn-hangzhou.aliyuncs.com' ）中获取
+        region = config.get('region')
+        if not region:
+            match = re.search(r'oss-([a-z0-9-]+?)(?:-internal)?\.aliyuncs\.com', self.host)
+            region = match.group(1) if match else None
 
-        verb = auth_info.get('verb')
-        content_md5 = auth_info.get('content-md5') or ''
-        content_type = auth_info.get('content-type') or ''
-        date = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime())
-        canonicalized_oss_headers = auth_info.get('canonicalized_oss_headers') or ''
-        canonicalized_resource = auth_info.get('canonicalized_resource') or f'/{self.bucket}/'
-
-        logger.debug(f'verb = \'{verb}\'')
-        logger.debug(f'content_md5 = \'{content_md5}\'')
-        logger.debug(f'content_type = \'{content_type}\'')
-        logger.debug(f'date = \'{date}\'')
-        logger.debug(f'canonicalized_oss_headers = \'{canonicalized_oss_headers}\'')
-        logger.debug(f'canonicalized_resource = \'{canonicalized_resource}\'')
-
-        string_to_sign = (
-            f'{verb}\n'
-            f'{content_md5}\n'
-            f'{content_type}\n'
-            f'{date}\n'
-            f'{canonicalized_oss_headers}{canonicalized_resource}'
+        self.signer: AliyunOssSigner = AliyunOssSigner(
+            self.access_key_id,
+            self.access_key_secret,
+            self.bucket,
+            signature_version=str(config.get('signature_version', 'v1')).lower(),
+            region=region
         )
-        logger.debug(f'string_to_sign = \'{string_to_sign}\'')
 
-        signature = base64.b64encode(
-            hmac.new(
-                key=self.access_key_secret.encode('utf-8'),
-                msg=string_to_sign.encode('utf-8'),
-                digestmod=sha1
-            ).digest()
-        ).decode('utf-8')
+        # 所有请求共用一个连接池，连接池大小应不小于同步线程数
+        self.session: requests.Session = requests.Session()
+        self.session.mount(f'{self.scheme}://', HTTPAdapter(pool_maxsize=int(config.get('max_connections', 64))))
+
+    def presign_url(self, obj_key: str, expires: int = 3600, verb: str = 'GET') -> str:
+        """生成预签名 URL
 
-        auth_header = f'OSS {self.access_key_id}:{signature}'
-        logger.debug(f'auth_header = \'{auth_header}\'')
+        Args:
+            obj_key: 对象 Key
+            expires: 有效期（秒）
+            verb: 请求方法（可选），默认为 'GET'
 
-        return auth_header
+        Returns:
+            预签名 URL
+
+        """
 
-    def list_objects(self) -> Optional[List[Tuple[str, str]]]:
+        return self.signer.presign_url(self.host, verb, obj_key, expires, self.scheme)
+
+    def list_objects(self, prefix: str = '') -> Optional[List[ObjectInfo]]:
         """列出对象
 
         列出 Bucket 中的对象
 
+        Args:
+            prefix: 只列出 Key 以此开头的对象（可选），默认列出所有对象
+
         Returns:
             正常的话返回以下格式内容
 
             [
-                (obj_key_1, obj_md5_1),
-                (obj_key_2, obj_md5_2),
-                (obj_key_3, obj_md5_3),
+                ObjectInfo(key=obj_key_1, etag=obj_md5_1, size=obj_size_1, last_modified=obj_mtime_1),
+                ObjectInfo(key=obj_key_2, etag=obj_md5_2, size=obj_size_2, last_modified=obj_mtime_2),
                 # ...
             ]
 
@@ -117,19 +146,15 @@ class AliyunOssBucket(OssBucket):
 
             logger.debug(f'marker = \'{marker}\'')
 
-            headers = {
-                'Host': self.host,
-                'Date': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime()),
-                'Authorization': self.make_auth({
-                    'verb': 'GET',
-                })
+            params = {
+                key: value
+                for key, value
+                in [('prefix', prefix), ('marker', marker)]
+                if value
             }
+            headers = self.signer.sign('GET', headers={'Host': self.host}, params=params)
 
-            ret = requests.get(
-                f'https://{self.host}/',
-                headers=headers,
-                params={'marker': marker} if marker else None
-            )
+            ret = self.session.get(f'{self.endpoint}/', headers=headers, params=params or None)
             logger.debug(f'ret = {ret}')
 
             if ret.status_code != 200:
@@ -139,103 +164,448 @@ class AliyunOssBucket(OssBucket):
                 )
                 return None
 
-            etree = ElementTree.fromstring(ret.text)
-
-            for content in etree.findall('Contents'):
-                objs_list.append((content.find('Key').text, content.find('ETag').text[1:-1]))
-
-            marker = etree.findall('NextMarker')
-            if marker:
-                marker = marker[0].text
-            else:
+            objs, marker = parse_list_result(ret.text)
+            objs_list.extend(objs)
+            if marker is None:
                 break
 
             logger.debug(f'next_marker = \'{marker}\'')
 
-        logger.debug(f'Remote Objects:')
-        for i in objs_list:
-            logger.debug(f'  - {i}')
+        # 对象很多时逐行格式化的开销不可忽略，只在开启调试日志时输出
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Remote Objects:')
+            for i in objs_list:
+                logger.debug(f'  - {i}')
 
         return objs_list
 
-    def put_object(self, obj_key: str, data: bytes) -> bool:
+    def put_object(
+            self,
+            obj_key: str,
+            data: Union[bytes, BinaryIO],
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None,
+            content_md5: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
         """上传对象
 
         上传对象到 Bucket
 
         Args:
             obj_key: 对象 Key
-            data: 对象内容
+            data: 对象内容，可以是 bytes 或者实现了 .read() 和 __len__ 的流
+            metadata: 用户自定义元数据（可选），键不包含前缀
+            content_encoding: 对象的 Content-Encoding （可选），比如 'gzip'
+            content_md5: 对象内容的 MD5 （可选，十六进制）。 data 是流时，只有指定了才会让服务端校验内容
 
         Returns:
-            是否成功
+            如果成功返回响应头（键均为小写），否则返回 None
+
+        """
+
+        headers = self.sign_put_object(obj_key, data, metadata, content_encoding, content_md5)
+
+        ret = self.session.put(f'{self.endpoint}/{quote(obj_key)}', data=data, headers=headers)
+        logger.debug(f'ret = {ret}')
+
+        if ret.status_code != 200:
+            logger.error(
+                '请求阿里云 OSS 上传对象失败： '
+                f'[{ret.status_code}] \'{ret.url}\' {ret.headers} - {ret.text}'
+            )
+            return None
+
+        return {key.lower(): value for key, value in ret.headers.items()}
+
+    def sign_put_object(
+            self,
+            obj_key: str,
+            data: Union[bytes, BinaryIO],
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None,
+            content_md5: Optional[str] = None
+    ) -> Dict[str, str]:
+        """生成上传对象的请求头并签名
+
+        参数同 put_object ，供同步和异步的客户端共用
+
+        Returns:
+            签名后的请求头
 
         """
 
         content_type = self.get_content_type(obj_key)
 
         # 计算Content-MD5
-        content_md5 = base64.b64encode(md5(data).digest()).decode('ascii')
+        if content_md5 is not None:
+            content_md5 = base64.b64encode(bytes.fromhex(content_md5)).decode('ascii')
+        elif isinstance(data, bytes):
+            content_md5 = base64.b64encode(md5(data).digest()).decode('ascii')
+        else:
+            content_md5 = ''
 
         headers = {
             'Host': self.host,
-            'Date': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime()),
             'Content-Type': content_type,
-            'Content-MD5': content_md5,
             'Content-Disposition': 'inline',
-            'Authorization': self.make_auth({
-                'verb': 'PUT',
-                'content-md5': content_md5,
-                'content-type': content_type,
-                'canonicalized_resource': f'/{self.bucket}/{obj_key}'
-            })
+            # 用户自定义元数据，需要参与签名
+            **{
+                f'{self.meta_prefix}{key.lower()}': value
+                for key, value
+                in (metadata or {}).items()
+            }
+        }
+        if content_md5:
+            headers['Content-MD5'] = content_md5
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
+
+        return self.signer.sign('PUT', obj_key, headers)
+
+    def append_object(
+            self,
+            obj_key: str,
+            data: Union[bytes, BinaryIO],
+            position: int,
+            metadata: Optional[Dict[str, str]] = None,
+            content_md5: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
+        """追加上传对象
+
+        把数据追加到可追加对象的末尾， position 为 0 时创建可追加对象
+
+        Notes:
+            - 已存在的普通对象（由上传或复制创建）不能追加，需要先删除
+            - position 必须等于对象当前的长度，否则会失败
+            - 响应头中的 CRC64 是追加后整个对象的 CRC64
+
+        Args:
+            obj_key: 对象 Key
+            data: 追加的内容，可以是 bytes 或者实现了 .read() 和 __len__ 的流
+            position: 追加的位置，即对象当前的长度
+            metadata: 用户自定义元数据（可选），键不包含前缀，只在创建对象时有效
+            content_md5: 追加的内容的 MD5 （可选，十六进制），由服务端校验
+
+        Returns:
+            如果成功返回响应头（键均为小写），否则返回 None
+
+        """
+
+        headers = {
+            'Host': self.host,
+            'Content-Type': self.get_content_type(obj_key),
+            'Content-Disposition': 'inline',
+            **{
+                f'{self.meta_prefix}{key.lower()}': value
+                for key, value
+                in (metadata or {}).items()
+            }
         }
+        if content_md5 is not None:
+            headers['Content-MD5'] = base64.b64encode(bytes.fromhex(content_md5)).decode('ascii')
+        headers = self.signer.sign('POST', obj_key, headers, params={'append': None, 'position': str(position)})
+
+        # requests 会丢弃值为 None 的参数，直接拼接查询字符串
+        ret = self.session.post(
+            f'{self.endpoint}/{quote(obj_key)}?append&position={position}',
+            data=data,
+            headers=headers
+        )
+        logger.debug(f'ret = {ret}')
+
+        if ret.status_code != 200:
+            logger.error(
+                '请求阿里云 OSS 追加上传对象失败： '
+                f'[{ret.status_code}] \'{ret.url}\' {ret.headers} - {ret.text}'
+            )
+            return None
+
+        return {key.lower(): value for key, value in ret.headers.items()}
+
+    def get_object_stream(self, obj_key: str, decode: bool = True) -> Optional[Tuple[BinaryIO, Dict[str, str]]]:
+        """以流的形式下载对象
+
+        下载 Bucket 中的对象，对象内容需要从返回的流中读取。
+        Content-Encoding 为 gzip 的对象，默认读取到的是解压后的内容
+
+        Notes:
+            - 读取完成后需要调用流的 .close() 方法
+
+        Args:
+            obj_key: 对象 Key
+            decode: 是否解压 Content-Encoding 为 gzip 的内容（可选），为 False 时读取到的是对象的原始内容
+
+        Returns:
+            如果成功返回 (对象内容流, 响应头（键均为小写）) ，否则返回 None
+
+        """
 
-        ret = requests.put(f'https://{self.host}/{quote(obj_key)}', data=data, headers=headers)
+        headers = self.signer.sign('GET', obj_key, {'Host': self.host})
+
+        ret = self.session.get(f'{self.endpoint}/{quote(obj_key)}', headers=headers, stream=True)
         logger.debug(f'ret = {ret}')
 
         if ret.status_code != 200:
             logger.error(
-                '请求阿里云 OSS 上传对象失败： '
+                '请求阿里云 OSS 下载对象失败： '
+                f'[{ret.status_code}] \'{ret.url}\' {ret.headers} - {ret.text}'
+            )
+            return None
+
+        # 让原始响应流自动解压 Content-Encoding 为 gzip 的内容
+        ret.raw.decode_content = decode
+
+        return ret.raw, {key.lower(): value for key, value in ret.headers.items()}
+
+    def get_object_range(self, obj_key: str, offset: int, size: int) -> Optional[bytes]:
+        """下载对象的一部分
+
+        下载对象原始内容（不解压）中 [offset, offset + size) 范围的数据
+
+        Args:
+            obj_key: 对象 Key
+            offset: 起始位置（字节）
+            size: 大小（字节），必须大于 0
+
+        Returns:
+            如果成功返回该范围的数据，否则返回 None
+
+        """
+
+        headers = self.signer.sign('GET', obj_key, {
+            'Host': self.host,
+            'Range': f'bytes={offset}-{offset + size - 1}',
+            'Accept-Encoding': 'identity',
+        })
+
+        ret = self.session.get(f'{self.endpoint}/{quote(obj_key)}', headers=headers)
+        logger.debug(f'ret = {ret}')
+
+        # 范围不合法时服务端会忽略 Range 返回整个对象
+        if ret.status_code != 206 or len(ret.content) != size:
+            logger.error(
+                '请求阿里云 OSS 范围下载对象失败： '
+                f'[{ret.status_code}] \'{ret.url}\' {ret.headers} - {ret.text[:200]}'
+            )
+            return None
+
+        return ret.content
+
+    def copy_object(self, src_key: str, dst_key: str, source_bucket: Optional['AliyunOssBucket'] = None) -> bool:
+        """复制对象
+
+        在服务端将 Bucket 中的对象复制为另一个对象，不需要传输对象内容
+
+        Notes:
+            - 只能复制同一地域内的 Bucket 中不超过 1 GB 的对象
+
+        Args:
+            src_key: 源对象 Key
+            dst_key: 目标对象 Key
+            source_bucket: 源对象所在的 Bucket （可选），默认为当前 Bucket 。当前 Bucket 的账号需要有读取源 Bucket 的权限
+
+        Returns:
+            是否成功
+
+        """
+
+        headers = self.signer.sign('PUT', dst_key, {
+            'Host': self.host,
+            'x-oss-copy-source': f'/{(source_bucket or self).bucket}/{quote(src_key)}',
+        })
+
+        ret = self.session.put(f'{self.endpoint}/{quote(dst_key)}', headers=headers)
+        logger.debug(f'ret = {ret}')
+
+        if ret.status_code != 200:
+            logger.error(
+                '请求阿里云 OSS 复制对象失败： '
                 f'[{ret.status_code}] \'{ret.url}\' {ret.headers} - {ret.text}'
             )
             return False
 
         return True
 
-    def get_object(self, obj_key: str) -> Optional[bytes]:
-        """下载对象
-
-        下载 Bucket 中的对象
+    def init_multipart_upload(
+            self,
+            obj_key: str,
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None
+    ) -> Optional[str]:
+        """初始化分片上传
 
         Args:
             obj_key: 对象 Key
+            metadata: 用户自定义元数据（可选），键不包含前缀
+            content_encoding: 对象的 Content-Encoding （可选），比如 'gzip'
 
         Returns:
-            如果成功返回对象内容，否则返回 None
+            如果成功返回 Upload ID ，否则返回 None
 
         """
 
         headers = {
             'Host': self.host,
-            'Date': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime()),
-            'Authorization': self.make_auth({
-                'verb': 'GET',
-                'canonicalized_resource': f'/{self.bucket}/{obj_key}'
-            })
+            'Content-Type': self.get_content_type(obj_key),
+            'Content-Disposition': 'inline',
+            **{
+                f'{self.meta_prefix}{key.lower()}': value
+                for key, value
+                in (metadata or {}).items()
+            }
         }
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
+        headers = self.signer.sign('POST', obj_key, headers, params={'uploads': None})
 
-        ret = requests.get(f'https://{self.host}/{quote(obj_key)}', headers=headers)
+        # requests 会丢弃值为 None 的参数，直接拼接查询字符串
+        ret = self.session.post(f'{self.endpoint}/{quote(obj_key)}?uploads', headers=headers)
         logger.debug(f'ret = {ret}')
 
         if ret.status_code != 200:
             logger.error(
-                '请求阿里云 OSS 下载对象失败： '
+                '请求阿里云 OSS 初始化分片上传失败： '
                 f'[{ret.status_code}] \'{ret.url}\' {ret.headers} - {ret.text}'
             )
             return None
 
-        return ret.content
+        return ElementTree.fromstring(ret.text).findtext('UploadId')
+
+    def upload_part(
+            self,
+            obj_key: str,
+            upload_id: str,
+            part_number: int,
+            data: bytes,
+            content_md5: Optional[str] = None
+    ) -> Optional[str]:
+        """上传分片
+
+        Args:
+            obj_key: 对象 Key
+            upload_id: Upload ID
+            part_number: 分片序号，从 1 开始
+            data: 分片内容
+            content_md5: 分片内容的 MD5 （可选，十六进制），由服务端校验
+
+        Returns:
+            如果成功返回分片的 ETag ，否则返回 None
+
+        """
+
+        params = {'partNumber': str(part_number), 'uploadId': upload_id}
+        headers = {'Host': self.host}
+        if content_md5 is not None:
+            headers['Content-MD5'] = base64.b64encode(bytes.fromhex(content_md5)).decode('ascii')
+        headers = self.signer.sign('PUT', obj_key, headers, params=params)
+
+        ret = self.session.put(f'{self.endpoint}/{quote(obj_key)}', data=data, headers=headers, params=params)
+        logger.debug(f'ret = {ret}')
+
+        if ret.status_code != 200:
+            logger.error(
+                '请求阿里云 OSS 上传分片失败： '
+                f'[{ret.status_code}] \'{ret.url}\' {ret.headers} - {ret.text}'
+            )
+            return None
+
+        return ret.headers.get('ETag')
+
+    def complete_multipart_upload(
+            self,
+            obj_key: str,
+            upload_id: str,
+            parts: List[Tuple[int, str]]
+    ) -> Optional[Dict[str, str]]:
+        """完成分片上传
+
+        Args:
+            obj_key: 对象 Key
+            upload_id: Upload ID
+            parts: (分片序号, 分片 ETag) 的列表，按分片序号排列
+
+        Returns:
+            如果成功返回响应头（键均为小写），否则返回 None
+
+        """
+
+        root = ElementTree.Element('CompleteMultipartUpload')
+        for part_number, etag in parts:
+            part = ElementTree.SubElement(root, 'Part')
+            ElementTree.SubElement(part, 'PartNumber').text = str(part_number)
+            ElementTree.SubElement(part, 'ETag').text = etag
+        body = ElementTree.tostring(root)
+
+        params = {'uploadId': upload_id}
+        headers = self.signer.sign('POST', obj_key, {
+            'Host': self.host,
+            'Content-Type': 'application/xml',
+            'Content-MD5': base64.b64encode(md5(body).digest()).decode('ascii'),
+        }, params=params)
+
+        ret = self.session.post(f'{self.endpoint}/{quote(obj_key)}', data=body, headers=headers, params=params)
+        logger.debug(f'ret = {ret}')
+
+        if ret.status_code != 200:
+            logger.error(
+                '请求阿里云 OSS 完成分片上传失败： '
+                f'[{ret.status_code}] \'{ret.url}\' {ret.headers} - {ret.text}'
+            )
+            return None
+
+        return {key.lower(): value for key, value in ret.headers.items()}
+
+    def abort_multipart_upload(self, obj_key: str, upload_id: str) -> bool:
+        """取消分片上传，已上传的分片会被删除
+
+        Args:
+            obj_key: 对象 Key
+            upload_id: Upload ID
+
+        Returns:
+            是否成功
+
+        """
+
+        params = {'uploadId': upload_id}
+        headers = self.signer.sign('DELETE', obj_key, {'Host': self.host}, params=params)
+
+        ret = self.session.delete(f'{self.endpoint}/{quote(obj_key)}', headers=headers, params=params)
+        logger.debug(f'ret = {ret}')
+
+        if ret.status_code != 204:
+            logger.error(
+                '请求阿里云 OSS 取消分片上传失败： '
+                f'[{ret.status_code}] \'{ret.url}\' {ret.headers} - {ret.text}'
+            )
+            return False
+
+        return True
+
+    def head_object(self, obj_key: str) -> Optional[Dict[str, str]]:
+        """查询对象元信息
+
+        Args:
+            obj_key: 对象 Key
+
+        Returns:
+            如果成功返回响应头（键均为小写），否则返回 None
+
+        """
+
+        headers = self.signer.sign('HEAD', obj_key, {'Host': self.host})
+
+        ret = self.session.head(f'{self.endpoint}/{quote(obj_key)}', headers=headers)
+        logger.debug(f'ret = {ret}')
+
+        if ret.status_code != 200:
+            logger.error(
+                '请求阿里云 OSS 查询对象元信息失败： '
+                f'[{ret.status_code}] \'{ret.url}\' {ret.headers}'
+            )
+            return None
+
+        return {key.lower(): value for key, value in ret.headers.items()}
 
     def del_object(self, obj_key: str) -> bool:
         """删除对象
@@ -250,16 +620,9 @@ class AliyunOssBucket(OssBucket):
 
         """
 
-        headers = {
-            'Host': self.host,
-            'Date': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime()),
-            'Authorization': self.make_auth({
-                'verb': 'DELETE',
-                'canonicalized_resource': f'/{self.bucket}/{obj_key}'
-            })
-        }
+        headers = self.signer.sign('DELETE', obj_key, {'Host': self.host})
 
-        ret = requests.delete(f'https://{self.host}/{quote(obj_key)}', headers=headers)
+        ret = self.session.delete(f'{self.endpoint}/{quote(obj_key)}', headers=headers)
         logger.debug(f'ret = {ret}')
 
         if ret.status_code != 204:
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+"""阿里云 OSS 异步客户端
+
+基于 aiohttp 实现阿里云 OSS 的列出、上传、下载、复制和删除对象，供 asyncio 传输引擎使用。
+请求头的构造和签名与 .aliyun_oss.AliyunOssBucket 共用
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:
+    # aiohttp 是可选依赖，只有 asyncio 传输引擎需要
+    aiohttp = None
+    yarl = None
+
+from .abstract_oss import ObjectInfo
+from .aliyun_oss import AliyunOssBucket, parse_list_result
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+class AsyncAliyunOssBucket(object):
+    def __init__(self, bucket: AliyunOssBucket, max_requests: int = 1000) -> None:
+        """初始化
+
+        连接（ aiohttp.ClientSession ）属于事件循环，需要在事件循环中用 `async with` 打开，退出时关闭：
+
+            async with async_bucket:
+                await async_bucket.put_object(...)
+
+        Notes:
+            - 同时打开的连接数不超过 max_requests ，需要确保进程可以打开足够多的文件（ ulimit -n ）
+
+        Args:
+            bucket: 阿里云 OSS Bucket ，使用其访问域名和签名
+            max_requests: 同时进行的请求数上限
+
+        """
+
+        assert aiohttp is not None, 'asyncio 传输引擎需要安装 aiohttp'
+        assert max_requests > 0, '同时进行的请求数至少为 1'
+
+        self.bucket: AliyunOssBucket = bucket
+        self.max_requests: int = max_requests
+        self.session: Optional['aiohttp.ClientSession'] = None
+
+    async def __aenter__(self) -> 'AsyncAliyunOssBucket':
+        # 与 requests 一样不设置总超时，大文件的传输时间不可预知
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_requests),
+            timeout=aiohttp.ClientTimeout(total=None)
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+        self.session = None
+
+    def url(self, obj_key: str = '') -> 'yarl.URL':
+        """获取对象的 URL
+
+        Key 已经编码过，不能再让 yarl 重新编码，否则与签名使用的 Key 不一致
+
+        Args:
+            obj_key: 对象 Key
+
+        Returns:
+            对象的 URL
+
+        """
+
+        return yarl.URL(f'{self.bucket.endpoint}/{quote(obj_key)}', encoded=True)
+
+    @staticmethod
+    async def log_error(action: str, ret: 'aiohttp.ClientResponse') -> None:
+        """输出请求失败的日志
+
+        Args:
+            action: 操作名称，比如 '上传对象'
+            ret: 响应
+
+        """
+
+        text = await ret.text(errors='replace')
+        logger.error(f'请求阿里云 OSS {action}失败： [{ret.status}] \'{ret.url}\' {dict(ret.headers)} - {text}')
+
+    async def list_objects(self, prefix: str = '') -> Optional[List[ObjectInfo]]:
+        """列出对象
+
+        参数和返回值同 AliyunOssBucket.list_objects
+
+        """
+
+        objs_list = []
+        marker = None
+
+        while True:
+            params = {
+                key: value
+                for key, value
+                in [('prefix', prefix), ('marker', marker)]
+                if value
+            }
+            headers = self.bucket.signer.sign('GET', headers={'Host': self.bucket.host}, params=params)
+
+            async with self.session.get(self.url(), headers=headers, params=params) as ret:
+                if ret.status != 200:
+                    await self.log_error('列出对象', ret)
+                    return None
+                text = await ret.text()
+
+            objs, marker = parse_list_result(text)
+            objs_list.extend(objs)
+            if marker is None:
+                break
+
+            logger.debug(f'next_marker = \'{marker}\'')
+
+        return objs_list
+
+    async def list_objects_many(self, prefixes: List[str]) -> List[Optional[List[ObjectInfo]]]:
+        """同时列出多个前缀下的对象
+
+        打开连接，列出完成后关闭，可以直接用 asyncio.run 调用
+
+        Args:
+            prefixes: 前缀列表
+
+        Returns:
+            与 prefixes 一一对应的 list_objects 的结果
+
+        """
+
+        async with self:
+            return list(await asyncio.gather(*(self.list_objects(prefix) for prefix in prefixes)))
+
+    async def put_object(
+            self,
+            obj_key: str,
+            data: bytes,
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None,
+            content_md5: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
+        """上传对象
+
+        参数和返回值同 AliyunOssBucket.put_object ，只支持 bytes 类型的内容
+
+        """
+
+        headers = self.bucket.sign_put_object(obj_key, data, metadata, content_encoding, content_md5)
+
+        async with self.session.put(self.url(obj_key), data=data, headers=headers) as ret:
+            if ret.status != 200:
+                await self.log_error('上传对象', ret)
+                return None
+            return {key.lower(): value for key, value in ret.headers.items()}
+
+    async def get_object(self, obj_key: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """下载对象
+
+        Content-Encoding 为 gzip 的对象，得到的是解压后的内容
+
+        Args:
+            obj_key: 对象 Key
+
+        Returns:
+            如果成功返回 (对象内容, 响应头（键均为小写）) ，否则返回 None
+
+        """
+
+        headers = self.bucket.signer.sign('GET', obj_key, {'Host': self.bucket.host})
+
+        async with self.session.get(self.url(obj_key), headers=headers) as ret:
+            if ret.status != 200:
+                await self.log_error('下载对象', ret)
+                return None
+            return await ret.read(), {key.lower(): value for key, value in ret.headers.items()}
+
+    async def copy_object(self, src_key: str, dst_key: str) -> bool:
+        """在同一个 Bucket 中复制对象
+
+        参数和返回值同 AliyunOssBucket.copy_object
+
+        """
+
+        headers = self.bucket.signer.sign('PUT', dst_key, {
+            'Host': self.bucket.host,
+            'x-oss-copy-source': f'/{self.bucket.bucket}/{quote(src_key)}',
+        })
+
+        async with self.session.put(self.url(dst_key), headers=headers) as ret:
+            if ret.status != 200:
+                await self.log_error('复制对象', ret)
+                return False
+            return True
+
+    async def del_object(self, obj_key: str) -> bool:
+        """删除对象
+
+        参数和返回值同 AliyunOssBucket.del_object
+
+        """
+
+        headers = self.bucket.signer.sign('DELETE', obj_key, {'Host': self.bucket.host})
+
+        async with self.session.delete(self.url(obj_key), headers=headers) as ret:
+            if ret.status != 204:
+                await self.log_error('删除对象', ret)
+                return False
+            return True
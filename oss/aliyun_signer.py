@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+
+"""阿里云 OSS 请求签名
+
+实现阿里云 OSS 的 V1 （ HMAC-SHA1 ）和 V4 （ OSS4-HMAC-SHA256 ）签名，包括请求头签名和预签名 URL
+"""
+
+import base64
+import hmac
+import logging
+import time
+from hashlib import sha1, sha256
+from typing import Dict, Mapping, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+# 可用的签名版本
+signature_versions: Tuple[str, ...] = ('v1', 'v4')
+
+# V1 签名中需要放入 CanonicalizedResource 的子资源（查询参数）
+sub_resources: frozenset = frozenset([
+    'acl', 'append', 'cors', 'delete', 'lifecycle', 'location', 'logging', 'partNumber', 'position',
+    'referer', 'response-cache-control', 'response-content-disposition', 'response-content-encoding',
+    'response-content-language', 'response-content-type', 'response-expires', 'security-token',
+    'symlink', 'tagging', 'uploadId', 'uploads', 'versionId', 'website',
+])
+
+# V4 签名使用的常量
+v4_algorithm: str = 'OSS4-HMAC-SHA256'
+v4_request: str = 'aliyun_v4_request'
+v4_unsigned_payload: str = 'UNSIGNED-PAYLOAD'
+
+
+class AliyunOssSigner(object):
+    def __init__(
+            self,
+            access_key_id: str,
+            access_key_secret: str,
+            bucket: str,
+            signature_version: str = 'v1',
+            region: Optional[str] = None
+    ) -> None:
+        """初始化
+
+        HMAC 的密钥状态只计算一次，每次签名复制该状态后再写入待签名字符串
+
+        Args:
+            access_key_id: AccessKey ID
+            access_key_secret: AccessKey Secret
+            bucket: Bucket 名
+            signature_version: 签名版本， 'v1' 或 'v4'
+            region: 地域（ V4 签名必须），比如 'cn-hangzhou'
+
+        """
+
+        self.access_key_id: str = access_key_id
+        self.access_key_secret: str = access_key_secret
+        self.bucket: str = bucket
+        self.signature_version: str = signature_version
+        self.region: Optional[str] = region
+
+        assert self.signature_version in signature_versions, f'签名版本只能是 {signature_versions} 之一'
+        assert self.signature_version != 'v4' or self.region, 'V4 签名需要指定地域'
+
+        # V1 签名的 HMAC 密钥状态
+        self._v1_hmac: hmac.HMAC = hmac.new(access_key_secret.encode('utf-8'), digestmod=sha1)
+
+        # V4 签名的 (日期, 派生的 HMAC 密钥状态) ，派生密钥只与日期有关，每天只需计算一次
+        self._v4_key: Tuple[str, Optional[hmac.HMAC]] = ('', None)
+
+        # (秒级时间戳, RFC 1123 格式时间, ISO 8601 格式时间) ，同一秒内的请求共用
+        self._date_cache: Tuple[int, str, str] = (0, '', '')
+
+    def get_dates(self) -> Tuple[str, str]:
+        """获取当前时间
+
+        Returns:
+            (RFC 1123 格式时间, ISO 8601 格式时间) ，比如 ('Mon, 01 Jan 2024 00:00:00 GMT', '20240101T000000Z')
+
+        """
+
+        now = int(time.time())
+
+        # 整个元组一次替换，多线程读到的总是同一秒的两种格式
+        cache = self._date_cache
+        if cache[0] != now:
+            gmtime = time.gmtime(now)
+            cache = self._date_cache = (
+                now,
+                time.strftime('%a, %d %b %Y %H:%M:%S GMT', gmtime),
+                time.strftime('%Y%m%dT%H%M%SZ', gmtime)
+            )
+
+        return cache[1], cache[2]
+
+    def sign(
+            self,
+            verb: str,
+            obj_key: str = '',
+            headers: Optional[Mapping[str, str]] = None,
+            params: Optional[Mapping[str, Optional[str]]] = None
+    ) -> Dict[str, str]:
+        """为请求签名
+
+        Args:
+            verb: 请求方法，比如 'GET'
+            obj_key: 对象 Key （可选），默认为对 Bucket 的请求
+            headers: 请求头（可选）， Content-MD5 、 Content-Type 和 x-oss- 开头的请求头会参与签名
+            params: 查询参数（可选）
+
+        Returns:
+            加上了时间和 Authorization 等签名相关字段的请求头
+
+        """
+
+        headers = dict(headers or {})
+
+        if self.signature_version == 'v4':
+            return self._sign_v4(verb, obj_key, headers, params or {})
+
+        date, _ = self.get_dates()
+        headers['Date'] = date
+
+        signature = self._signature_v1(verb, obj_key, headers, params or {}, date)
+        headers['Authorization'] = f'OSS {self.access_key_id}:{signature}'
+
+        return headers
+
+    def presign_url(
+            self,
+            host: str,
+            verb: str,
+            obj_key: str,
+            expires: int = 3600,
+            scheme: str = 'https'
+    ) -> str:
+        """生成预签名 URL
+
+        不需要 AccessKey 的客户端可以在有效期内直接使用该 URL 访问对象
+
+        Args:
+            host: Bucket 访问域名
+            verb: 请求方法，比如 'GET'
+            obj_key: 对象 Key
+            expires: 有效期（秒）
+            scheme: 协议（可选），默认为 'https'
+
+        Returns:
+            预签名 URL
+
+        """
+
+        url = f'{scheme}://{host}/{quote(obj_key)}'
+
+        if self.signature_version == 'v4':
+            _, iso_date = self.get_dates()
+            params = {
+                'x-oss-signature-version': v4_algorithm,
+                'x-oss-credential': f'{self.access_key_id}/{self._v4_scope(iso_date)}',
+                'x-oss-date': iso_date,
+                'x-oss-expires': str(expires),
+            }
+            params['x-oss-signature'] = self._signature_v4(verb, obj_key, {}, params, iso_date)
+            return f'{url}?{urlencode(params, quote_via=quote)}'
+
+        expires_at = str(int(time.time()) + expires)
+        signature = self._signature_v1(verb, obj_key, {}, {}, expires_at)
+        params = {
+            'OSSAccessKeyId': self.access_key_id,
+            'Expires': expires_at,
+            'Signature': signature,
+        }
+        return f'{url}?{urlencode(params, quote_via=quote)}'
+
+    @staticmethod
+    def _split_headers(headers: Mapping[str, str]) -> Tuple[str, str, Dict[str, str]]:
+        """取出参与签名的请求头
+
+        Args:
+            headers: 请求头，不区分大小写
+
+        Returns:
+            (Content-MD5, Content-Type, 键为小写的 x-oss- 请求头) ，不存在的请求头为空字符串
+
+        """
+
+        content_md5 = content_type = ''
+        oss_headers = {}
+
+        for key, value in headers.items():
+            key = key.lower()
+            if key.startswith('x-oss-'):
+                oss_headers[key] = str(value).strip()
+            elif key == 'content-md5':
+                content_md5 = value
+            elif key == 'content-type':
+                content_type = value
+
+        return content_md5, content_type, oss_headers
+
+    def _signature_v1(
+            self,
+            verb: str,
+            obj_key: str,
+            headers: Mapping[str, str],
+            params: Mapping[str, Optional[str]],
+            date: str
+    ) -> str:
+        """计算 V1 签名
+
+        Args:
+            verb: 请求方法
+            obj_key: 对象 Key
+            headers: 请求头
+            params: 查询参数
+            date: 请求头中的时间，预签名 URL 为过期时间戳
+
+        Returns:
+            Base64 编码的签名
+
+        """
+
+        content_md5, content_type, oss_headers = self._split_headers(headers)
+        canonicalized_oss_headers = ''.join(f'{key}:{oss_headers[key]}\n' for key in sorted(oss_headers))
+
+        canonicalized_resource = f'/{self.bucket}/{obj_key}'
+        resources = sorted(key for key in params if key in sub_resources) if params else None
+        if resources:
+            canonicalized_resource += '?' + '&'.join(
+                key if params[key] is None else f'{key}={params[key]}'
+                for key
+                in resources
+            )
+
+        string_to_sign = (
+            f'{verb}\n'
+            f'{content_md5}\n'
+            f'{content_type}\n'
+            f'{date}\n'
+            f'{canonicalized_oss_headers}{canonicalized_resource}'
+        )
+
+        # 签名是每个请求都要执行的热路径，只在需要时才格式化调试日志
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'string_to_sign = {string_to_sign!r}')
+
+        mac = self._v1_hmac.copy()
+        mac.update(string_to_sign.encode('utf-8'))
+
+        return base64.b64encode(mac.digest()).decode('utf-8')
+
+    def _v4_scope(self, iso_date: str) -> str:
+        """获取 V4 签名的范围
+
+        Args:
+            iso_date: ISO 8601 格式时间
+
+        Returns:
+            签名范围，比如 '20240101/cn-hangzhou/oss/aliyun_v4_request'
+
+        """
+
+        return f'{iso_date[:8]}/{self.region}/oss/{v4_request}'
+
+    def _v4_signing_key(self, day: str) -> hmac.HMAC:
+        """获取 V4 签名的派生密钥状态
+
+        Args:
+            day: 日期，比如 '20240101'
+
+        Returns:
+            派生密钥的 HMAC 状态，使用前需要复制
+
+        """
+
+        cached_day, cached_key = self._v4_key
+        if cached_day == day and cached_key is not None:
+            return cached_key
+
+        key = f'aliyun_v4{self.access_key_secret}'.encode('utf-8')
+        for msg in [day, self.region, 'oss', v4_request]:
+            key = hmac.new(key, msg.encode('utf-8'), sha256).digest()
+
+        signing_key = hmac.new(key, digestmod=sha256)
+        self._v4_key = (day, signing_key)
+
+        return signing_key
+
+    def _signature_v4(
+            self,
+            verb: str,
+            obj_key: str,
+            headers: Mapping[str, str],
+            params: Mapping[str, Optional[str]],
+            iso_date: str
+    ) -> str:
+        """计算 V4 签名
+
+        Args:
+            verb: 请求方法
+            obj_key: 对象 Key
+            headers: 请求头
+            params: 查询参数（不含签名本身）
+            iso_date: ISO 8601 格式时间
+
+        Returns:
+            十六进制的签名
+
+        """
+
+        content_md5, content_type, signed_headers = self._split_headers(headers)
+        if content_md5:
+            signed_headers['content-md5'] = content_md5.strip()
+        if content_type:
+            signed_headers['content-type'] = content_type.strip()
+
+        canonical_query = '&'.join(
+            quote(key, safe='-_.~') if params[key] is None
+            else f'{quote(key, safe="-_.~")}={quote(str(params[key]), safe="-_.~")}'
+            for key
+            in sorted(params)
+        )
+
+        canonical_request = (
+            f'{verb}\n'
+            f'/{quote(self.bucket, safe="-_.~")}/{quote(obj_key, safe="-_.~/")}\n'
+            f'{canonical_query}\n'
+            + ''.join(f'{key}:{signed_headers[key]}\n' for key in sorted(signed_headers))
+            + '\n'
+            # 不使用 AdditionalHeaders
+            + '\n'
+            + v4_unsigned_payload
+        )
+
+        string_to_sign = (
+            f'{v4_algorithm}\n'
+            f'{iso_date}\n'
+            f'{self._v4_scope(iso_date)}\n'
+            f'{sha256(canonical_request.encode("utf-8")).hexdigest()}'
+        )
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'canonical_request = {canonical_request!r}')
+            logger.debug(f'string_to_sign = {string_to_sign!r}')
+
+        mac = self._v4_signing_key(iso_date[:8]).copy()
+        mac.update(string_to_sign.encode('utf-8'))
+
+        return mac.hexdigest()
+
+    def _sign_v4(
+            self,
+            verb: str,
+            obj_key: str,
+            headers: Dict[str, str],
+            params: Mapping[str, Optional[str]]
+    ) -> Dict[str, str]:
+        """使用 V4 签名为请求签名，参数同 sign
+
+        Returns:
+            加上了签名相关字段的请求头
+
+        """
+
+        date, iso_date = self.get_dates()
+        headers['Date'] = date
+        headers['x-oss-date'] = iso_date
+        headers['x-oss-content-sha256'] = v4_unsigned_payload
+
+        signature = self._signature_v4(verb, obj_key, headers, params, iso_date)
+        headers['Authorization'] = (
+            f'{v4_algorithm} Credential={self.access_key_id}/{self._v4_scope(iso_date)},Signature={signature}'
+        )
+
+        return headers
@@ -5,19 +5,24 @@
 基于腾讯云 COS 的 API 实现的 .abstract_oss.OSSBucket 的子类
 """
 
+import base64
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 
 from qcloud_cos import CosConfig, CosS3Client
 from qcloud_cos.cos_exception import CosClientError, CosServiceError
 
-from .abstract_oss import OssBucket
+from .abstract_oss import ObjectInfo, OssBucket, parse_last_modified
 
 
 logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
 
 
 class QcloudCosBucket(OssBucket):
+    meta_prefix: str = 'x-cos-meta-'
+    crc64_header: str = 'x-cos-hash-crc64ecma'
+    copy_size_limit: int = 5 * 1024 ** 3
+
     def __init__(self, config: Dict[str, str]) -> None:
         """初始化
 
@@ -27,6 +32,7 @@ class QcloudCosBucket(OssBucket):
         """
 
         self.bucket: str = config.get('bucket')
+        self.region: str = config.get('region')
 
         oss_config: CosConfig = CosConfig(
             Region=config.get('region'),
@@ -38,18 +44,20 @@ class QcloudCosBucket(OssBucket):
 
         self.client: CosS3Client = CosS3Client(oss_config)
 
-    def list_objects(self) -> Optional[List[Tuple[str, str]]]:
+    def list_objects(self, prefix: str = '') -> Optional[List[ObjectInfo]]:
         """列出对象
 
         列出 Bucket 中的对象
 
+        Args:
+            prefix: 只列出 Key 以此开头的对象（可选），默认列出所有对象
+
         Returns:
             正常的话返回以下格式内容
 
             [
-                (obj_key_1, obj_md5_1),
-                (obj_key_2, obj_md5_2),
-                (obj_key_3, obj_md5_3),
+                ObjectInfo(key=obj_key_1, etag=obj_md5_1, size=obj_size_1, last_modified=obj_mtime_1),
+                ObjectInfo(key=obj_key_2, etag=obj_md5_2, size=obj_size_2, last_modified=obj_mtime_2),
                 # ...
             ]
 
@@ -68,7 +76,7 @@ class QcloudCosBucket(OssBucket):
             logger.debug(f'marker = \'{marker}\'')
 
             try:
-                ret = self.client.list_objects(Bucket=self.bucket, Marker=marker)
+                ret = self.client.list_objects(Bucket=self.bucket, Prefix=prefix, Marker=marker)
                 logger.debug(f'ret = {ret}')
 
             except (CosClientError, CosServiceError) as err:
@@ -76,7 +84,12 @@ class QcloudCosBucket(OssBucket):
                 return None
 
             objs_list.extend([
-                (obj.get('Key'), obj.get('ETag')[1:-1])
+                ObjectInfo(
+                    key=obj.get('Key'),
+                    etag=obj.get('ETag')[1:-1],
+                    size=int(obj.get('Size')),
+                    last_modified=parse_last_modified(obj.get('LastModified'))
+                )
                 for obj
                 in ret.get('Contents', [])
             ])
@@ -84,32 +97,163 @@ class QcloudCosBucket(OssBucket):
 
             logger.debug(f'next_marker = \'{marker}\'')
 
-        logger.debug(f'Remote Objects:')
-        for i in objs_list:
-            logger.debug(f'  - {i}')
+        # 对象很多时逐行格式化的开销不可忽略，只在开启调试日志时输出
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Remote Objects:')
+            for i in objs_list:
+                logger.debug(f'  - {i}')
 
         return objs_list
 
-    def put_object(self, obj_key: str, data: bytes) -> bool:
+    def put_object(
+            self,
+            obj_key: str,
+            data: Union[bytes, BinaryIO],
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None,
+            content_md5: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
         """上传对象
 
         上传对象到 Bucket
 
         Args:
             obj_key: 对象 Key
-            data: 对象内容
+            data: 对象内容，可以是 bytes 或者实现了 .read() 和 __len__ 的流
+            metadata: 用户自定义元数据（可选），键不包含前缀
+            content_encoding: 对象的 Content-Encoding （可选），比如 'gzip'
+            content_md5: 对象内容的 MD5 （可选，十六进制）。 data 是流时，只有指定了才会让服务端校验内容
 
         Returns:
-            是否成功
+            如果成功返回响应头（键均为小写），否则返回 None
 
         """
 
+        kwargs = {}
+        if metadata:
+            kwargs['Metadata'] = {
+                f'{self.meta_prefix}{key.lower()}': value
+                for key, value
+                in metadata.items()
+            }
+        if content_encoding:
+            kwargs['ContentEncoding'] = content_encoding
+        if content_md5 is not None:
+            kwargs['ContentMD5'] = base64.b64encode(bytes.fromhex(content_md5)).decode('ascii')
+
         try:
             ret = self.client.put_object(
                 Bucket=self.bucket,
                 Key=obj_key,
                 Body=data,
-                EnableMD5=True
+                # 由 SDK 计算 MD5 需要额外读一遍内容，只对 bytes 开启
+                EnableMD5=content_md5 is None and isinstance(data, bytes),
+                **kwargs
+            )
+            logger.debug(f'ret = {ret}')
+
+        except (CosClientError, CosServiceError) as err:
+            logger.error(f'{type(err).__name__}: {err}')
+            return None
+
+        return {key.lower(): value for key, value in ret.items()}
+
+    def get_object_stream(self, obj_key: str, decode: bool = True) -> Optional[Tuple[BinaryIO, Dict[str, str]]]:
+        """以流的形式下载对象
+
+        下载 Bucket 中的对象，对象内容需要从返回的流中读取。
+        Content-Encoding 为 gzip 的对象，默认读取到的是解压后的内容
+
+        Notes:
+            - 读取完成后需要调用流的 .close() 方法
+
+        Args:
+            obj_key: 对象 Key
+            decode: 是否解压 Content-Encoding 为 gzip 的内容（可选），为 False 时读取到的是对象的原始内容
+
+        Returns:
+            如果成功返回 (对象内容流, 响应头（键均为小写）) ，否则返回 None
+
+        """
+
+        try:
+            ret = self.client.get_object(Bucket=self.bucket, Key=obj_key)
+            logger.debug(f'ret = {ret}')
+
+        except (CosClientError, CosServiceError) as err:
+            logger.error(f'{type(err).__name__}: {err}')
+            return None
+
+        # 原始响应流默认不会解压，需要还原压缩上传的对象
+        stream = ret.pop('Body').get_raw_stream()
+        stream.decode_content = decode
+
+        return stream, {key.lower(): value for key, value in ret.items()}
+
+    def get_object_range(self, obj_key: str, offset: int, size: int) -> Optional[bytes]:
+        """下载对象的一部分
+
+        下载对象原始内容（不解压）中 [offset, offset + size) 范围的数据
+
+        Args:
+            obj_key: 对象 Key
+            offset: 起始位置（字节）
+            size: 大小（字节），必须大于 0
+
+        Returns:
+            如果成功返回该范围的数据，否则返回 None
+
+        """
+
+        try:
+            ret = self.client.get_object(Bucket=self.bucket, Key=obj_key, Range=f'bytes={offset}-{offset + size - 1}')
+            logger.debug(f'ret = {ret}')
+
+            stream = ret['Body'].get_raw_stream()
+            try:
+                data = stream.read()
+            finally:
+                stream.close()
+
+        except (CosClientError, CosServiceError) as err:
+            logger.error(f'{type(err).__name__}: {err}')
+            return None
+
+        if len(data) != size:
+            logger.error(f'范围下载 {obj_key} 的 [{offset}, {offset + size}) 失败：返回了 {len(data)} 字节')
+            return None
+
+        return data
+
+    def copy_object(self, src_key: str, dst_key: str, source_bucket: Optional['QcloudCosBucket'] = None) -> bool:
+        """复制对象
+
+        在服务端将 Bucket 中的对象复制为另一个对象，不需要传输对象内容
+
+        Notes:
+            - 只能复制不超过 5 GB 的对象
+
+        Args:
+            src_key: 源对象 Key
+            dst_key: 目标对象 Key
+            source_bucket: 源对象所在的 Bucket （可选），默认为当前 Bucket 。当前 Bucket 的账号需要有读取源 Bucket 的权限
+
+        Returns:
+            是否成功
+
+        """
+
+        source_bucket = source_bucket or self
+
+        try:
+            ret = self.client.copy_object(
+                Bucket=self.bucket,
+                Key=dst_key,
+                CopySource={
+                    'Bucket': source_bucket.bucket,
+                    'Key': src_key,
+                    'Region': source_bucket.region
+                }
             )
             logger.debug(f'ret = {ret}')
 
@@ -119,30 +263,168 @@ class QcloudCosBucket(OssBucket):
 
         return True
 
-    def get_object(self, obj_key: str) -> Optional[bytes]:
-        """下载对象
+    def init_multipart_upload(
+            self,
+            obj_key: str,
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None
+    ) -> Optional[str]:
+        """初始化分片上传
 
-        下载 Bucket 中的对象
+        Args:
+            obj_key: 对象 Key
+            metadata: 用户自定义元数据（可选），键不包含前缀
+            content_encoding: 对象的 Content-Encoding （可选），比如 'gzip'
+
+        Returns:
+            如果成功返回 Upload ID ，否则返回 None
+
+        """
+
+        kwargs = {}
+        if metadata:
+            kwargs['Metadata'] = {
+                f'{self.meta_prefix}{key.lower()}': value
+                for key, value
+                in metadata.items()
+            }
+        if content_encoding:
+            kwargs['ContentEncoding'] = content_encoding
+
+        try:
+            ret = self.client.create_multipart_upload(Bucket=self.bucket, Key=obj_key, **kwargs)
+            logger.debug(f'ret = {ret}')
+
+        except (CosClientError, CosServiceError) as err:
+            logger.error(f'{type(err).__name__}: {err}')
+            return None
+
+        return ret.get('UploadId')
+
+    def upload_part(
+            self,
+            obj_key: str,
+            upload_id: str,
+            part_number: int,
+            data: bytes,
+            content_md5: Optional[str] = None
+    ) -> Optional[str]:
+        """上传分片
 
         Args:
             obj_key: 对象 Key
+            upload_id: Upload ID
+            part_number: 分片序号，从 1 开始
+            data: 分片内容
+            content_md5: 分片内容的 MD5 （可选，十六进制），由服务端校验
 
         Returns:
-            如果成功返回对象内容，否则返回 None
+            如果成功返回分片的 ETag ，否则返回 None
 
         """
 
+        kwargs = {}
+        if content_md5 is not None:
+            kwargs['ContentMD5'] = base64.b64encode(bytes.fromhex(content_md5)).decode('ascii')
+
         try:
-            ret = self.client.get_object(Bucket=self.bucket, Key=obj_key)
+            ret = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=obj_key,
+                Body=data,
+                PartNumber=part_number,
+                UploadId=upload_id,
+                **kwargs
+            )
+            logger.debug(f'ret = {ret}')
+
+        except (CosClientError, CosServiceError) as err:
+            logger.error(f'{type(err).__name__}: {err}')
+            return None
+
+        return ret.get('ETag')
+
+    def complete_multipart_upload(
+            self,
+            obj_key: str,
+            upload_id: str,
+            parts: List[Tuple[int, str]]
+    ) -> Optional[Dict[str, str]]:
+        """完成分片上传
+
+        Args:
+            obj_key: 对象 Key
+            upload_id: Upload ID
+            parts: (分片序号, 分片 ETag) 的列表，按分片序号排列
+
+        Returns:
+            如果成功返回响应内容（键均为小写），否则返回 None
+
+        """
+
+        try:
+            ret = self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=obj_key,
+                UploadId=upload_id,
+                MultipartUpload={
+                    'Part': [
+                        {'PartNumber': part_number, 'ETag': etag}
+                        for part_number, etag
+                        in parts
+                    ]
+                }
+            )
             logger.debug(f'ret = {ret}')
 
-            file_content = ret['Body'].get_raw_stream().read()
+        except (CosClientError, CosServiceError) as err:
+            logger.error(f'{type(err).__name__}: {err}')
+            return None
+
+        return {key.lower(): value for key, value in ret.items()}
+
+    def abort_multipart_upload(self, obj_key: str, upload_id: str) -> bool:
+        """取消分片上传，已上传的分片会被删除
+
+        Args:
+            obj_key: 对象 Key
+            upload_id: Upload ID
+
+        Returns:
+            是否成功
+
+        """
+
+        try:
+            ret = self.client.abort_multipart_upload(Bucket=self.bucket, Key=obj_key, UploadId=upload_id)
+            logger.debug(f'ret = {ret}')
+
+        except (CosClientError, CosServiceError) as err:
+            logger.error(f'{type(err).__name__}: {err}')
+            return False
+
+        return True
+
+    def head_object(self, obj_key: str) -> Optional[Dict[str, str]]:
+        """查询对象元信息
+
+        Args:
+            obj_key: 对象 Key
+
+        Returns:
+            如果成功返回响应头（键均为小写），否则返回 None
+
+        """
+
+        try:
+            ret = self.client.head_object(Bucket=self.bucket, Key=obj_key)
+            logger.debug(f'ret = {ret}')
 
         except (CosClientError, CosServiceError) as err:
             logger.error(f'{type(err).__name__}: {err}')
             return None
 
-        return file_content
+        return {key.lower(): value for key, value in ret.items()}
 
     def del_object(self, obj_key: str) -> bool:
         """删除对象
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""测试用的内存 OssBucket
+
+对象保存在内存中，记录每次请求，供同步器的行为测试检查实际发出了哪些请求
+"""
+
+import gzip
+import io
+import threading
+import time
+from hashlib import md5
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from oss import ObjectInfo, OssBucket
+from utils.crc64 import crc64
+
+
+class FakeObject(NamedTuple):
+    """内存中的对象
+    """
+
+    # 对象原始内容（压缩上传的对象为压缩后的内容）
+    data: bytes
+
+    # 用户自定义元数据，键不包含前缀
+    metadata: Dict[str, str]
+
+    # Content-Encoding
+    content_encoding: Optional[str]
+
+    # 最后修改时间（ Unix 时间戳）
+    last_modified: float
+
+    # 是否是可追加对象
+    appendable: bool = False
+
+
+class FakeBucket(OssBucket):
+    """内存中的 Bucket
+
+    Attributes:
+        objects: 以 Key 为键的对象
+        calls: 请求记录，每项为 (请求名称, Key, ...)
+        fail_copy: 为真时服务端复制总是失败
+    """
+
+    crc64_header = 'x-oss-hash-crc64ecma'
+    object_type_header = 'x-oss-object-type'
+    supports_append = True
+
+    def __init__(self) -> None:
+        self.objects: Dict[str, FakeObject] = {}
+        self.calls: List[Tuple] = []
+        self.fail_copy: bool = False
+        self._lock: threading.Lock = threading.Lock()
+
+    def add_object(
+            self,
+            obj_key: str,
+            data: bytes,
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None,
+            last_modified: Optional[float] = None
+    ) -> None:
+        """直接写入对象，不记录请求，用于准备测试数据
+        """
+
+        self.objects[obj_key] = FakeObject(
+            data, dict(metadata or {}), content_encoding, time.time() if last_modified is None else last_modified
+        )
+
+    def get_data(self, obj_key: str) -> Optional[bytes]:
+        """读取对象原始内容，不记录请求
+        """
+
+        obj = self.objects.get(obj_key)
+        return obj.data if obj is not None else None
+
+    def count_calls(self, name: str) -> int:
+        """统计某种请求的次数
+        """
+
+        return sum(1 for call in self.calls if call[0] == name)
+
+    def _record(self, *call) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    def _headers(self, obj: FakeObject) -> Dict[str, str]:
+        headers = {
+            'etag': f'"{md5(obj.data).hexdigest().upper()}"',
+            'content-length': str(len(obj.data)),
+            self.crc64_header: str(crc64(obj.data)),
+            self.object_type_header: 'Appendable' if obj.appendable else 'Normal',
+        }
+        if obj.content_encoding:
+            headers['content-encoding'] = obj.content_encoding
+        headers.update({f'{self.meta_prefix}{key}': value for key, value in obj.metadata.items()})
+        return headers
+
+    @staticmethod
+    def _read(data: Union[bytes, BinaryIO]) -> bytes:
+        return data if isinstance(data, bytes) else data.read()
+
+    def list_objects(self, prefix: str = '') -> Optional[List[ObjectInfo]]:
+        self._record('list', prefix)
+        return [
+            ObjectInfo(key, md5(obj.data).hexdigest(), len(obj.data), obj.last_modified, obj.appendable)
+            for key, obj
+            in sorted(self.objects.items())
+            if key.startswith(prefix)
+        ]
+
+    def put_object(
+            self,
+            obj_key: str,
+            data: Union[bytes, BinaryIO],
+            metadata: Optional[Dict[str, str]] = None,
+            content_encoding: Optional[str] = None,
+            content_md5: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
+        self._record('put', obj_key)
+        data = self._read(data)
+        if content_md5 is not None and content_md5 != md5(data).hexdigest():
+            return None
+
+        obj = FakeObject(data, dict(metadata or {}), content_encoding, time.time())
+        self.objects[obj_key] = obj
+        return self._headers(obj)
+
+    def append_object(
+            self,
+            obj_key: str,
+            data: Union[bytes, BinaryIO],
+            position: int,
+            metadata: Optional[Dict[str, str]] = None,
+            content_md5: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
+        self._record('append', obj_key, position)
+        data = self._read(data)
+        if content_md5 is not None and content_md5 != md5(data).hexdigest():
+            return None
+
+        old = self.objects.get(obj_key)
+        if position == 0 and old is None:
+            obj = FakeObject(data, dict(metadata or {}), None, time.time(), True)
+        elif old is not None and old.appendable and position == len(old.data):
+            obj = old._replace(data=old.data + data, last_modified=time.time())
+        else:
+            return None
+
+        self.objects[obj_key] = obj
+        return self._headers(obj)
+
+    def get_object_stream(self, obj_key: str, decode: bool = True) -> Optional[Tuple[BinaryIO, Dict[str, str]]]:
+        self._record('get', obj_key)
+        obj = self.objects.get(obj_key)
+        if obj is None:
+            return None
+
+        data = gzip.decompress(obj.data) if decode and obj.content_encoding == 'gzip' else obj.data
+        return io.BytesIO(data), self._headers(obj)
+
+    def get_object_range(self, obj_key: str, offset: int, size: int) -> Optional[bytes]:
+        self._record('range', obj_key, offset, size)
+        obj = self.objects.get(obj_key)
+        if obj is None or offset + size > len(obj.data):
+            return None
+        return obj.data[offset:offset + size]
+
+    def copy_object(self, src_key: str, dst_key: str, source_bucket: Optional[OssBucket] = None) -> bool:
+        self._record('copy', src_key, dst_key)
+        obj = (source_bucket or self).objects.get(src_key)
+        if obj is None or self.fail_copy:
+            return False
+
+        self.objects[dst_key] = obj._replace(last_modified=time.time(), appendable=False)
+        return True
+
+    def head_object(self, obj_key: str) -> Optional[Dict[str, str]]:
+        self._record('head', obj_key)
+        obj = self.objects.get(obj_key)
+        return self._headers(obj) if obj is not None else None
+
+    def del_object(self, obj_key: str) -> bool:
+        self._record('del', obj_key)
+        self.objects.pop(obj_key, None)
+        return True
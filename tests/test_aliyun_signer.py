@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+"""oss.aliyun_signer 的测试
+
+期望的签名由测试中写出的待签名字符串独立计算，或取自公开文档中的示例
+"""
+
+import base64
+import calendar
+import hmac
+import time
+import unittest
+from hashlib import sha1, sha256
+from unittest import mock
+
+from oss.aliyun_signer import AliyunOssSigner
+
+
+ACCESS_KEY_ID = 'AKIDEXAMPLE'
+ACCESS_KEY_SECRET = 'wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY'
+
+# 2007-03-27 19:36:42 UTC
+NOW = calendar.timegm((2007, 3, 27, 19, 36, 42))
+
+
+def hmac_sha1_base64(key: str, msg: str) -> str:
+    return base64.b64encode(hmac.new(key.encode('utf-8'), msg.encode('utf-8'), sha1).digest()).decode('utf-8')
+
+
+def v4_signature(day: str, region: str, string_to_sign: str) -> str:
+    key = f'aliyun_v4{ACCESS_KEY_SECRET}'.encode('utf-8')
+    for msg in [day, region, 'oss', 'aliyun_v4_request']:
+        key = hmac.new(key, msg.encode('utf-8'), sha256).digest()
+    return hmac.new(key, string_to_sign.encode('utf-8'), sha256).hexdigest()
+
+
+class SignerV1Test(unittest.TestCase):
+    def setUp(self) -> None:
+        self.signer = AliyunOssSigner(ACCESS_KEY_ID, ACCESS_KEY_SECRET, 'johnsmith')
+
+        patcher = mock.patch('time.time', return_value=NOW)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_published_examples(self) -> None:
+        # V1 签名与 AWS 签名 V2 的计算方法相同，使用其文档中的 GET 和 PUT 示例
+        self.assertEqual(
+            self.signer._signature_v1('GET', 'photos/puppy.jpg', {}, {}, 'Tue, 27 Mar 2007 19:36:42 +0000'),
+            'bWq2s1WEIj+Ydj0vQ697zp+IXMU='
+        )
+        self.assertEqual(
+            self.signer._signature_v1(
+                'PUT', 'photos/puppy.jpg', {'Content-Type': 'image/jpeg'}, {}, 'Tue, 27 Mar 2007 21:15:45 +0000'
+            ),
+            'MyyxeRY7whkBe+bq8fHCL/2kKUg='
+        )
+
+    def test_sign_headers(self) -> None:
+        headers = self.signer.sign(
+            'PUT',
+            'nelson',
+            {
+                'Content-MD5': 'eB5eJF1ptWaXm4bijSPyxw==',
+                'Content-Type': 'text/html',
+                'X-OSS-Meta-Author': 'foo@example.com',
+                'X-OSS-Magic': 'abracadabra',
+            }
+        )
+
+        string_to_sign = (
+            'PUT\n'
+            'eB5eJF1ptWaXm4bijSPyxw==\n'
+            'text/html\n'
+            'Tue, 27 Mar 2007 19:36:42 GMT\n'
+            'x-oss-magic:abracadabra\n'
+            'x-oss-meta-author:foo@example.com\n'
+            '/johnsmith/nelson'
+        )
+        self.assertEqual(headers['Date'], 'Tue, 27 Mar 2007 19:36:42 GMT')
+        self.assertEqual(
+            headers['Authorization'],
+            f'OSS {ACCESS_KEY_ID}:{hmac_sha1_base64(ACCESS_KEY_SECRET, string_to_sign)}'
+        )
+        self.assertEqual(headers['Authorization'], f'OSS {ACCESS_KEY_ID}:0rEs403g1fXFQYmdGzJX4GuR1kk=')
+
+    def test_sign_sub_resources(self) -> None:
+        # 只有子资源参与签名，按名称排序，没有值的子资源不带等号
+        headers = self.signer.sign(
+            'POST', 'a b/c.txt', params={'uploadId': 'abc', 'partNumber': '1', 'max-keys': '10', 'uploads': None}
+        )
+
+        string_to_sign = (
+            'POST\n'
+            '\n'
+            '\n'
+            'Tue, 27 Mar 2007 19:36:42 GMT\n'
+            '/johnsmith/a b/c.txt?partNumber=1&uploadId=abc&uploads'
+        )
+        self.assertEqual(
+            headers['Authorization'],
+            f'OSS {ACCESS_KEY_ID}:{hmac_sha1_base64(ACCESS_KEY_SECRET, string_to_sign)}'
+        )
+
+    def test_presign_url(self) -> None:
+        url = self.signer.presign_url('johnsmith.oss-cn-hangzhou.aliyuncs.com', 'GET', 'photos/puppy.jpg', 60)
+
+        expires = str(NOW + 60)
+        signature = hmac_sha1_base64(ACCESS_KEY_SECRET, f'GET\n\n\n{expires}\n/johnsmith/photos/puppy.jpg')
+        self.assertEqual(
+            url,
+            'https://johnsmith.oss-cn-hangzhou.aliyuncs.com/photos/puppy.jpg'
+            f'?OSSAccessKeyId={ACCESS_KEY_ID}&Expires={expires}'
+            f'&Signature={signature.replace("+", "%2B").replace("/", "%2F").replace("=", "%3D")}'
+        )
+
+
+class SignerV4Test(unittest.TestCase):
+    def setUp(self) -> None:
+        self.signer = AliyunOssSigner(ACCESS_KEY_ID, ACCESS_KEY_SECRET, 'examplebucket', 'v4', 'cn-hangzhou')
+
+        patcher = mock.patch('time.time', return_value=NOW)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sign_headers(self) -> None:
+        headers = self.signer.sign(
+            'PUT',
+            'dir/a b.txt',
+            {'Content-Type': 'text/plain', 'Content-MD5': 'eB5eJF1ptWaXm4bijSPyxw==', 'x-oss-meta-a': ' 1 '},
+            {'uploadId': 'abc', 'partNumber': '2', 'tagging': None}
+        )
+
+        canonical_request = (
+            'PUT\n'
+            '/examplebucket/dir/a%20b.txt\n'
+            'partNumber=2&tagging&uploadId=abc\n'
+            'content-md5:eB5eJF1ptWaXm4bijSPyxw==\n'
+            'content-type:text/plain\n'
+            'x-oss-content-sha256:UNSIGNED-PAYLOAD\n'
+            'x-oss-date:20070327T193642Z\n'
+            'x-oss-meta-a:1\n'
+            '\n'
+            '\n'
+            'UNSIGNED-PAYLOAD'
+        )
+        string_to_sign = (
+            'OSS4-HMAC-SHA256\n'
+            '20070327T193642Z\n'
+            '20070327/cn-hangzhou/oss/aliyun_v4_request\n'
+            f'{sha256(canonical_request.encode("utf-8")).hexdigest()}'
+        )
+        signature = v4_signature('20070327', 'cn-hangzhou', string_to_sign)
+
+        self.assertEqual(headers['Date'], 'Tue, 27 Mar 2007 19:36:42 GMT')
+        self.assertEqual(headers['x-oss-date'], '20070327T193642Z')
+        self.assertEqual(headers['x-oss-content-sha256'], 'UNSIGNED-PAYLOAD')
+        self.assertEqual(
+            headers['Authorization'],
+            f'OSS4-HMAC-SHA256 Credential={ACCESS_KEY_ID}/20070327/cn-hangzhou/oss/aliyun_v4_request,'
+            f'Signature={signature}'
+        )
+        self.assertEqual(signature, 'd5c9ead03780034b9326999e177bc50c6350f5c1a399de45fa2c504abdea5001')
+
+    def test_signing_key_follows_date(self) -> None:
+        # 派生密钥按日期缓存，跨天后需要重新计算
+        first = self.signer.sign('GET', 'a')['Authorization']
+        with mock.patch('time.time', return_value=NOW + 86400):
+            second = self.signer.sign('GET', 'a')['Authorization']
+
+        canonical_request = (
+            'GET\n'
+            '/examplebucket/a\n'
+            '\n'
+            'x-oss-content-sha256:UNSIGNED-PAYLOAD\n'
+            'x-oss-date:20070328T193642Z\n'
+            '\n'
+            '\n'
+            'UNSIGNED-PAYLOAD'
+        )
+        string_to_sign = (
+            'OSS4-HMAC-SHA256\n'
+            '20070328T193642Z\n'
+            '20070328/cn-hangzhou/oss/aliyun_v4_request\n'
+            f'{sha256(canonical_request.encode("utf-8")).hexdigest()}'
+        )
+        self.assertNotEqual(first, second)
+        self.assertTrue(second.endswith(f'Signature={v4_signature("20070328", "cn-hangzhou", string_to_sign)}'))
+
+    def test_presign_url(self) -> None:
+        url = self.signer.presign_url('examplebucket.oss-cn-hangzhou.aliyuncs.com', 'GET', 'photos/puppy.jpg', 60)
+
+        credential = f'{ACCESS_KEY_ID}/20070327/cn-hangzhou/oss/aliyun_v4_request'
+        query = (
+            f'x-oss-credential={credential.replace("/", "%2F")}'
+            '&x-oss-date=20070327T193642Z'
+            '&x-oss-expires=60'
+            '&x-oss-signature-version=OSS4-HMAC-SHA256'
+        )
+        canonical_request = (
+            'GET\n'
+            '/examplebucket/photos/puppy.jpg\n'
+            f'{query}\n'
+            '\n'
+            '\n'
+            'UNSIGNED-PAYLOAD'
+        )
+        string_to_sign = (
+            'OSS4-HMAC-SHA256\n'
+            '20070327T193642Z\n'
+            '20070327/cn-hangzhou/oss/aliyun_v4_request\n'
+            f'{sha256(canonical_request.encode("utf-8")).hexdigest()}'
+        )
+        signature = v4_signature('20070327', 'cn-hangzhou', string_to_sign)
+
+        self.assertEqual(
+            url,
+            'https://examplebucket.oss-cn-hangzhou.aliyuncs.com/photos/puppy.jpg'
+            '?x-oss-signature-version=OSS4-HMAC-SHA256'
+            f'&x-oss-credential={credential.replace("/", "%2F")}'
+            '&x-oss-date=20070327T193642Z'
+            '&x-oss-expires=60'
+            f'&x-oss-signature={signature}'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
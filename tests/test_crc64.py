@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""utils.crc64 的测试
+"""
+
+import os
+import unittest
+
+from utils import crc64 as crc64_module
+from utils.crc64 import crc64, crc64_combine, crc64_python
+
+
+def crc64_bitwise(data: bytes) -> int:
+    # 逐位计算的参考实现，与查表实现互相独立
+    crc = 0xFFFFFFFFFFFFFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xC96C5795D7870F42 if crc & 1 else crc >> 1
+    return crc ^ 0xFFFFFFFFFFFFFFFF
+
+
+class Crc64Test(unittest.TestCase):
+    def test_known_answers(self) -> None:
+        # CRC-64/XZ 的标准校验值，以及 OSS 返回的空对象的 x-oss-hash-crc64ecma
+        for func in [crc64, crc64_python, crc64_bitwise]:
+            with self.subTest(func=func.__name__):
+                self.assertEqual(func(b'123456789'), 0x995DC9BBDF1939FA)
+                self.assertEqual(func(b''), 0)
+
+    def test_matches_bitwise(self) -> None:
+        # 覆盖 slicing-by-8 的整 8 字节部分和剩余的逐字节部分
+        data = os.urandom(1000)
+        for size in [1, 7, 8, 9, 15, 16, 17, 63, 64, 65, 1000]:
+            with self.subTest(size=size):
+                self.assertEqual(crc64_python(data[:size]), crc64_bitwise(data[:size]))
+                self.assertEqual(crc64(data[:size]), crc64_bitwise(data[:size]))
+
+    def test_incremental(self) -> None:
+        data = os.urandom(4096)
+        for split in [0, 1, 5, 8, 1000, 4096]:
+            with self.subTest(split=split):
+                self.assertEqual(crc64(data[split:], crc64(data[:split])), crc64(data))
+                self.assertEqual(crc64_python(data[split:], crc64_python(data[:split])), crc64(data))
+
+    @unittest.skipIf(crc64_module._crcmod_func is None, '没有安装带 C 扩展的 crcmod')
+    def test_crcmod_matches_python(self) -> None:
+        data = os.urandom(4096)
+        self.assertEqual(crc64_module._crcmod_func(data, 0), crc64_python(data))
+        self.assertEqual(crc64_module._crcmod_func(data[100:], crc64_python(data[:100])), crc64_python(data))
+
+
+class Crc64CombineTest(unittest.TestCase):
+    def test_known_answer(self) -> None:
+        self.assertEqual(crc64_combine(crc64(b'1234'), crc64(b'56789'), 5), 0x995DC9BBDF1939FA)
+
+    def test_combine(self) -> None:
+        data = os.urandom(70000)
+        for split in [1, 8, 255, 256, 4096, 65536, 69999]:
+            with self.subTest(split=split):
+                a, b = data[:split], data[split:]
+                self.assertEqual(crc64_combine(crc64(a), crc64(b), len(b)), crc64(data))
+
+    def test_combine_empty(self) -> None:
+        crc = crc64(b'123456789')
+        self.assertEqual(crc64_combine(crc, crc64(b''), 0), crc)
+        self.assertEqual(crc64_combine(crc64(b''), crc, 9), crc)
+
+    def test_combine_zeros(self) -> None:
+        # 长度的多个二进制位都要应用对应的矩阵
+        zeros = bytes(100003)
+        self.assertEqual(crc64_combine(crc64(b'abc'), crc64(zeros), len(zeros)), crc64(b'abc' + zeros))
+
+    def test_combine_parts(self) -> None:
+        # 分片上传时按顺序合并各分片的 CRC64
+        parts = [os.urandom(size) for size in [5, 0, 1024, 3, 8192]]
+        crc = 0
+        for part in parts:
+            crc = crc64_combine(crc, crc64(part), len(part))
+        self.assertEqual(crc, crc64(b''.join(parts)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""utils.file_manager 的测试
+"""
+
+import os
+import tempfile
+import unittest
+
+from utils import FileManager
+
+
+class ClearEmptyFolderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+        # 根目录旁边的空文件夹，清理时不能被删除
+        self.sibling = os.path.join(self.temp_dir.name, 'sibling')
+        os.makedirs(self.sibling)
+
+        self.root = os.path.join(self.temp_dir.name, 'root')
+        os.makedirs(os.path.join(self.root, 'a', 'b'))
+        os.makedirs(os.path.join(self.root, 'keep'))
+        for name in ['a/b/file.txt', 'top.txt', 'keep/file.txt']:
+            with open(os.path.join(self.root, name), 'w') as file:
+                file.write(name)
+
+    def check_stays_inside_root(self, root_dir: str) -> None:
+        file_manager = FileManager(root_dir)
+        file_manager.del_file('a/b/file.txt')
+        file_manager.del_file('top.txt')
+        file_manager.clear_empty_folder()
+
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'a')))
+        self.assertTrue(os.path.isfile(os.path.join(self.root, 'keep', 'file.txt')))
+
+        # 删除根目录中所有文件后，根目录本身、同级的空文件夹和上级文件夹仍然保留
+        file_manager.del_file('keep/file.txt')
+        file_manager.clear_empty_folder()
+        self.assertEqual(os.listdir(self.root), [])
+        self.assertTrue(os.path.isdir(self.sibling))
+
+    def test_stays_inside_root(self) -> None:
+        self.check_stays_inside_root(self.root)
+
+    def test_stays_inside_root_with_trailing_separator(self) -> None:
+        self.check_stays_inside_root(self.root + os.sep)
+
+    def test_stays_inside_relative_root(self) -> None:
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        self.addCleanup(os.chdir, cwd)
+        self.check_stays_inside_root(os.path.join('.', 'root', ''))
+
+    def test_full_keeps_root(self) -> None:
+        os.makedirs(os.path.join(self.root, 'empty'))
+        file_manager = FileManager(self.root + os.sep)
+        file_manager.clear_empty_folder(full=True)
+
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'empty')))
+        self.assertTrue(os.path.isfile(os.path.join(self.root, 'a', 'b', 'file.txt')))
+        self.assertTrue(os.path.isdir(self.root))
+        self.assertTrue(os.path.isdir(self.sibling))
+
+
+class KnownDirsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.file_manager = FileManager(self.temp_dir.name)
+
+    def test_write_after_dir_removed(self) -> None:
+        # 预先创建并记录的文件夹被其它进程删除后，写文件时重新创建
+        self.assertEqual(self.file_manager.make_dirs(['a/b/x.txt', 'a/b/y.txt', 'c/z.txt']), 2)
+        os.rmdir(os.path.join(self.temp_dir.name, 'a', 'b'))
+        os.rmdir(os.path.join(self.temp_dir.name, 'c'))
+
+        self.file_manager.write_file('a/b/x.txt', b'x')
+        self.file_manager.import_file(os.path.join(self.temp_dir.name, 'a', 'b', 'x.txt'), 'c/z.txt')
+
+        with open(os.path.join(self.temp_dir.name, 'c', 'z.txt'), 'rb') as file:
+            self.assertEqual(file.read(), b'x')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""utils.memory_budget 的测试
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from utils import MemoryBudget
+
+
+class MemoryBudgetTest(unittest.TestCase):
+    def test_acquire_release(self) -> None:
+        budget = MemoryBudget(100)
+
+        self.assertEqual(budget.acquire(30), 30)
+        self.assertEqual(budget.acquire(70), 70)
+        self.assertEqual(budget.used, 100)
+
+        budget.release(30)
+        budget.release(70)
+        self.assertEqual(budget.used, 0)
+
+    def test_unlimited(self) -> None:
+        budget = MemoryBudget(0)
+        self.assertEqual(budget.acquire(1 << 40), 0)
+        budget.release(0)
+        self.assertEqual(budget.used, 0)
+
+    def test_negative_size(self) -> None:
+        budget = MemoryBudget(100)
+        self.assertEqual(budget.acquire(-5), 0)
+        self.assertEqual(budget.used, 0)
+
+    def test_waits_for_release(self) -> None:
+        budget = MemoryBudget(100)
+        first = budget.acquire(80)
+
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(budget.acquire(30)))
+        thread.start()
+
+        # 预算不足时阻塞，直到其它线程释放
+        time.sleep(0.1)
+        self.assertEqual(acquired, [])
+
+        budget.release(first)
+        thread.join(5)
+        self.assertEqual(acquired, [30])
+        self.assertEqual(budget.used, 30)
+
+    def test_oversize(self) -> None:
+        # 超过总预算的请求按总预算占用，只能在没有其它占用时执行
+        budget = MemoryBudget(100)
+        small = budget.acquire(10)
+
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(budget.acquire(1000)))
+        thread.start()
+
+        time.sleep(0.1)
+        self.assertEqual(acquired, [])
+
+        budget.release(small)
+        thread.join(5)
+        self.assertEqual(acquired, [100])
+        self.assertEqual(budget.used, 100)
+
+        budget.release(acquired[0])
+        self.assertEqual(budget.used, 0)
+
+    def test_acquire_async(self) -> None:
+        budget = MemoryBudget(100)
+        self.addCleanup(budget.close)
+
+        async def run() -> int:
+            # 预算充足时直接占用
+            self.assertEqual(await budget.acquire_async(60), 60)
+
+            # 预算不足时在单独的线程中等待，事件循环中的其它协程可以继续执行并释放预算
+            async def release_later() -> None:
+                await asyncio.sleep(0.1)
+                budget.release(60)
+
+            release_task = asyncio.ensure_future(release_later())
+            size = await budget.acquire_async(1000)
+            await release_task
+            return size
+
+        self.assertEqual(asyncio.run(run()), 100)
+        self.assertEqual(budget.used, 100)
+
+        budget.close()
+        budget.release(100)
+        self.assertEqual(budget.used, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+
+"""utils.oss_synchronizer 的测试
+
+使用内存中的 FakeBucket （见 tests.fake_bucket ）代替 OSS ，检查同步结果和实际发出的请求
+"""
+
+import gzip
+import os
+import tempfile
+import unittest
+from typing import Dict
+from unittest import mock
+
+from oss import ObjectInfo
+from utils import FileManager, HashIndex, OSSSynchronizer, dump_plans, load_plans
+from utils.oss_synchronizer import SyncItem
+
+from .fake_bucket import FakeBucket
+
+
+class SynchronizerTestCase(unittest.TestCase):
+    """同步器测试的基类，提供本地文件夹和 Bucket
+    """
+
+    def setUp(self) -> None:
+        self.bucket = FakeBucket()
+        self.root = self.make_dir()
+
+    def make_dir(self) -> str:
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        return temp_dir.name
+
+    def write(self, name: str, data: bytes, mtime: float = None, root: str = None) -> None:
+        path = os.path.join(root or self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def read(self, name: str, root: str = None) -> bytes:
+        with open(os.path.join(root or self.root, name), 'rb') as file:
+            return file.read()
+
+    def read_tree(self, root: str = None) -> Dict[str, bytes]:
+        root = root or self.root
+        return {
+            os.path.relpath(os.path.join(dir_path, name), root).replace(os.sep, '/'): self.read(
+                os.path.join(dir_path, name)
+            )
+            for dir_path, _, names
+            in os.walk(root)
+            for name
+            in names
+        }
+
+    def make_synchronizer(self, root: str = None, **kwargs) -> OSSSynchronizer:
+        kwargs.setdefault('threads_num', 2)
+        return OSSSynchronizer(FileManager(root or self.root), self.bucket, **kwargs)
+
+    def upload(self, **kwargs) -> OSSSynchronizer:
+        self.bucket.calls.clear()
+        synchronizer = self.make_synchronizer(**kwargs)
+        synchronizer.sync_from_local_to_oss()
+        return synchronizer
+
+    def download(self, root: str = None, **kwargs) -> OSSSynchronizer:
+        self.bucket.calls.clear()
+        synchronizer = self.make_synchronizer(root, **kwargs)
+        synchronizer.sync_from_oss_to_local()
+        return synchronizer
+
+    def make_hash_index(self) -> HashIndex:
+        hash_index = HashIndex(os.path.join(self.make_dir(), 'index.db'))
+        self.addCleanup(hash_index.close)
+        return hash_index
+
+
+class CompareModeTest(SynchronizerTestCase):
+    def test_checksum(self) -> None:
+        self.write('a.bin', b'hello')
+        self.upload()
+        self.assertEqual(self.bucket.get_data('a.bin'), b'hello')
+
+        # 没有变化时不上传
+        self.upload()
+        self.assertEqual(self.bucket.count_calls('put'), 0)
+
+        # 大小不变、内容变化时比较 MD5 后上传
+        self.write('a.bin', b'world')
+        self.upload()
+        self.assertEqual(self.bucket.calls.count(('put', 'a.bin')), 1)
+        self.assertEqual(self.bucket.get_data('a.bin'), b'world')
+
+    def test_size_only(self) -> None:
+        self.bucket.add_object('a.bin', b'hello')
+
+        # 大小相同时不比较内容
+        self.write('a.bin', b'world')
+        self.upload(compare_mode='size-only')
+        self.assertEqual(self.bucket.count_calls('put'), 0)
+
+        self.write('a.bin', b'hello world')
+        self.upload(compare_mode='size-only')
+        self.assertEqual(self.bucket.get_data('a.bin'), b'hello world')
+
+    def test_size_mtime(self) -> None:
+        self.write('a.bin', b'hello', mtime=1700000000.5)
+        self.upload(compare_mode='size+mtime')
+        self.assertEqual(float(self.bucket.objects['a.bin'].metadata[self.bucket.mtime_meta]), 1700000000.5)
+
+        # 修改时间没有变化时不比较内容
+        self.write('a.bin', b'world', mtime=1700000000.5)
+        self.upload(compare_mode='size+mtime')
+        self.assertEqual(self.bucket.count_calls('put'), 0)
+
+        self.write('a.bin', b'world', mtime=1700000100.0)
+        self.upload(compare_mode='size+mtime')
+        self.assertEqual(self.bucket.get_data('a.bin'), b'world')
+
+    def test_size_mtime_download(self) -> None:
+        self.bucket.add_object('a.bin', b'hello', {self.bucket.mtime_meta: '1700000000.5'})
+
+        # 下载的文件的修改时间从 GET 的响应头中读取，不另外查询对象
+        self.download(compare_mode='size+mtime')
+        self.assertEqual(self.read('a.bin'), b'hello')
+        self.assertEqual(os.path.getmtime(os.path.join(self.root, 'a.bin')), 1700000000.5)
+        self.assertEqual(self.bucket.count_calls('head'), 0)
+
+        # 修改时间一致，再次同步时跳过
+        self.download(compare_mode='size+mtime')
+        self.assertEqual(self.bucket.count_calls('get'), 0)
+
+        # 没有记录修改时间的对象使用最后修改时间
+        self.bucket.add_object('a.bin', b'world', last_modified=1700000100.0)
+        self.download(compare_mode='size+mtime')
+        self.assertEqual(self.read('a.bin'), b'world')
+        self.assertEqual(os.path.getmtime(os.path.join(self.root, 'a.bin')), 1700000100.0)
+
+
+class SizeShortCircuitTest(SynchronizerTestCase):
+    def test_different_size_skips_hash(self) -> None:
+        self.bucket.add_object('a.bin', b'old')
+        self.write('a.bin', b'new content')
+
+        # 大小不同时不计算 MD5 ，直接下载
+        with mock.patch.object(FileManager, 'hash_file', side_effect=AssertionError('不应计算 MD5')):
+            self.download()
+        self.assertEqual(self.read('a.bin'), b'old')
+        self.assertEqual(self.bucket.count_calls('head'), 0)
+
+    def test_is_modified(self) -> None:
+        self.write('a.bin', b'new content')
+        synchronizer = self.make_synchronizer()
+        file = synchronizer.local_dir.get_file_info('a.bin')
+
+        with mock.patch.object(FileManager, 'hash_file', side_effect=AssertionError('不应计算 MD5')):
+            item = SyncItem('a.bin', file, ObjectInfo('a.bin', 'etag', 3, 0.0))
+            self.assertEqual(synchronizer.is_modified(item), (True, None))
+
+    def test_compressed_upload(self) -> None:
+        # 压缩上传的对象大小与文件不同，比较元数据中记录的原始内容 MD5
+        data = b'hello world\n' * 100
+        self.write('a.txt', data)
+        self.upload(compress=True)
+        self.assertEqual(self.bucket.objects['a.txt'].content_encoding, 'gzip')
+        self.assertEqual(gzip.decompress(self.bucket.get_data('a.txt')), data)
+
+        self.upload(compress=True)
+        self.assertEqual(self.bucket.count_calls('put'), 0)
+
+        # 没有开启压缩时也按元数据判断，不重新下载
+        self.download()
+        self.assertEqual(self.bucket.count_calls('get'), 0)
+
+        self.write('a.txt', data + b'!')
+        self.upload(compress=True)
+        self.assertEqual(gzip.decompress(self.bucket.get_data('a.txt')), data + b'!')
+
+
+class CopyTest(SynchronizerTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.write('a.bin', b'some content')
+        self.upload()
+        os.rename(os.path.join(self.root, 'a.bin'), os.path.join(self.root, 'b.bin'))
+
+    def test_rename(self) -> None:
+        # 重命名的文件使用服务端复制，旧对象在复制后删除
+        self.upload()
+        self.assertEqual(self.bucket.count_calls('put'), 0)
+        self.assertIn(('copy', 'a.bin', 'b.bin'), self.bucket.calls)
+        self.assertLess(self.bucket.calls.index(('copy', 'a.bin', 'b.bin')), self.bucket.calls.index(('del', 'a.bin')))
+        self.assertEqual(sorted(self.bucket.objects), ['b.bin'])
+        self.assertEqual(self.bucket.get_data('b.bin'), b'some content')
+
+    def test_copy_size_limit(self) -> None:
+        # 超过服务端复制大小上限时直接上传
+        self.bucket.copy_size_limit = 4
+        self.upload()
+        self.assertEqual(self.bucket.count_calls('copy'), 0)
+        self.assertIn(('put', 'b.bin'), self.bucket.calls)
+        self.assertEqual(self.bucket.get_data('b.bin'), b'some content')
+
+    def test_copy_failure(self) -> None:
+        # 服务端复制失败时改为上传本地文件
+        self.bucket.fail_copy = True
+        self.upload()
+        self.assertIn(('copy', 'a.bin', 'b.bin'), self.bucket.calls)
+        self.assertIn(('put', 'b.bin'), self.bucket.calls)
+        self.assertEqual(sorted(self.bucket.objects), ['b.bin'])
+        self.assertEqual(self.bucket.get_data('b.bin'), b'some content')
+
+
+class AppendTest(SynchronizerTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.hash_index = self.make_hash_index()
+
+    def upload(self, **kwargs) -> OSSSynchronizer:
+        return super().upload(append_patterns=['*.log'], hash_index=self.hash_index, **kwargs)
+
+    def test_append_tail(self) -> None:
+        self.write('a.log', b'line 1\n')
+        self.upload()
+        self.assertEqual(self.bucket.calls.count(('append', 'a.log', 0)), 1)
+        self.assertTrue(self.bucket.objects['a.log'].appendable)
+
+        # 只在末尾增加内容时只上传增加的部分
+        self.write('a.log', b'line 1\nline 2\n')
+        self.upload()
+        self.assertEqual([call for call in self.bucket.calls if call[0] in ('append', 'put', 'del')], [
+            ('append', 'a.log', 7),
+        ])
+        self.assertEqual(self.bucket.get_data('a.log'), b'line 1\nline 2\n')
+
+        self.upload()
+        self.assertEqual(self.bucket.count_calls('append'), 0)
+
+    def test_recreate_normal_object(self) -> None:
+        # 已有的普通对象不能追加，删除后重新创建
+        self.bucket.add_object('a.log', b'line 1\n')
+        self.write('a.log', b'line 1\nline 2\n')
+        self.upload()
+        self.assertEqual([call for call in self.bucket.calls if call[0] in ('append', 'put', 'del')], [
+            ('del', 'a.log'),
+            ('append', 'a.log', 0),
+        ])
+        self.assertEqual(self.bucket.get_data('a.log'), b'line 1\nline 2\n')
+        self.assertTrue(self.bucket.objects['a.log'].appendable)
+
+    def test_recreate_on_crc64_mismatch(self) -> None:
+        self.write('a.log', b'line 1\n')
+        self.upload()
+
+        # 对象被其它程序修改，与上次上传的内容不一致时不能追加
+        self.bucket.objects['a.log'] = self.bucket.objects['a.log']._replace(data=b'LINE 1\n')
+        self.write('a.log', b'line 1\nline 2\n')
+        self.upload()
+        self.assertEqual([call for call in self.bucket.calls if call[0] in ('append', 'put', 'del')], [
+            ('del', 'a.log'),
+            ('append', 'a.log', 0),
+        ])
+        self.assertEqual(self.bucket.get_data('a.log'), b'line 1\nline 2\n')
+
+
+class PackTest(SynchronizerTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.files = {
+            'd/a.bin': b'a' * 10,
+            'd/b.bin': b'b' * 20,
+            'd/e/c.bin': b'c' * 30,
+        }
+        for name, data in self.files.items():
+            self.write(name, data)
+
+    def test_pack_and_unpack(self) -> None:
+        self.upload(pack_threshold=100)
+
+        # 小文件按文件夹打包，不上传为普通对象
+        self.assertTrue(all('.oss-sync-pack/' in key for key in self.bucket.objects))
+        self.assertIn('d/.oss-sync-pack/index.json', self.bucket.objects)
+        self.assertIn('d/e/.oss-sync-pack/index.json', self.bucket.objects)
+        self.assertEqual(self.bucket.count_calls('put'), 4)
+
+        self.upload(pack_threshold=100)
+        self.assertEqual(self.bucket.count_calls('put'), 0)
+
+        # 下载时按索引从打包对象中范围下载，每个打包对象只下载一次
+        root = self.make_dir()
+        self.download(root, pack_threshold=100)
+        self.assertEqual(self.read_tree(root), self.files)
+        self.assertEqual(self.bucket.count_calls('range'), 2)
+
+    def test_unpack_to_plain_object(self) -> None:
+        self.upload(pack_threshold=100)
+
+        # 变大后不再打包的文件改为普通对象上传，并从索引中删除
+        self.files['d/a.bin'] = b'a' * 200
+        self.write('d/a.bin', self.files['d/a.bin'])
+        self.upload(pack_threshold=100)
+        self.assertEqual(self.bucket.get_data('d/a.bin'), self.files['d/a.bin'])
+        self.assertIn(('put', 'd/.oss-sync-pack/index.json'), self.bucket.calls)
+
+        root = self.make_dir()
+        self.download(root, pack_threshold=100)
+        self.assertEqual(self.read_tree(root), self.files)
+
+    def test_delete_packed_file(self) -> None:
+        self.upload(pack_threshold=100)
+
+        # 文件夹中没有打包文件后删除索引和打包对象
+        os.remove(os.path.join(self.root, 'd/e/c.bin'))
+        self.upload(pack_threshold=100)
+        self.assertFalse(any(key.startswith('d/e/') for key in self.bucket.objects))
+        self.assertIn('d/.oss-sync-pack/index.json', self.bucket.objects)
+
+
+class RemoteToRemoteTest(SynchronizerTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.dest = FakeBucket()
+        self.bucket.add_object('src/a.bin', b'hello', {'k': 'v'})
+        self.bucket.add_object('src/b.txt', gzip.compress(b'text'), content_encoding='gzip')
+        self.dest.add_object('dst/old.bin', b'old')
+
+    def sync(self) -> None:
+        self.dest.calls.clear()
+        OSSSynchronizer(
+            None, self.bucket, threads_num=2, remote_prefix='src/', dest_bucket=self.dest, dest_prefix='dst/'
+        ).sync_from_oss_to_oss()
+
+    def assert_synced(self) -> None:
+        self.assertEqual(sorted(self.dest.objects), ['dst/a.bin', 'dst/b.txt'])
+        for name in ['a.bin', 'b.txt']:
+            src, dst = self.bucket.objects[f'src/{name}'], self.dest.objects[f'dst/{name}']
+            self.assertEqual((dst.data, dst.metadata, dst.content_encoding), (src.data, src.metadata, src.content_encoding))
+
+    def test_copy(self) -> None:
+        # 同一类型的 OSS 使用服务端复制，目标中多余的对象被删除
+        self.sync()
+        self.assert_synced()
+        self.assertEqual(self.dest.count_calls('copy'), 2)
+        self.assertEqual(self.dest.count_calls('put'), 0)
+
+        self.sync()
+        self.assertEqual(self.dest.count_calls('copy'), 0)
+
+    def test_copy_failure(self) -> None:
+        # 复制失败时读取源对象原始内容后上传
+        self.dest.fail_copy = True
+        self.sync()
+        self.assert_synced()
+        self.assertEqual(self.dest.count_calls('put'), 2)
+
+    def test_different_type(self) -> None:
+        # 不同类型的 OSS 不尝试服务端复制
+        self.dest.__class__ = type('OtherBucket', (FakeBucket,), {})
+        self.sync()
+        self.assert_synced()
+        self.assertEqual(self.dest.count_calls('copy'), 0)
+
+
+class DryRunTest(SynchronizerTestCase):
+    def test_plan_and_apply(self) -> None:
+        self.bucket.add_object('old.bin', b'old')
+        self.bucket.add_object('same.bin', b'same')
+        self.write('same.bin', b'same')
+        self.write('new.bin', b'new')
+
+        # 试运行时只列出和比较，不修改 OSS
+        synchronizer = self.upload(dry_run=True)
+        self.assertEqual({call[0] for call in self.bucket.calls}, {'list'})
+        self.assertEqual(sorted(self.bucket.objects), ['old.bin', 'same.bin'])
+        self.assertEqual(
+            sorted((entry.action, entry.name, entry.tag) for entry in synchronizer.plan.entries),
+            [('del', 'old.bin', '-'), ('put', 'new.bin', '+')]
+        )
+
+        path = os.path.join(self.make_dir(), 'plan.json')
+        dump_plans({'unit': synchronizer.plan}, path)
+        plan = load_plans(path)['unit']
+
+        # 执行计划时不再列出和比较
+        self.bucket.calls.clear()
+        self.make_synchronizer().sync_from_local_to_oss(plan)
+        self.assertEqual(self.bucket.count_calls('list'), 0)
+        self.assertEqual(sorted(self.bucket.objects), ['new.bin', 'same.bin'])
+        self.assertEqual(self.bucket.get_data('new.bin'), b'new')
+
+    def test_plan_download(self) -> None:
+        self.bucket.add_object('a.bin', b'hello')
+        self.write('b.bin', b'local')
+
+        synchronizer = self.download(dry_run=True)
+        self.assertEqual(self.read_tree(), {'b.bin': b'local'})
+
+        self.make_synchronizer().sync_from_oss_to_local(synchronizer.plan)
+        self.assertEqual(self.read_tree(), {'a.bin': b'hello'})
+
+    def test_plan_direction(self) -> None:
+        synchronizer = self.upload(dry_run=True)
+        with self.assertRaises(AssertionError):
+            self.make_synchronizer().sync_from_oss_to_local(synchronizer.plan)
+
+
+class ShardTest(SynchronizerTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.files = {f'dir{i % 3}/file{i}.bin': str(i).encode('utf-8') for i in range(20)}
+        for name, data in self.files.items():
+            self.write(name, data)
+
+    def test_upload_shards(self) -> None:
+        # 各分片上传的文件互不重叠，合起来是全部文件
+        uploaded = []
+        for shard_index in range(3):
+            self.upload(shard_index=shard_index, shard_count=3)
+            uploaded.append({call[1] for call in self.bucket.calls if call[0] == 'put'})
+
+        self.assertEqual(sum(len(names) for names in uploaded), len(self.files))
+        self.assertEqual(set().union(*uploaded), set(self.files))
+
+        # 其它分片的对象不会被删除
+        os.remove(os.path.join(self.root, 'dir0/file0.bin'))
+        for shard_index in range(3):
+            self.upload(shard_index=shard_index, shard_count=3)
+        self.assertEqual(sorted(self.bucket.objects), sorted(set(self.files) - {'dir0/file0.bin'}))
+
+    def test_download_shards(self) -> None:
+        self.upload()
+        root = self.make_dir()
+
+        # 只有 0 号分片清理空文件夹
+        with mock.patch.object(FileManager, 'clear_empty_folder') as clear_empty_folder:
+            for shard_index in [1, 0]:
+                self.download(root, shard_index=shard_index, shard_count=2)
+                self.assertEqual(clear_empty_folder.call_count, 1 - shard_index)
+
+        self.assertEqual(self.read_tree(root), self.files)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""utils.pack 的测试
+"""
+
+import io
+import os
+import tarfile
+import unittest
+from hashlib import md5
+
+from utils.pack import PackIndex, PackMember, build_pack, merge_ranges, parse_pack_key, split_packs
+
+
+class BuildPackTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.files = [
+            ('dir/a.txt', b'hello', 1700000000.5),
+            ('dir/empty', b'', 1700000001.0),
+            ('dir/block.bin', os.urandom(tarfile.BLOCKSIZE), 1700000002.0),
+            # 文件名超过 tar 头部的 100 字节时会多写一个 PAX 扩展头部
+            (f'dir/{"长" * 60}.bin', os.urandom(1000), 1700000003.0),
+            ('dir/last.bin', os.urandom(3000), 1700000004.0),
+        ]
+        self.data, self.members = build_pack(self.files)
+
+    def test_read_by_offset(self) -> None:
+        self.assertEqual([member[0] for member in self.members], [name for name, _, _ in self.files])
+
+        for (name, content, mtime), (_, offset, size, content_md5, member_mtime) in zip(self.files, self.members):
+            with self.subTest(name=name):
+                self.assertEqual(self.data[offset:offset + size], content)
+                self.assertEqual(size, len(content))
+                self.assertEqual(content_md5, md5(content).hexdigest())
+                self.assertEqual(member_mtime, mtime)
+
+    def test_standard_tar(self) -> None:
+        # 打包对象可以直接用 tar 解开
+        with tarfile.open(fileobj=io.BytesIO(self.data), mode='r') as tar:
+            for name, content, mtime in self.files:
+                with self.subTest(name=name):
+                    info = tar.getmember(os.path.basename(name))
+                    self.assertEqual(tar.extractfile(info).read(), content)
+                    self.assertEqual(info.mtime, int(mtime))
+
+    def test_index_round_trip(self) -> None:
+        index = PackIndex('dir/', {
+            name: PackMember(name, 'abc.tar', offset, size, content_md5, mtime)
+            for name, offset, size, content_md5, mtime
+            in self.members
+        })
+
+        loaded = PackIndex.loads('dir/', index.dumps())
+        self.assertEqual(loaded.dir_prefix, 'dir/')
+        self.assertEqual(loaded.members, index.members)
+        self.assertEqual(loaded.index_key, 'dir/.oss-sync-pack/index.json')
+        self.assertEqual(loaded.pack_key('abc.tar'), 'dir/.oss-sync-pack/abc.tar')
+
+        # 按索引读回的内容与原文件一致
+        for name, content, _ in self.files:
+            member = loaded.members[name]
+            self.assertEqual(self.data[member.offset:member.offset + member.size], content)
+
+        # 除了扩展头部，索引引用的文件占满整个打包对象（不含结尾的两个空块）
+        self.assertLessEqual(loaded.pack_usage()['abc.tar'], len(self.data) - 2 * tarfile.BLOCKSIZE)
+
+    def test_index_loads_invalid(self) -> None:
+        for data in [b'', b'\xff', b'[]', b'{}', b'{"members": {"a": 1}}']:
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    PackIndex.loads('', data)
+
+
+class PackHelpersTest(unittest.TestCase):
+    def test_parse_pack_key(self) -> None:
+        self.assertEqual(parse_pack_key('.oss-sync-pack/index.json'), '')
+        self.assertEqual(parse_pack_key('a/b/.oss-sync-pack/x.tar'), 'a/b/')
+        self.assertIsNone(parse_pack_key('a/b/x.tar'))
+        self.assertIsNone(parse_pack_key('a/x.oss-sync-pack/x.tar'))
+
+    def test_split_packs(self) -> None:
+        sizes = [('a', 6), ('b', 4), ('c', 1), ('d', 20), ('e', 3)]
+        self.assertEqual(split_packs(sizes, 10), [['a', 'b'], ['c'], ['d'], ['e']])
+        self.assertEqual(split_packs([], 10), [])
+
+    def test_merge_ranges(self) -> None:
+        members = [
+            PackMember(name, 'p.tar', offset, size, '', 0.0)
+            for name, offset, size
+            in [('c', 3000, 100), ('a', 0, 100), ('b', 150, 100), ('d', 3150, 10)]
+        ]
+        groups = merge_ranges(members, max_gap=100)
+        self.assertEqual([[member.name for member in group] for group in groups], [['a', 'b'], ['c', 'd']])
+
+
+if __name__ == '__main__':
+    unittest.main()
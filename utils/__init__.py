@@ -1,9 +1,32 @@
 # -*- coding: utf-8 -*-
 
-from .file_manager import FileManager
-from .oss_synchronizer import OSSSynchronizer
+from .bandwidth_limiter import ThrottledReader, TokenBucket
+from .checksum import ChecksumError, ChecksumReader
+from .download_cache import DownloadCache
+from .file_manager import FileInfo, FileManager
+from .hash_index import HashIndex
+from .memory_budget import MemoryBudget
+from .path_filter import PathFilter
+from .oss_synchronizer import OSSSynchronizer, compare_modes
+from .sync_plan import PlanEntry, SyncPlan, dump_plans, load_plans
+from .throughput_history import ThroughputHistory
 
 __all__ = [
+    'ChecksumError',
+    'ChecksumReader',
+    'DownloadCache',
+    'FileInfo',
     'FileManager',
-    'OSSSynchronizer'
+    'HashIndex',
+    'MemoryBudget',
+    'OSSSynchronizer',
+    'PathFilter',
+    'PlanEntry',
+    'SyncPlan',
+    'ThrottledReader',
+    'ThroughputHistory',
+    'TokenBucket',
+    'compare_modes',
+    'dump_plans',
+    'load_plans',
 ]
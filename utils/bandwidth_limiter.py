@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""带宽限制
+
+该模块定义了基于令牌桶的带宽限制器，以及读取时受其限制的流
+"""
+
+import logging
+import threading
+import time
+from typing import BinaryIO, List, Optional
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+class TokenBucket(object):
+    def __init__(self, rate: float = 0, burst: Optional[float] = None) -> None:
+        """初始化
+
+        令牌（字节）以 rate 的速度持续补充，最多累积 burst 个。
+        所有线程共享同一个令牌桶，总速度不会超过 rate
+
+        Args:
+            rate: 速度上限（字节/秒），小于等于 0 表示不限速
+            burst: 最多累积的令牌数（可选），默认为 1 秒的量
+
+        """
+
+        self._lock: threading.Lock = threading.Lock()
+        self._burst: Optional[float] = burst
+        self.rate: float = 0
+        self.capacity: float = 0
+        self._tokens: float = 0
+        self._last_time: float = time.monotonic()
+
+        self.set_rate(rate)
+
+    def set_rate(self, rate: float) -> None:
+        """调整速度上限
+
+        可以在同步过程中随时调用，正在等待的线程会在下一次取令牌时使用新的速度
+
+        Args:
+            rate: 速度上限（字节/秒），小于等于 0 表示不限速
+
+        """
+
+        with self._lock:
+            self._refill()
+            self.rate = max(rate, 0)
+            self.capacity = self._burst if self._burst is not None else self.rate
+            self._tokens = min(self._tokens, self.capacity)
+
+        logger.debug(f'限速已调整为 {self.rate} B/s')
+
+    def _refill(self) -> None:
+        """按经过的时间补充令牌，调用时需持有锁
+        """
+
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._last_time) * self.rate, self.capacity)
+        self._last_time = now
+
+    def reserve(self, size: int) -> float:
+        """取走令牌但不等待
+
+        令牌不足时允许透支，由调用方等待到透支的部分被补足，
+        这样大于桶容量的请求也能完成，并且不会阻塞其它线程调整速度
+
+        Args:
+            size: 令牌数（字节）
+
+        Returns:
+            需要等待的秒数
+
+        """
+
+        with self._lock:
+            if self.rate <= 0:
+                return 0
+
+            self._refill()
+            self._tokens -= size
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+
+    def consume(self, size: int) -> None:
+        """取走令牌，令牌不足时在锁外等待
+
+        Args:
+            size: 令牌数（字节）
+
+        """
+
+        wait = self.reserve(size)
+        if wait > 0:
+            time.sleep(wait)
+
+
+async def throttle_async(limiters: List[TokenBucket], size: int) -> None:
+    """在协程中从所有限制器取走令牌，等待时不阻塞事件循环
+
+    Args:
+        limiters: 带宽限制器列表
+        size: 令牌数（字节）
+
+    """
+
+    # 只在 asyncio 传输引擎中使用，不在模块中导入 asyncio
+    import asyncio
+
+    for limiter in limiters:
+        wait = limiter.reserve(size)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class ThrottledReader(object):
+    def __init__(self, raw: BinaryIO, limiters: List[TokenBucket], size: Optional[int] = None) -> None:
+        """初始化
+
+        读取时从所有限制器中取走与读到的字节数相同的令牌
+
+        Args:
+            raw: 原始流
+            limiters: 带宽限制器列表，比如全局限制器和同步单元的限制器
+            size: 流的总大小（可选）。若指定，则支持 len() ， HTTP 客户端据此设置 Content-Length
+
+        """
+
+        self.raw: BinaryIO = raw
+        self.limiters: List[TokenBucket] = limiters
+        self.size: Optional[int] = size
+
+        # 每次从原始流读取的最大字节数，避免一次取走过多令牌造成突发
+        self.chunk_size: int = 64 * 1024
+
+    def __len__(self) -> int:
+        if self.size is None:
+            raise TypeError('流的大小未知')
+        return self.size
+
+    def _throttle(self, size: int) -> None:
+        for limiter in self.limiters:
+            limiter.consume(size)
+
+    def read(self, size: int = -1) -> bytes:
+        """读取数据
+
+        Args:
+            size: 最多读取的字节数，小于 0 时读取全部
+
+        Returns:
+            读取的数据，读到末尾时返回 b''
+
+        """
+
+        if size is None or size < 0:
+            chunks = []
+            while True:
+                chunk = self.read(self.chunk_size)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+
+        data = self.raw.read(min(size, self.chunk_size))
+        if data:
+            self._throttle(len(data))
+        return data
+
+    def readinto(self, buffer: bytearray) -> int:
+        """读取数据到缓冲区
+
+        Args:
+            buffer: 缓冲区
+
+        Returns:
+            读取的字节数，读到末尾时返回 0
+
+        """
+
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        """关闭原始流
+        """
+
+        self.raw.close()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""传输校验
+
+该模块定义了在读取数据的同时计算校验的流
+"""
+
+import logging
+from hashlib import md5
+from typing import Any, BinaryIO, Optional
+
+from .crc64 import crc64
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+class ChecksumError(ValueError):
+    """传输的内容与服务端的校验不一致
+    """
+
+
+class ChecksumReader(object):
+    def __init__(self, raw: BinaryIO, with_md5: bool = True, with_crc64: bool = False) -> None:
+        """初始化
+
+        包装上传或下载的数据流，在传输读取数据的同时计算 MD5 和 CRC64 ，不需要再读一遍数据
+
+        Args:
+            raw: 原始流
+            with_md5: 是否计算 MD5
+            with_crc64: 是否计算 CRC64
+
+        """
+
+        self.raw: BinaryIO = raw
+        self._md5: Optional[Any] = md5() if with_md5 else None
+        self.crc64: Optional[int] = 0 if with_crc64 else None
+
+        # 已读取的字节数
+        self.size: int = 0
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def _update(self, data: bytes) -> None:
+        self.size += len(data)
+        if self._md5 is not None:
+            self._md5.update(data)
+        if self.crc64 is not None:
+            self.crc64 = crc64(data, self.crc64)
+
+    def read(self, size: int = -1) -> bytes:
+        """读取数据
+
+        Args:
+            size: 最多读取的字节数，小于 0 时读取全部
+
+        Returns:
+            读取的数据，读到末尾时返回 b''
+
+        """
+
+        data = self.raw.read(size)
+        if data:
+            self._update(data)
+        return data
+
+    def readinto(self, buffer: bytearray) -> int:
+        """读取数据到缓冲区
+
+        Args:
+            buffer: 缓冲区
+
+        Returns:
+            读取的字节数，读到末尾时返回 0
+
+        """
+
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        """关闭原始流
+        """
+
+        self.raw.close()
+
+    @property
+    def md5(self) -> Optional[str]:
+        """已读取数据的 MD5 （小写十六进制），不计算 MD5 时为 None
+        """
+
+        return self._md5.hexdigest() if self._md5 is not None else None
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""下载缓存
+
+该模块定义了在同一台机器上的多个同步单元和多次同步之间共用的下载缓存
+"""
+
+import collections
+import logging
+import os
+import re
+import threading
+from typing import Optional
+
+from .file_manager import copy_file, temp_suffix
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+# 可以作为缓存键的 ETag ：十六进制，分片上传的对象带有 '-分片数' 后缀
+_etag_pattern: re.Pattern = re.compile(r'[0-9a-f]{32}(-\d+)?')
+
+
+class DownloadCache(object):
+    def __init__(self, cache_dir: str, max_size: int, buffer_size: int = 1024 * 1024) -> None:
+        """初始化
+
+        以对象的 ETag 为键保存下载过的文件内容（ ETag 相同的对象内容相同），
+        把同一个 Bucket 同步到多个本地目录时，之后的目录直接从缓存复制，不需要再下载。
+        缓存总大小超过 max_size 时删除最久没有使用的文件，使用时间记录在文件的修改时间中，多次同步之间也有效
+
+        Notes:
+            - 多个进程同时使用同一个缓存文件夹时，各自按启动时扫描的结果统计大小，总大小可能暂时超过上限
+            - 从缓存复制时与 FileManager.clone_file 一样可能使用硬链接，不要原地修改以硬链接同步得到的文件
+
+        Args:
+            cache_dir: 缓存文件夹，不存在时会被创建
+            max_size: 缓存总大小上限（字节）
+            buffer_size: 复制文件时的缓冲区大小
+
+        """
+
+        self.cache_dir: str = cache_dir
+        self.max_size: int = max_size
+        self.buffer_size: int = buffer_size
+
+        # 以 ETag 为键的文件大小，按最近使用的顺序排列
+        self._lock: threading.Lock = threading.Lock()
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self._size: int = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        entries = []
+        for dir_entry in os.scandir(cache_dir):
+            if not dir_entry.is_dir():
+                continue
+            for entry in os.scandir(dir_entry.path):
+                if not _etag_pattern.fullmatch(entry.name):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+
+        logger.debug(f'下载缓存 \'{cache_dir}\' 中有 {len(self._entries)} 个文件，共 {self._size} 字节')
+
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def make_key(etag: str) -> Optional[str]:
+        """把 ETag 转换为缓存键
+
+        Args:
+            etag: 对象的 ETag
+
+        Returns:
+            缓存键，不是 MD5 或分片上传 ETag 格式时返回 None
+
+        """
+
+        key = etag.strip('"').lower()
+        return key if _etag_pattern.fullmatch(key) else None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key: str, size: Optional[int] = None) -> Optional[str]:
+        """查询缓存
+
+        Args:
+            key: 缓存键
+            size: 预期的文件大小（可选），大小不一致的缓存文件会被删除
+
+        Returns:
+            命中时返回缓存文件路径，否则返回 None
+
+        """
+
+        path = self._path(key)
+        try:
+            if size is not None and os.path.getsize(path) != size:
+                logger.warning(f'下载缓存 \'{path}\' 的大小与对象不一致，将删除')
+                self._remove(key)
+                return None
+
+            # 修改时间即最近使用时间
+            os.utime(path)
+        except FileNotFoundError:
+            # 可能已被其它进程淘汰
+            with self._lock:
+                if key in self._entries:
+                    self._size -= self._entries.pop(key)
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+        return path
+
+    def put(self, key: str, src_path: str) -> None:
+        """把文件加入缓存
+
+        总是复制（或 reflink ）文件，之后修改源文件不会影响缓存
+
+        Args:
+            key: 缓存键
+            src_path: 文件路径
+
+        """
+
+        size = os.path.getsize(src_path)
+        if size > self.max_size:
+            return
+
+        path = self._path(key)
+        temp_path = f'{path}.{threading.get_ident()}{temp_suffix}'
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            copy_file(src_path, temp_path, buffer_size=self.buffer_size)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def _remove(self, key: str) -> None:
+        """删除缓存文件
+
+        Args:
+            key: 缓存键
+
+        """
+
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)
+
+    def _evict(self) -> None:
+        """删除最久没有使用的文件，直到总大小不超过上限，调用时需要持有锁
+        """
+
+        while self._size > self.max_size and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            logger.debug(f'从下载缓存中淘汰 {key}')
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
@@ -7,64 +7,296 @@
 
 import logging
 import os
-from typing import List
+import shutil
+import threading
+import time
+from hashlib import md5
+from typing import TYPE_CHECKING, BinaryIO, Callable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 上没有 fcntl ，无法使用 reflink
+    fcntl = None
+
+from .crc64 import crc64
+from .path_filter import PathFilter
+
+if TYPE_CHECKING:
+    from .hash_index import HashIndex
 
 
 logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
 
 
+class FileInfo(NamedTuple):
+    """列出文件时得到的文件信息
+    """
+
+    # 基于根目录的文件路径（使用 '/' 分隔）
+    name: str
+
+    # 文件大小（字节）
+    size: int
+
+    # 文件最后修改时间（ Unix 时间戳）
+    mtime: float
+
+
+class DirEntry(NamedTuple):
+    """文件夹中的一项，用于缓存文件夹的内容
+    """
+
+    # 文件或文件夹名
+    name: str
+
+    # 是否是文件夹
+    is_dir: bool
+
+    # 文件大小（字节），文件夹为 0
+    size: int
+
+    # 文件最后修改时间（ Unix 时间戳），文件夹为 0
+    mtime: float
+
+
+# 下载过程中临时文件的后缀，写完后再重命名为目标文件
+temp_suffix: str = '.oss-sync-tmp'
+
+# 修改时间距扫描时不足该秒数的文件夹不缓存，避免在同一个时间戳内再次修改的文件夹被误认为没有变化
+dir_cache_min_age: float = 2.0
+
+# Linux 上用于 reflink （写时复制）的 ioctl 请求号
+FICLONE: int = 0x40049409
+
+
+def copy_file(src_path: str, dst_path: str, hardlink: bool = False, buffer_size: int = 1024 * 1024) -> None:
+    """复制文件
+
+    依次尝试硬链接（需开启 hardlink ）、 reflink （写时复制，需文件系统支持）和普通复制
+
+    Args:
+        src_path: 源文件路径
+        dst_path: 目标文件路径，所在的文件夹必须已经存在
+        hardlink: 是否优先使用硬链接
+        buffer_size: 普通复制时的缓冲区大小
+
+    """
+
+    if hardlink:
+        try:
+            if os.path.lexists(dst_path):
+                os.remove(dst_path)
+            os.link(src_path, dst_path)
+            logger.debug(f'ln \'{src_path}\' \'{dst_path}\'')
+            return
+        except OSError as err:
+            logger.debug(f'创建硬链接失败： {err}')
+
+    with open(src_path, 'rb') as src_file, open(dst_path, 'wb') as dst_file:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+                logger.debug(f'cp --reflink \'{src_path}\' \'{dst_path}\'')
+                return
+            except OSError as err:
+                logger.debug(f'reflink 失败： {err}')
+
+        logger.debug(f'cp \'{src_path}\' \'{dst_path}\'')
+        shutil.copyfileobj(src_file, dst_file, buffer_size)
+
+
 class FileManager(object):
-    def __init__(self, root_dir: str) -> None:
+    def __init__(self, root_dir: str, buffer_size: int = 1024 * 1024, hardlink: bool = False) -> None:
         """初始化
 
         Args:
-            root_dir: 文件根文件夹
+            root_dir: 文件根文件夹，会被转换为规范的绝对路径
+            buffer_size: 计算文件校验时使用的读缓冲区大小
+            hardlink: 复制本地文件时是否优先使用硬链接
 
         """
 
-        self.root_dir: str = root_dir
+        # 规范化后才能与 os.path.dirname 得到的上级文件夹比较，比如 '/x/root/' 与 '/x/root'
+        self.root_dir: str = os.path.abspath(root_dir)
+        self.hardlink: bool = hardlink
+
+        # 计算校验时每个线程复用的读缓冲区
+        self.buffer_size: int = buffer_size
+        self._local: threading.local = threading.local()
+
+        # 删除过文件的文件夹，清理空文件夹时只检查这些文件夹
+        self._lock: threading.Lock = threading.Lock()
+        self._touched_dirs: Set[str] = set()
+
+        # 已确认存在的文件夹，写文件时不再检查
+        self._known_dirs: Set[str] = set()
 
-    def list_file(self) -> List[str]:
+    def list_file(
+            self,
+            path_filter: Optional[PathFilter] = None,
+            dir_cache: Optional['HashIndex'] = None,
+            full_scan: bool = False
+    ) -> List[FileInfo]:
         """列出文件
 
         遍历根目录下所有文件
 
+        指定了 dir_cache 时，会记录每个文件夹的修改时间和其中的内容（包括文件的大小和修改时间），
+        之后遍历时修改时间没有变化的文件夹直接使用记录的内容，不再读取文件夹和获取其中文件的信息
+
+        Notes:
+            - 文件夹的修改时间只在其中增加、删除或重命名文件时变化，在原有位置修改已有文件的内容不会被发现，
+              需要定期使用 full_scan 完整遍历
+
+        Args:
+            path_filter: 路径过滤器（可选）。若指定，则只列出需要同步的文件，被排除的文件夹不会被遍历
+            dir_cache: 记录文件夹内容的索引（可选）
+            full_scan: 是否忽略已记录的文件夹内容完整遍历，同时重新记录所有文件夹的内容
+
         Returns:
             返回格式如下：
 
             [
-                'file1_path',
-                'file2_path',
-                'file3_path',
+                FileInfo(name='file1_path', size=file1_size, mtime=file1_mtime),
+                FileInfo(name='file2_path', size=file2_size, mtime=file2_mtime),
                 # ...
             ]
 
         """
         logger.debug(f'ls \'{self.root_dir}\'')
 
-        root = self.root_dir
-        if root[-1] in ['/', '\\']:
-            root = root[:-1]
-
-        root_len = len(self.root_dir) + 1
         files_list = []
 
-        for path in os.walk(root):
-            if path[2]:
-                for file in path[2]:
-                    files_list.append((path[0].replace('\\', '/') + '/' + file)[root_len:])
+        # 完整遍历时清空记录，不再存在的文件夹的记录也就一并删除了
+        if dir_cache is not None and full_scan:
+            dir_cache.clear_dirs(self.root_dir)
+
+        # 待遍历的 (文件夹路径, 基于根目录的路径前缀)
+        dirs_stack = [(self.root_dir, '')]
+
+        while dirs_stack:
+            dir_path, prefix = dirs_stack.pop()
+
+            if dir_cache is None:
+                entries = self._scan_dir(dir_path, path_filter, prefix)
+            else:
+                entries = self._scan_dir_cached(dir_path, prefix, dir_cache, full_scan)
+
+            for entry in entries:
+                path = f'{prefix}{entry.name}'
+
+                if entry.is_dir:
+                    if path_filter is not None and path_filter.is_pruned(path):
+                        logger.debug(f'跳过文件夹 \'{path}\'')
+                        continue
+                    dirs_stack.append((os.path.join(dir_path, entry.name), f'{path}/'))
+                    continue
 
-        logger.debug('Local Files:')
-        for i in files_list:
-            logger.debug(f'  - {i}')
+                if path_filter is not None and not path_filter.is_included(path):
+                    continue
+
+                files_list.append(FileInfo(path, entry.size, entry.mtime))
+
+        # 文件很多时逐行格式化的开销不可忽略，只在开启调试日志时输出
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Local Files:')
+            for i in files_list:
+                logger.debug(f'  - {i}')
 
         return files_list
 
-    def read_file(self, file_name: str) -> bytes:
+    @staticmethod
+    def _scan_dir(dir_path: str, path_filter: Optional[PathFilter] = None, prefix: str = '') -> List[DirEntry]:
+        """读取文件夹的内容
+
+        Args:
+            dir_path: 文件夹路径
+            path_filter: 路径过滤器（可选）。若指定，则不获取不需要同步的文件的信息
+            prefix: 文件夹基于根目录的路径前缀，与 path_filter 一起使用
+
+        Returns:
+            文件夹中的文件和子文件夹，不包括指向文件夹的符号链接和下载临时文件
+
+        """
+
+        entries = []
+
+        with os.scandir(dir_path) as it:
+            for entry in it:
+
+                # 与 os.walk 一致，不进入指向文件夹的符号链接
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        entries.append(DirEntry(entry.name, True, 0, 0))
+                    continue
+
+                # 中断的下载留下的临时文件
+                if entry.name.endswith(temp_suffix):
+                    continue
+
+                if path_filter is not None and not path_filter.is_included(f'{prefix}{entry.name}'):
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except OSError as err:
+                    logger.warning(f'无法读取文件信息，已忽略： {err}')
+                    continue
+
+                entries.append(DirEntry(entry.name, False, stat.st_size, stat.st_mtime))
+
+        return entries
+
+    def _scan_dir_cached(
+            self,
+            dir_path: str,
+            prefix: str,
+            dir_cache: 'HashIndex',
+            full_scan: bool = False
+    ) -> List[DirEntry]:
+        """读取文件夹的内容，文件夹的修改时间没有变化时使用记录的内容
+
+        记录的是文件夹的全部内容（不经过路径过滤），过滤规则改变后记录仍然有效
+
+        Args:
+            dir_path: 文件夹路径
+            prefix: 文件夹基于根目录的路径前缀
+            dir_cache: 记录文件夹内容的索引
+            full_scan: 是否忽略已记录的内容
+
+        Returns:
+            文件夹中的文件和子文件夹，不包括指向文件夹的符号链接和下载临时文件
+
+        """
+
+        dir_name = prefix.rstrip('/')
+
+        try:
+            dir_stat = os.stat(dir_path)
+        except OSError as err:
+            logger.warning(f'无法读取文件夹信息，已忽略： {err}')
+            return []
+
+        if not full_scan:
+            cached = dir_cache.get_dir(self.root_dir, dir_name)
+            if cached is not None and cached[0] == dir_stat.st_mtime_ns:
+                return cached[1]
+
+        entries = self._scan_dir(dir_path)
+
+        if time.time() - dir_stat.st_mtime >= dir_cache_min_age:
+            dir_cache.put_dir(self.root_dir, dir_name, dir_stat.st_mtime_ns, entries)
+
+        return entries
+
+    def read_file(self, file_name: str, offset: int = 0, size: int = -1) -> bytes:
         """读文件
 
         Args:
             file_name: 读取的文件基于根目录的文件路径
+            offset: 开始读取的位置（可选），默认从头读取
+            size: 最多读取的字节数（可选），小于 0 时读到文件末尾
 
         Returns:
             读取的内容
@@ -74,10 +306,62 @@ class FileManager(object):
 
         logger.debug(f'read \'{path}\'')
         with open(path, 'rb') as file:
-            data = file.read()
+            if offset:
+                file.seek(offset)
+            data = file.read(size)
 
         return data
 
+    def hash_file(self, file_name: str) -> str:
+        """计算文件 MD5
+
+        使用当前线程复用的缓冲区分块读取文件并计算 MD5 ，不会把整个文件读入内存
+
+        Args:
+            file_name: 文件基于根目录的文件路径
+
+        Returns:
+            小写十六进制的 MD5
+
+        """
+
+        return self.checksum_file(file_name)[0]
+
+    def checksum_file(self, file_name: str, with_crc64: bool = False) -> Tuple[str, Optional[int]]:
+        """计算文件 MD5 和 CRC64
+
+        使用当前线程复用的缓冲区分块读取文件，读一遍文件同时计算 MD5 和 CRC64 ，不会把整个文件读入内存
+
+        Args:
+            file_name: 文件基于根目录的文件路径
+            with_crc64: 是否计算 CRC64
+
+        Returns:
+            (小写十六进制的 MD5, CRC64) ，不计算 CRC64 时为 None
+
+        """
+        path = os.path.join(self.root_dir, file_name)
+
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = memoryview(bytearray(self.buffer_size))
+
+        file_md5 = md5()
+        file_crc64 = 0 if with_crc64 else None
+
+        logger.debug(f'hash \'{path}\'')
+        with open(path, 'rb', buffering=0) as file:
+            while True:
+                size = file.readinto(buffer)
+                if not size:
+                    break
+                # 数据较大时 hashlib 会释放 GIL ，其它线程的读写和网络传输不会被阻塞
+                file_md5.update(buffer[:size])
+                if file_crc64 is not None:
+                    file_crc64 = crc64(buffer[:size], file_crc64)
+
+        return file_md5.hexdigest(), file_crc64
+
     def write_file(self, file_name: str, data: bytes) -> None:
         """写文件
 
@@ -88,17 +372,205 @@ class FileManager(object):
         """
         path = os.path.join(self.root_dir, file_name)
 
-        if not os.path.isdir(os.path.dirname(path)):
-            try:
-                os.makedirs(os.path.dirname(path))
-            except FileExistsError as err:
-                logger.debug(f'正在创建的文件夹已存在： {err}')
-                pass
+        self._make_parent_dir(path)
+        self._unlink_if_hardlinked(path)
 
         logger.debug(f'write \'{path}\'')
-        with open(path, 'wb') as file:
+        try:
+            file = open(path, 'wb')
+        except FileNotFoundError:
+            # 记录为已存在的文件夹被删除了（比如被其它分片清理），重新创建
+            self._make_parent_dir(path, refresh=True)
+            file = open(path, 'wb')
+
+        with file:
             file.write(data)
 
+    def write_stream(
+            self,
+            file_name: str,
+            stream: BinaryIO,
+            verify: Optional[Callable[[], None]] = None
+    ) -> int:
+        """从流写文件
+
+        分块读取流并写入临时文件，全部写完后再替换目标文件，读取中途出错不会留下不完整的文件
+
+        Args:
+            file_name: 写入的文件基于根目录的文件路径
+            stream: 数据流
+            verify: 校验方法（可选）。在流读取完成后、替换目标文件前调用，抛出异常则放弃写入
+
+        Returns:
+            写入的字节数
+
+        """
+        path = os.path.join(self.root_dir, file_name)
+        temp_path = f'{path}{temp_suffix}'
+
+        self._make_parent_dir(path)
+
+        logger.debug(f'write \'{path}\'')
+        try:
+            try:
+                file = open(temp_path, 'wb')
+            except FileNotFoundError:
+                # 记录为已存在的文件夹被删除了（比如被其它程序清理），重新创建
+                self._make_parent_dir(path, refresh=True)
+                file = open(temp_path, 'wb')
+
+            with file:
+                shutil.copyfileobj(stream, file, self.buffer_size)
+                size = file.tell()
+            if verify is not None:
+                verify()
+            # 替换后原路径指向新文件，不会修改硬链接到同一份数据的其它文件
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            # 刚创建的文件夹可能是空的（比如 OSS 上表示文件夹的对象），稍后清理
+            with self._lock:
+                self._touched_dirs.add(os.path.dirname(path))
+            raise
+
+        return size
+
+    def get_file_info(self, file_name: str) -> FileInfo:
+        """获取文件信息
+
+        Args:
+            file_name: 文件基于根目录的文件路径
+
+        Returns:
+            文件信息
+
+        """
+        stat = os.stat(os.path.join(self.root_dir, file_name))
+
+        return FileInfo(file_name, stat.st_size, stat.st_mtime)
+
+    def set_mtime(self, file_name: str, mtime: float) -> None:
+        """设置文件的修改时间
+
+        Args:
+            file_name: 文件基于根目录的文件路径
+            mtime: 修改时间（ Unix 时间戳）
+
+        """
+        path = os.path.join(self.root_dir, file_name)
+
+        logger.debug(f'touch -m \'{path}\' ({mtime})')
+        os.utime(path, (mtime, mtime))
+
+    def clone_file(self, src_file_name: str, dst_file_name: str) -> None:
+        """复制本地文件
+
+        依次尝试硬链接（需开启 hardlink ）、 reflink （写时复制，需文件系统支持）和普通复制
+
+        Args:
+            src_file_name: 源文件基于根目录的文件路径
+            dst_file_name: 目标文件基于根目录的文件路径
+
+        """
+
+        self.import_file(os.path.join(self.root_dir, src_file_name), dst_file_name)
+
+    def import_file(self, src_path: str, dst_file_name: str) -> None:
+        """把根目录外的文件复制到根目录中，复制方式同 clone_file
+
+        Args:
+            src_path: 源文件路径
+            dst_file_name: 目标文件基于根目录的文件路径
+
+        """
+        dst_path = os.path.join(self.root_dir, dst_file_name)
+
+        self._make_parent_dir(dst_path)
+        self._unlink_if_hardlinked(dst_path)
+
+        try:
+            copy_file(src_path, dst_path, self.hardlink, self.buffer_size)
+        except FileNotFoundError:
+            if not os.path.exists(src_path):
+                raise
+            # 同 write_file ，目标文件夹被删除后重新创建
+            self._make_parent_dir(dst_path, refresh=True)
+            copy_file(src_path, dst_path, self.hardlink, self.buffer_size)
+
+    def _make_parent_dir(self, path: str, refresh: bool = False) -> None:
+        """创建文件所在的文件夹（如果不存在）
+
+        已确认存在的文件夹会被记录下来，之后不再检查
+
+        Args:
+            path: 文件路径
+            refresh: 是否忽略记录重新检查
+
+        """
+
+        dir_path = os.path.dirname(path)
+        if not refresh and dir_path in self._known_dirs:
+            return
+
+        # 多个线程同时创建同一个文件夹时不会报错
+        os.makedirs(dir_path, exist_ok=True)
+
+        with self._lock:
+            self._known_dirs.add(dir_path)
+
+    def make_dirs(self, file_names: Iterable[str]) -> int:
+        """预先创建一批文件所在的文件夹
+
+        在写文件前创建需要的文件夹，之后写文件时不再有文件夹相关的系统调用。已创建过的文件夹不再检查，可以在多个线程中调用
+
+        Args:
+            file_names: 文件基于根目录的文件路径
+
+        Returns:
+            检查（并在需要时创建）的文件夹数
+
+        """
+
+        dir_paths = {os.path.dirname(os.path.join(self.root_dir, name)) for name in file_names}
+
+        with self._lock:
+            dir_paths -= self._known_dirs
+
+        count = 0
+        for dir_path in sorted(dir_paths):
+            try:
+                os.makedirs(dir_path, exist_ok=True)
+            except OSError as err:
+                # 比如同名文件还没有被删除，写文件时会再尝试创建
+                logger.debug(f'创建文件夹失败： {err}')
+                continue
+
+            count += 1
+            with self._lock:
+                self._known_dirs.add(dir_path)
+
+        if count:
+            logger.debug(f'已检查 {count} 个文件夹')
+        return count
+
+    @staticmethod
+    def _unlink_if_hardlinked(path: str) -> None:
+        """如果文件有多个硬链接，先删除该路径
+
+        避免覆盖写入时同时修改了链接到同一份数据的其它文件
+
+        Args:
+            path: 文件路径
+
+        """
+
+        try:
+            if os.stat(path).st_nlink > 1:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
     def del_file(self, file_name: str) -> None:
         """删除文件
 
@@ -112,19 +584,85 @@ class FileManager(object):
             logger.debug(f'rm \'{path}\'')
             os.remove(path)
 
-    def clear_empty_folder(self) -> None:
+            with self._lock:
+                self._touched_dirs.add(os.path.dirname(path))
+
+    def clear_empty_folder(self, full: bool = False) -> None:
         """清理空文件夹
 
+        默认只从删除过文件的文件夹开始向上逐级检查，开销与删除的文件数成正比，而与目录大小无关
+
         Notes:
             - 只要一个文件夹中的所有子文件夹都不含文件，则该文件夹为空文件夹
+            - 只检查删除过文件的文件夹时，原本就是空的文件夹不会被清理，需要定期完整清理
+
+        Args:
+            full: 是否遍历整个根目录完整清理
 
         """
 
-        for path in os.walk(self.root_dir, False):
+        with self._lock:
+            touched_dirs, self._touched_dirs = self._touched_dirs, set()
 
-            if path[0] == self.root_dir:
-                continue
+            # 清理后部分文件夹不再存在
+            self._known_dirs.clear()
+
+        if full:
+            for path in os.walk(self.root_dir, False):
+
+                if path[0] == self.root_dir:
+                    continue
+
+                if not path[1] and not path[2]:
+                    logger.debug(f'rmdir \'{path[0]}\'')
+                    os.rmdir(path[0])
+
+            return
+
+        # 从深到浅检查，子文件夹被删除后再检查上级文件夹，只检查根目录之内（不含根目录）的文件夹
+        root = self.root_dir
+        checked = set()
+        for dir_path in sorted(touched_dirs, key=lambda p: p.count(os.sep), reverse=True):
+            while (
+                    os.path.commonpath([dir_path, root]) == root
+                    and dir_path != root
+                    and dir_path not in checked
+            ):
+                checked.add(dir_path)
+                if not self._remove_if_empty(dir_path):
+                    break
+                dir_path = os.path.dirname(dir_path)
+
+    def _remove_if_empty(self, dir_path: str) -> bool:
+        """删除空文件夹，文件夹中只有空的子文件夹时连同子文件夹一起删除
+
+        Args:
+            dir_path: 文件夹路径
+
+        Returns:
+            文件夹是否已被删除（或本来就不存在）
+
+        """
 
-            if not path[1] and not path[2]:
-                logger.debug(f'rmdir \'{path[0]}\'')
-                os.rmdir(path[0])
+        try:
+            os.rmdir(dir_path)
+            logger.debug(f'rmdir \'{dir_path}\'')
+            return True
+        except FileNotFoundError:
+            return True
+        except OSError:
+            pass
+
+        # 不是空文件夹，检查其中是否只有空的子文件夹，遇到文件即停止
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False) or not self._remove_if_empty(entry.path):
+                        return False
+            os.rmdir(dir_path)
+        except OSError as err:
+            logger.debug(f'无法删除文件夹： {err}')
+            return False
+
+        logger.debug(f'rmdir \'{dir_path}\'')
+        return True
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+"""文件校验索引
+
+该模块定义了在多次同步之间保存本地文件校验和文件夹内容的类
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from typing import List, NamedTuple, Optional, Tuple
+
+from .file_manager import DirEntry, FileInfo
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+class HashRecord(NamedTuple):
+    """索引中记录的文件校验
+    """
+
+    # 文件内容的 MD5 （小写十六进制），没有计算时为 None （比如追加上传后只知道 CRC64 ）
+    md5: Optional[str]
+
+    # 文件内容的 CRC64 ，没有计算时为 None
+    crc64: Optional[int]
+
+
+class HashIndex(object):
+    def __init__(self, path: str, commit_interval: int = 1000) -> None:
+        """初始化
+
+        以 (本地根目录, 文件路径) 为键，记录文件的大小、修改时间和校验。
+        文件的大小和修改时间与记录一致时直接使用记录的校验，不需要重新读取文件
+        也用于记录文件夹的修改时间和内容，见 FileManager.list_file
+
+        Notes:
+            - 与 rsync 不使用 --checksum 时类似，大小和修改时间都没有变化的修改不会被发现
+            - 索引文件不要放在同步的本地目录中
+
+        Args:
+            path: 索引文件（ SQLite 数据库）路径
+            commit_interval: 每写入多少条记录提交一次
+
+        """
+
+        self.path: str = path
+        self.commit_interval: int = commit_interval
+
+        # 所有线程共用一个连接，由锁保证串行访问
+        self._lock: threading.Lock = threading.Lock()
+        self._conn: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        self._pending: int = 0
+
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+
+            # 旧版本的索引要求 md5 非空，索引只是缓存，结构不一致时直接重建
+            columns = {row[1]: row for row in self._conn.execute('PRAGMA table_info(files)')}
+            if 'md5' in columns and columns['md5'][3]:
+                logger.info(f'校验索引 \'{path}\' 的结构已过时，将重建索引')
+                self._conn.execute('DROP TABLE files')
+
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'root TEXT NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL, '
+                'md5 TEXT, crc64 INTEGER, PRIMARY KEY (root, name))'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS dirs ('
+                'root TEXT NOT NULL, name TEXT NOT NULL, mtime_ns INTEGER NOT NULL, entries TEXT NOT NULL, '
+                'PRIMARY KEY (root, name))'
+            )
+            self._conn.commit()
+
+    def get(self, root: str, file: FileInfo) -> Optional[HashRecord]:
+        """查询文件的校验
+
+        Args:
+            root: 本地根目录
+            file: 文件信息
+
+        Returns:
+            文件的大小和修改时间与记录一致时返回记录的校验，否则返回 None
+
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime, md5, crc64 FROM files WHERE root = ? AND name = ?',
+                (root, file.name)
+            ).fetchone()
+
+        if row is None or row[0] != file.size or row[1] != file.mtime:
+            return None
+
+        return self._make_record(row[2], row[3])
+
+    def get_previous(self, root: str, name: str) -> Optional[Tuple[FileInfo, HashRecord]]:
+        """查询文件上次记录时的信息和校验，不要求与文件当前的大小和修改时间一致
+
+        Args:
+            root: 本地根目录
+            name: 基于根目录的文件路径
+
+        Returns:
+            (记录时的文件信息, 记录的校验) ，没有记录时返回 None
+
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime, md5, crc64 FROM files WHERE root = ? AND name = ?',
+                (root, name)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return FileInfo(name, row[0], row[1]), self._make_record(row[2], row[3])
+
+    @staticmethod
+    def _make_record(md5: Optional[str], crc64: Optional[int]) -> HashRecord:
+        # SQLite 的整数是有符号 64 位的
+        return HashRecord(md5, crc64 & 0xFFFFFFFFFFFFFFFF if crc64 is not None else None)
+
+    def _count_write(self) -> None:
+        # 调用时需持有 self._lock ，每 commit_interval 次写入（包括删除）提交一次
+        self._pending += 1
+        if self._pending >= self.commit_interval:
+            self._conn.commit()
+            self._pending = 0
+
+    def put(self, root: str, file: FileInfo, md5: Optional[str], crc64: Optional[int] = None) -> None:
+        """记录文件的校验
+
+        Args:
+            root: 本地根目录
+            file: 计算校验时的文件信息
+            md5: 文件内容的 MD5 ，没有计算时为 None
+            crc64: 文件内容的 CRC64 （可选）
+
+        """
+
+        if crc64 is not None and crc64 >= 1 << 63:
+            crc64 -= 1 << 64
+
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO files (root, name, size, mtime, md5, crc64) VALUES (?, ?, ?, ?, ?, ?)',
+                (root, file.name, file.size, file.mtime, md5, crc64)
+            )
+            self._count_write()
+
+    def remove(self, root: str, name: str) -> None:
+        """删除文件的记录
+
+        Args:
+            root: 本地根目录
+            name: 基于根目录的文件路径
+
+        """
+
+        with self._lock:
+            self._conn.execute('DELETE FROM files WHERE root = ? AND name = ?', (root, name))
+            self._count_write()
+
+    def get_dir(self, root: str, name: str) -> Optional[Tuple[int, List[DirEntry]]]:
+        """查询文件夹的内容
+
+        Args:
+            root: 本地根目录
+            name: 文件夹基于根目录的路径，根目录为 ''
+
+        Returns:
+            (记录时文件夹的修改时间（纳秒）, 文件夹中的文件和子文件夹) ，没有记录时返回 None
+
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT mtime_ns, entries FROM dirs WHERE root = ? AND name = ?',
+                (root, name)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return row[0], [DirEntry(*entry) for entry in json.loads(row[1])]
+
+    def put_dir(self, root: str, name: str, mtime_ns: int, entries: List[DirEntry]) -> None:
+        """记录文件夹的内容
+
+        Args:
+            root: 本地根目录
+            name: 文件夹基于根目录的路径，根目录为 ''
+            mtime_ns: 读取内容时文件夹的修改时间（纳秒）
+            entries: 文件夹中的文件和子文件夹
+
+        """
+
+        data = json.dumps(entries, ensure_ascii=False, separators=(',', ':'))
+
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO dirs (root, name, mtime_ns, entries) VALUES (?, ?, ?, ?)',
+                (root, name, mtime_ns, data)
+            )
+            self._count_write()
+
+    def clear_dirs(self, root: str) -> None:
+        """删除根目录下所有文件夹的记录
+
+        Args:
+            root: 本地根目录
+
+        """
+
+        with self._lock:
+            self._conn.execute('DELETE FROM dirs WHERE root = ?', (root, ))
+            self._count_write()
+
+    def close(self) -> None:
+        """提交未提交的记录并关闭索引
+        """
+
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+        logger.debug(f'已保存校验索引 \'{self.path}\'')
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""内存预算
+
+该模块定义了限制所有线程同时占用的数据量的类
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+class MemoryBudget(object):
+    def __init__(self, capacity: int = 0) -> None:
+        """初始化
+
+        所有线程共享同一个预算，同时占用的字节数不会超过 capacity 。
+        小文件各自只占用很少的预算，可以满并发执行；大文件会占用较多的预算，超出时需要等待其它任务释放
+
+        Args:
+            capacity: 预算（字节），小于等于 0 表示不限制
+
+        """
+
+        self.capacity: int = max(capacity, 0)
+        self.used: int = 0
+        self._condition: threading.Condition = threading.Condition()
+
+        # 协程占用预算时在该线程中等待，见 acquire_async 。第一次需要等待时才创建，由 close 关闭
+        self._waiter: Optional[ThreadPoolExecutor] = None
+
+    def acquire(self, size: int) -> int:
+        """占用预算
+
+        预算不足时阻塞等待。超过总预算的请求按总预算占用，即只能在没有其它占用时执行
+
+        Args:
+            size: 需要占用的字节数
+
+        Returns:
+            实际占用的字节数，释放时需要传入该值
+
+        """
+
+        if self.capacity <= 0:
+            return 0
+
+        size = min(max(size, 0), self.capacity)
+
+        with self._condition:
+            if self.used + size > self.capacity:
+                logger.debug(f'内存预算不足（已占用 {self.used} / {self.capacity} 字节），等待释放 {size} 字节')
+            self._condition.wait_for(lambda: self.used + size <= self.capacity)
+            self.used += size
+
+        return size
+
+    async def acquire_async(self, size: int) -> int:
+        """在协程中占用预算
+
+        预算充足时直接占用；不足时在单独的线程中排队等待，既不阻塞事件循环，
+        也不会占满执行其它任务（包括释放预算的任务）的线程池
+
+        Args:
+            size: 需要占用的字节数
+
+        Returns:
+            实际占用的字节数，释放时需要传入该值
+
+        """
+
+        if self.capacity <= 0:
+            return 0
+
+        size = min(max(size, 0), self.capacity)
+
+        with self._condition:
+            if self.used + size <= self.capacity:
+                self.used += size
+                return size
+
+            if self._waiter is None:
+                self._waiter = ThreadPoolExecutor(max_workers=1, thread_name_prefix='memory-budget')
+            waiter = self._waiter
+
+        # 只在 asyncio 传输引擎中使用，不在模块中导入 asyncio
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(waiter, self.acquire, size)
+
+    def release(self, size: int) -> None:
+        """释放预算
+
+        Args:
+            size: acquire 返回的字节数
+
+        """
+
+        if not size:
+            return
+
+        with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """关闭 acquire_async 使用的等待线程（如果有）
+
+        关闭后仍然可以使用，再次需要等待时会重新创建
+        """
+
+        with self._condition:
+            waiter, self._waiter = self._waiter, None
+
+        if waiter is not None:
+            waiter.shutdown(wait=True)
@@ -5,193 +5,2243 @@
 该模块定义了与文件同步相关的类和方法
 """
 
+import gzip
+import io
 import logging
+import os
+import posixpath
+import queue
 import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import md5
-from typing import Callable, List, Optional, Tuple
+from typing import (
+    TYPE_CHECKING, Awaitable, BinaryIO, Callable, Container, Dict, List, NamedTuple, Optional, Tuple, Union
+)
 
-from oss import OssBucket
-from .file_manager import FileManager
+from oss import ObjectInfo, OssBucket
+from .bandwidth_limiter import ThrottledReader, TokenBucket, throttle_async
+from .checksum import ChecksumError, ChecksumReader
+from .crc64 import crc64, crc64_combine
+from .download_cache import DownloadCache
+from .file_manager import FileInfo, FileManager
+from .hash_index import HashIndex
+from .memory_budget import MemoryBudget
+from .pack import (
+    PackIndex, PackMember, build_pack, get_dir_prefix, index_name, merge_ranges, pack_dir_name, parse_pack_key,
+    split_packs
+)
+from .progress import ProgressReporter
+from .path_filter import FilterRule, PathFilter
+from .sync_plan import PlanEntry, SyncPlan
+
+if TYPE_CHECKING:
+    # 异步客户端依赖可选的 aiohttp ，只在类型检查时导入
+    from oss.aliyun_oss_async import AsyncAliyunOssBucket
 
 
 logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
 
 
+class SyncItem(NamedTuple):
+    """同步列表中的一项
+    """
+
+    # 文件名或对象 Key
+    name: str
+
+    # 本地文件信息，文件不在本地则为 None
+    file: Optional[FileInfo]
+
+    # OSS 对象信息，对象不在 OSS 则为 None
+    obj: Optional[ObjectInfo]
+
+
+class BucketSyncItem(NamedTuple):
+    """桶间同步列表中的一项
+    """
+
+    # 对象 Key （不含前缀）
+    name: str
+
+    # 源 Bucket 中的对象信息，对象不在源 Bucket 则为 None
+    src: Optional[ObjectInfo]
+
+    # 目标 Bucket 中的对象信息，对象不在目标 Bucket 则为 None
+    dst: Optional[ObjectInfo]
+
+
 # 定义一些常用类型别名
-SyncList = List[Tuple[str, bool, Optional[str]]]
+SyncList = List[SyncItem]
+BucketSyncList = List[BucketSyncItem]
+
+
+# 判断文件是否被修改的方式：
+# - checksum: 比较大小和 MD5
+# - size-only: 只比较大小
+# - size+mtime: 比较大小和修改时间，修改时间上传时记录在对象元数据中，下载后设置到本地文件
+compare_modes: List[str] = ['checksum', 'size-only', 'size+mtime']
+
+# 比较修改时间时允许的误差（秒），兼容修改时间精度较低的文件系统
+mtime_tolerance: float = 1.0
+
+# 桶间同步时分片上传的分片大小（字节），更大的对象使用分片上传
+part_size: int = 8 * 1024 * 1024
+
+# 比较 MD5 时不超过该大小（字节）的文件直接读入内存，内容不一致时上传读入的内容；
+# 更大的文件流式计算 MD5 ，内容一致（通常的情况）时不占用内存
+preload_size: int = 1024 * 1024
+
+
+class SyncTask(NamedTuple):
+    """同步任务
+
+    由检查阶段产生，交给传输阶段执行
+    """
+
+    # 操作： 'put' （上传）、 'append' （追加上传）、 'copy' （服务端复制）、 'pack' （更新打包对象中的文件）、
+    # 'get' （下载）、 'unpack' （从打包对象下载）、 'clone' （复制本地文件）、 'del' （删除对象）或 'rm' （删除本地文件）
+    action: str
+
+    # 文件名或对象 Key
+    name: str
+
+    # 变更类型： '+' （新增）、 'M' （修改）或 '-' （删除），用于日志
+    tag: str
+
+    # 待上传的数据
+    data: Optional[bytes] = None
+
+    # 上传时附带的用户自定义元数据
+    metadata: Optional[Dict[str, str]] = None
+
+    # 上传时设置的 Content-Encoding
+    content_encoding: Optional[str] = None
+
+    # 复制操作的源对象 Key 或本地文件名，从打包对象下载时为打包对象 Key
+    source: Optional[str] = None
+
+    # 对象的 ETag
+    etag: Optional[str] = None
+
+    # 待下载的对象信息
+    obj: Optional[ObjectInfo] = None
+
+    # 待上传的数据的 MD5 （十六进制）
+    content_md5: Optional[str] = None
+
+    # 任务占用的内存预算（字节），任务执行完后释放
+    reserved: int = 0
+
+    # 待上传的文件信息
+    file: Optional[FileInfo] = None
+
+    # 追加上传时对象已有内容的 CRC64 ，为 None 时重新创建整个对象
+    crc64: Optional[int] = None
 
 
 class OSSSynchronizer(object):
 
-    def __init__(self, local_dir: FileManager, oss_bucket: OssBucket, threads_num: int = 32) -> None:
+    def __init__(
+            self,
+            local_dir: Optional[FileManager],
+            oss_bucket: OssBucket,
+            threads_num: int = 32,
+            io_threads_num: int = 4,
+            compress: bool = False,
+            compare_mode: str = 'checksum',
+            path_filter: Optional[PathFilter] = None,
+            remote_prefix: str = '',
+            upload_limiters: Optional[List[TokenBucket]] = None,
+            download_limiters: Optional[List[TokenBucket]] = None,
+            shard_index: int = 0,
+            shard_count: int = 1,
+            memory_budget: Optional[MemoryBudget] = None,
+            verbose: bool = False,
+            progress_interval: float = 0,
+            hash_index: Optional[HashIndex] = None,
+            verify_crc64: bool = False,
+            append_patterns: Optional[List[str]] = None,
+            dest_bucket: Optional[OssBucket] = None,
+            dest_prefix: str = '',
+            dir_cache: bool = False,
+            full_scan: bool = False,
+            pack_threshold: int = 0,
+            download_cache: Optional[DownloadCache] = None,
+            async_bucket: Optional['AsyncAliyunOssBucket'] = None,
+            dry_run: bool = False
+    ) -> None:
         """初始化
 
         Args:
-            local_dir: 本地文件夹
+            local_dir: 本地文件夹，桶间同步时为 None
             oss_bucket: OSS Bucket
-            threads_num: 同步线程数
+            threads_num: 同步线程数（网络传输）
+            io_threads_num: 本地读文件和计算校验的线程数
+            compress: 上传时是否用 gzip 压缩适合压缩的内容（见 OssBucket.compressible_content_types ）
+            compare_mode: 判断文件是否被修改的方式，见 compare_modes
+            path_filter: 路径过滤器（可选）。若指定，则只同步匹配的文件和对象，被排除的文件和对象不会被删除
+            remote_prefix: 对象 Key 前缀（可选）。本地文件对应的对象 Key 为该前缀加上文件路径，
+                只有该前缀下的对象参与同步
+            upload_limiters: 上传带宽限制器列表（可选），上传的数据受其中所有限制器限制
+            download_limiters: 下载带宽限制器列表（可选），下载的数据受其中所有限制器限制
+            shard_index: 当前分片序号（可选），从 0 开始
+            shard_count: 分片总数（可选）。大于 1 时只同步哈希到当前分片的文件和对象，
+                多台机器各自处理一个分片即可并行同步同一个目录
+            memory_budget: 内存预算（可选）。读入内存等待上传的文件和下载缓冲区会占用预算，可以由多个同步器共用
+            verbose: 是否为每个文件输出一行日志，默认只输出失败的文件
+            progress_interval: 定期输出汇总进度的间隔（秒），小于等于 0 时只在结束时输出汇总
+            hash_index: 文件校验索引（可选）。若指定，则大小和修改时间没有变化的文件不再重新计算 MD5 ，
+                上传和下载时计算的校验也会记录到索引中
+            verify_crc64: 传输时是否同时计算 CRC64 并与服务端返回的 CRC64 比较
+            append_patterns: 追加上传规则列表（可选），规则的语法与排除规则相同。匹配的文件以可追加对象上传，
+                文件只是在末尾增加了内容时只上传增加的部分，需要 OSS 支持追加上传
+            dest_bucket: 桶间同步的目标 Bucket （可选），只用于 sync_from_oss_to_oss ，此时 oss_bucket 是源 Bucket
+            dest_prefix: 目标 Bucket 中的对象 Key 前缀（可选），与 remote_prefix 对应
+            dir_cache: 是否在校验索引中记录文件夹内容，修改时间没有变化的文件夹不再重新遍历，需要指定 hash_index 。
+                在原有位置修改的文件不会被发现，见 FileManager.list_file
+            full_scan: 使用 dir_cache 时，是否忽略记录完整遍历本地文件夹并重新记录
+            pack_threshold: 小文件打包的大小阈值（字节），默认为 0 （不打包）。大于 0 时，上传时小于该大小的文件
+                按文件夹打包成少量对象（见 utils.pack ），下载时按打包索引还原
+            download_cache: 下载缓存（可选），可以由多个同步器共用。下载前先查询缓存，下载后加入缓存
+            async_bucket: oss_bucket 对应的异步客户端（可选）。若指定，则使用 asyncio 传输引擎：
+                传输阶段在一个事件循环中同时进行最多 async_bucket.max_requests 个请求，
+                文件读写和不支持异步的任务在 threads_num 个线程中执行，见 sync_in_pipeline 。桶间同步时只用于列出源对象
+            dry_run: 是否试运行。试运行时照常检查，但不执行任何任务，只把任务记录到 self.plan 中（见 plan_task ）。
+                新增的本地文件只计算 MD5 （用于匹配服务端复制源），不读入内存
         """
 
-        self.local_dir: FileManager = local_dir
+        self.local_dir: Optional[FileManager] = local_dir
         self.oss_bucket: OssBucket = oss_bucket
         self.threads_num: int = threads_num
+        self.io_threads_num: int = io_threads_num
+        self.compress: bool = compress
+        self.compare_mode: str = compare_mode
+        self.path_filter: Optional[PathFilter] = path_filter
+        self.remote_prefix: str = remote_prefix
+        self.upload_limiters: List[TokenBucket] = upload_limiters or []
+        self.download_limiters: List[TokenBucket] = download_limiters or []
+        self.shard_index: int = shard_index
+        self.shard_count: int = shard_count
+        self.memory_budget: MemoryBudget = memory_budget or MemoryBudget()
+        self.verbose: bool = verbose
+        self.progress_interval: float = progress_interval
+        self.hash_index: Optional[HashIndex] = hash_index
+        self.verify_crc64: bool = verify_crc64
+        self.append_rules: List[FilterRule] = [PathFilter.parse_rule(p) for p in append_patterns or []]
+        self.dest_bucket: Optional[OssBucket] = dest_bucket
+        self.dest_prefix: str = dest_prefix
+        self.dir_cache: bool = dir_cache
+        self.full_scan: bool = full_scan
+        self.pack_threshold: int = pack_threshold
+        self.download_cache: Optional[DownloadCache] = download_cache
+        self.async_bucket: Optional['AsyncAliyunOssBucket'] = async_bucket
+        self.dry_run: bool = dry_run
 
-        assert self.local_dir, 'local_dir 参数不能为空'
+        # 打包对象的状态，每次同步时由 load_packs 重新加载
+        # - pack_indexes: 以文件夹前缀为键的打包索引
+        # - pack_members: 以文件路径为键的打包文件，只包含匹配过滤规则的
+        # - pack_objects: 以路径（不含 remote_prefix ）为键的打包对象和索引对象
+        # - stale_objects: 与打包文件同名的普通对象（比如文件变小之前上传的），需要删除
+        self.pack_indexes: Dict[str, PackIndex] = {}
+        self.pack_members: Dict[str, PackMember] = {}
+        self.pack_objects: Dict[str, ObjectInfo] = {}
+        self.stale_objects: Dict[str, ObjectInfo] = {}
+
+        # 上传时以文件夹前缀为键，记录需要更新的打包文件（值为 None 表示从索引中删除）和所有本地小文件
+        self.pack_changes: Dict[str, Dict[str, Optional[FileInfo]]] = {}
+        self.pack_files: Dict[str, Dict[str, FileInfo]] = {}
+
+        # 下载时以打包对象 Key 为键，记录需要从中下载的打包文件
+        self.pack_downloads: Dict[str, Dict[str, PackMember]] = {}
+
+        # 每个文件夹（上传）或打包对象（下载）只处理一次，结果以文件路径为键缓存，供同一组的其它任务使用
+        self._pack_results: Dict[str, Dict[str, bool]] = {}
+        self._pack_locks: Dict[str, threading.Lock] = {}
+        self._pack_locks_lock: threading.Lock = threading.Lock()
+
+        # 当前同步的进度，同步开始时创建
+        self.progress: Optional[ProgressReporter] = None
+
+        # 试运行得到的同步计划，同步开始时创建
+        self.plan: Optional[SyncPlan] = None
+
+        assert self.local_dir or self.dest_bucket, 'local_dir 参数不能为空'
         assert self.oss_bucket, 'oss_bucket 参数不能为空'
         assert self.threads_num > 0, '同步线程数至少为 1'
+        assert self.io_threads_num > 0, '读文件线程数至少为 1'
+        assert self.compare_mode in compare_modes, f'比较方式只能是 {compare_modes} 之一'
+        assert not self.compress or self.compare_mode == 'checksum', '压缩上传只能与 checksum 比较方式一起使用'
+        assert not self.append_rules or self.oss_bucket.supports_append, '当前 OSS 不支持追加上传'
+        assert not self.append_rules or self.compare_mode == 'checksum', '追加上传只能与 checksum 比较方式一起使用'
+        assert not self.dir_cache or self.hash_index is not None, '记录文件夹内容需要指定 hash_index'
+        assert not self.pack_threshold or self.local_dir, '桶间同步不支持打包小文件'
+        assert not self.pack_threshold or shard_count == 1, '打包小文件不能与分片同步一起使用'
+        assert not self.async_bucket or self.async_bucket.bucket is self.oss_bucket, '异步客户端必须与 oss_bucket 对应'
+        assert self.shard_count > 0, '分片总数至少为 1'
+        assert 0 <= self.shard_index < self.shard_count, f'分片序号必须在 [0, {self.shard_count}) 之间'
 
     def sync_checking(self) -> SyncList:
         """检查同步情况
 
         Returns:
-            (文件名或对象 Key, 是否在本地, 对象 ETag) 三元组的列表
+            (文件名或对象 Key, 本地文件信息, 对象信息) 的列表
 
             返回格式如下
 
             [
-                ('file_or_obj1_name', True, 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa'),
-                ('file_or_obj2_name', False, 'bbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb'),
-                ('file_or_obj3_name', True, None),
+                SyncItem('file_or_obj1_name', FileInfo(...), ObjectInfo(...)),
+                SyncItem('file_or_obj2_name', None, ObjectInfo(...)),
+                SyncItem('file_or_obj3_name', FileInfo(...), None),
                 # ...
             ]
 
         """
 
-        files_list = self.local_dir.list_file()
-        objs_list = self.oss_bucket.list_objects()
-
-        # 将 (obj_key, obj_etag) 二元组列表转为键值映射字典
-        objs_map = {}
-        for obj in objs_list:
-            objs_map[obj[0]] = obj[1]
+        files_list = [
+            file
+            for file
+            in self.local_dir.list_file(
+                self.path_filter,
+                self.hash_index if self.dir_cache else None,
+                self.full_scan
+            )
+            if self.in_shard(file.name)
+        ]
+        objs_map = self.list_objects_map(self.oss_bucket, self.remote_prefix)
+        self.load_packs(objs_map)
 
         # 同步列表
         sync_list = []
 
         # 从本地文件列表更新同步列表
-        for file_name in files_list:
-            sync_list.append((file_name, True, objs_map.get(file_name)))
-            if file_name in objs_map:
-                objs_map.pop(file_name)
+        for file in files_list:
+            sync_list.append(SyncItem(file.name, file, objs_map.pop(file.name, None)))
 
         # 从 OSS 对象字典更新同步列表
-        for obj_key, obj_etag in objs_map.items():
-            sync_list.append((obj_key, False, obj_etag))
+        for obj_key, obj in objs_map.items():
+            sync_list.append(SyncItem(obj_key, None, obj))
 
-        logger.debug(f'Sync List:')
-        for i in sync_list:
-            logger.debug(f'  - {i}')
+        # 同步列表很长时逐行格式化的开销不可忽略，只在开启调试日志时输出
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Sync List:')
+            for i in sync_list:
+                logger.debug(f'  - {i}')
 
         return sync_list
 
-    def sync_in_multi_threads(self, sync_func: Callable[[SyncList], None]) -> None:
-        """使用多线程同步
+    def list_objects_map(self, bucket: OssBucket, remote_prefix: str) -> Dict[str, ObjectInfo]:
+        """列出参与同步的对象
+
+        只列出 remote_prefix 下的对象，有包含规则时进一步缩小到可能匹配的前缀
 
         Args:
-            sync_func: 同步方法
+            bucket: OSS Bucket
+            remote_prefix: 对象 Key 前缀
+
+        Returns:
+            以文件名（去掉 remote_prefix 的 Key ）为键的对象信息字典，只包含匹配过滤规则且属于当前分片的对象，
+            以及打包小文件时的打包对象和索引对象
+
+        Raises:
+            RuntimeError: 列出对象失败
 
         """
 
-        sync_lists = self.sync_checking()
-        threads_num = len(sync_lists) if len(sync_lists) < self.threads_num else self.threads_num
-        target_num = len(sync_lists) // threads_num + (1 if len(sync_lists) % threads_num != 0 else 0)
+        prefixes = self.path_filter.list_prefixes() if self.path_filter else ['']
 
-        # 生成同步线程
-        threads = []
-        for i in range(threads_num):
-            threads.append(threading.Thread(
-                target=sync_func,
-                args=(sync_lists[(target_num + 1) * i:(target_num + 1) * (i + 1)], )
-            ))
+        # 前缀不是文件夹时，所在文件夹的打包对象不在该前缀下，需要另外列出
+        if self.pack_threshold:
+            prefixes = list(dict.fromkeys(prefixes + [
+                f'{get_dir_prefix(prefix)}{pack_dir_name}/'
+                for prefix
+                in prefixes
+                if prefix and not prefix.endswith('/')
+            ]))
 
-        # 启动所有同步线程
-        for t in threads:
-            t.start()
+        prefixes = [f'{remote_prefix}{prefix}' for prefix in prefixes]
 
-        # 等待所有同步线程退出
-        for t in threads:
-            t.join()
+        # 使用 asyncio 传输引擎时同时列出所有前缀
+        if self.async_bucket is not None and bucket is self.oss_bucket:
+            # asyncio 只在 asyncio 传输引擎中导入，不增加线程池引擎的启动时间
+            import asyncio
+            results = asyncio.run(self.async_bucket.list_objects_many(prefixes))
+        else:
+            results = map(bucket.list_objects, prefixes)
+
+        objs_list = []
+        for prefix, objs in zip(prefixes, results):
+            if objs is None:
+                raise RuntimeError(f'列出 OSS 对象失败（ prefix = \'{prefix}\' ）')
+            objs_list.extend(objs)
+
+        objs_map = {}
+        for obj in objs_list:
+            name = obj.key[len(remote_prefix):]
+
+            # 打包对象和索引对象不参与过滤，由 load_packs 处理
+            if self.pack_threshold and parse_pack_key(name) is not None:
+                objs_map[name] = obj
+            elif (self.path_filter is None or self.path_filter.is_included(name)) and self.in_shard(name):
+                objs_map[name] = obj
+
+        return objs_map
+
+    def load_packs(self, objs_map: Dict[str, ObjectInfo]) -> None:
+        """加载打包索引，把打包文件合并到对象字典中
+
+        从对象字典中取出打包对象和索引对象，下载所有索引。
+        匹配过滤规则的打包文件以虚拟的对象信息（ ETag 为内容的 MD5 ）加入对象字典，与普通对象一样参与比较。
+        同名的普通对象以打包文件为准，记录到 stale_objects 中
+
+        Args:
+            objs_map: list_objects_map 返回的对象字典，会被修改
+
+        Raises:
+            RuntimeError: 下载索引失败
+            ValueError: 索引格式不正确
 
-    def sync_from_local_to_oss(self) -> None:
-        """从本地同步到OSS
         """
 
-        # 进行同步
-        def sync(sync_list: SyncList):
+        self.pack_indexes, self.pack_members, self.pack_objects, self.stale_objects = {}, {}, {}, {}
+        self.pack_changes, self.pack_files, self.pack_downloads = {}, {}, {}
+        self._pack_results, self._pack_locks = {}, {}
 
-            for thing in sync_list:
+        if not self.pack_threshold:
+            return
 
-                # 文件在本地
-                if thing[1]:
+        for name in [name for name in objs_map if parse_pack_key(name) is not None]:
+            self.pack_objects[name] = objs_map.pop(name)
 
-                    # 本地和 OSS 各有一份
-                    if thing[2] is not None:
-                        data = self.local_dir.read_file(thing[0])
-                        file_md5 = md5(data).hexdigest().lower()
+        def load(name: str) -> PackIndex:
+            data = self.oss_bucket.get_object(self.get_obj_key(name))
+            if data is None:
+                raise RuntimeError(f'下载打包索引 \'{name}\' 失败')
+            return PackIndex.loads(parse_pack_key(name), data)
 
-                        # 内容不一致，上传本地文件到 OSS
-                        if file_md5 != thing[2].lower():
-                            ret = self.oss_bucket.put_object(thing[0], data)
-                            logger.info(f'{"OK  " if ret else "Fail"} [M] {thing[0]}')
+        # 索引不完整时上传会丢失其它打包文件，任何一个索引下载失败都中止同步
+        index_names = [name for name in self.pack_objects if posixpath.basename(name) == index_name]
+        with ThreadPoolExecutor(max_workers=self.threads_num) as executor:
+            for index in executor.map(load, index_names):
+                self.pack_indexes[index.dir_prefix] = index
 
-                        # 内容一致，跳过
-                        else:
-                            logger.info(f'Skip [S] {thing[0]}')
+        for index in self.pack_indexes.values():
+            for name, member in index.members.items():
+                if self.path_filter is not None and not self.path_filter.is_included(name):
+                    continue
 
-                    # 文件不在 OSS ，上传本地文件到 OSS
-                    else:
-                        data = self.local_dir.read_file(thing[0])
-                        ret = self.oss_bucket.put_object(thing[0], data)
-                        logger.info(f'{"OK  " if ret else "Fail"} [+] {thing[0]}')
+                self.pack_members[name] = member
+                if name in objs_map:
+                    self.stale_objects[name] = objs_map[name]
+                objs_map[name] = ObjectInfo(self.get_obj_key(name), member.md5, member.size, member.mtime)
 
-                # 文件不在本地，删除 OSS 上的对应对象
-                else:
-                    ret = self.oss_bucket.del_object(thing[0])
-                    logger.info(f'{"OK  " if ret else "Fail"} [-] {thing[0]}')
+        if self.pack_indexes:
+            logger.debug(f'已加载 {len(self.pack_indexes)} 个打包索引，共 {len(self.pack_members)} 个文件')
 
-        self.sync_in_multi_threads(sync)
+    def get_pack_lock(self, key: str) -> threading.Lock:
+        """获取文件夹或打包对象对应的锁
+
+        Args:
+            key: 文件夹前缀或打包对象 Key
+
+        Returns:
+            锁
 
-    def sync_from_oss_to_local(self) -> None:
-        """从 OSS 同步到本地
         """
 
-        # 进行同步
-        def sync(sync_list: SyncList):
+        with self._pack_locks_lock:
+            return self._pack_locks.setdefault(key, threading.Lock())
+
+    def in_shard(self, name: str) -> bool:
+        """判断文件或对象是否属于当前分片
 
-            for thing in sync_list:
+        使用文件路径（不含 remote_prefix ）的 CRC32 分片，同一个文件在不同机器上总是属于同一个分片
 
-                # 文件在本地
-                if thing[1]:
+        Args:
+            name: 基于根目录的文件路径
 
-                    # 本地和OSS各有一份
-                    if thing[2] is not None:
-                        data = self.local_dir.read_file(thing[0])
-                        file_md5 = md5(data).hexdigest().lower()
+        Returns:
+            是否属于当前分片
 
-                        # 内容不一致，下载 OSS 对应文件
-                        if file_md5 != thing[2].lower():
-                            ret = self.oss_bucket.get_object(thing[0])
-                            if ret:
-                                self.local_dir.write_file(thing[0], ret)
-                            logger.debug(f'{"OK  " if ret else "Fail"} [M] {thing[0]}')
+        """
 
-                        # 内容一致，跳过
-                        else:
-                            logger.info(f'Skip [S] {thing[0]}')
+        if self.shard_count == 1:
+            return True
 
-                    # 文件不在OSS，删除本地文件
-                    else:
-                        self.local_dir.del_file(thing[0])
-                        logger.info(f'{"OK  "} [-] {thing[0]}')
+        return zlib.crc32(name.encode('utf-8')) % self.shard_count == self.shard_index
 
-                # 文件不在本地，下载 OSS 上的对应对象
-                else:
-                    ret = self.oss_bucket.get_object(thing[0])
-                    if ret:
-                        self.local_dir.write_file(thing[0], ret)
-                    logger.info(f'{"OK  " if ret else "Fail"} [+] {thing[0]}')
+    def get_obj_key(self, name: str) -> str:
+        """获取文件对应的对象 Key
+
+        Args:
+            name: 基于根目录的文件路径
+
+        Returns:
+            对象 Key
+
+        """
+
+        return f'{self.remote_prefix}{name}'
+
+    def is_same_content(self, obj_key: str, file_md5: str, obj_etag: str) -> bool:
+        """判断本地文件与 OSS 对象的内容是否一致
+
+        压缩上传的对象的 ETag 是压缩后内容的 MD5 ，此时改为比较元数据中记录的原始内容 MD5 。
+        只有 ETag 不一致且对象适合压缩时才需要查询元数据
+
+        Args:
+            obj_key: 对象 Key
+            file_md5: 本地文件的 MD5
+            obj_etag: 对象的 ETag
+
+        Returns:
+            内容是否一致
+
+        """
+
+        if file_md5 == obj_etag.lower():
+            return True
+
+        if not self.oss_bucket.is_compressible(obj_key):
+            return False
+
+        metadata = self.oss_bucket.get_metadata(obj_key) or {}
+        return file_md5 == metadata.get(self.oss_bucket.content_md5_meta, '').lower()
+
+    def get_remote_mtime(
+            self,
+            obj: ObjectInfo,
+            bucket: Optional[OssBucket] = None,
+            headers: Optional[Dict[str, str]] = None
+    ) -> float:
+        """获取对象对应的文件修改时间
+
+        优先使用上传时记录在元数据中的本地文件修改时间，没有记录则使用对象的最后修改时间
+
+        Args:
+            obj: 对象信息
+            bucket: 对象所在的 Bucket （可选），默认为 oss_bucket
+            headers: 对象的响应头（可选，键均为小写）。下载时已经有响应头，从中读取元数据，不再查询对象
+
+        Returns:
+            修改时间（ Unix 时间戳）
+
+        """
+
+        bucket = bucket or self.oss_bucket
+        if headers is not None:
+            mtime = headers.get(f'{bucket.meta_prefix}{bucket.mtime_meta}')
+        else:
+            mtime = (bucket.get_metadata(obj.key) or {}).get(bucket.mtime_meta)
+
+        try:
+            return float(mtime)
+        except (TypeError, ValueError):
+            return obj.last_modified
+
+    def is_modified(self, item: SyncItem, file_md5: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+        """判断本地和 OSS 都有的文件内容是否不一致
+
+        大小不同时内容一定不同（压缩上传的对象除外），此时不读取文件；大小相同时再按 compare_mode 比较 MD5 或修改时间。
+        分片上传和追加上传的对象的 ETag 不是内容的 MD5 ，服务端支持时改为比较 CRC64
+
+        Args:
+            item: 同步列表中本地和 OSS 都有的一项
+            file_md5: 已经计算过的本地文件 MD5 （可选），需要比较 MD5 时不再读取文件
+
+        Returns:
+            (内容是否不一致, 本地文件的 MD5) ，没有计算 MD5 时为 None
+
+        """
+
+        # 打包文件的大小、修改时间和 MD5 都记录在索引中，不需要查询对象
+        member = self.pack_members.get(item.name)
+        if member is not None:
+            if item.file.size != member.size or self.compare_mode == 'size-only':
+                return item.file.size != member.size, None
+            if self.compare_mode == 'size+mtime':
+                return abs(item.file.mtime - member.mtime) > mtime_tolerance, None
+            file_md5 = file_md5 or self.get_file_md5(item.file)
+            return file_md5 != member.md5, file_md5
+
+        # 大小不同时只有压缩上传的对象（大小是压缩后的大小）需要进一步比较：
+        # - 不适合压缩的文件不会被压缩上传，只比较大小或修改时间时也不考虑压缩
+        # - 开启压缩时适合压缩的文件都按压缩上传处理，比较 MD5
+        # - 没有开启压缩时（比如下载其它同步单元压缩上传的对象），只查询对象元数据，
+        #   没有记录原始内容 MD5 的对象不是压缩上传的，不读取文件
+        if item.file.size != item.obj.size:
+            if self.compare_mode != 'checksum' or not self.oss_bucket.is_compressible(item.name):
+                return True, None
+            if not self.compress:
+                metadata = self.oss_bucket.get_metadata(item.obj.key) or {}
+                content_md5 = metadata.get(self.oss_bucket.content_md5_meta, '').lower()
+                if not content_md5:
+                    return True, None
+                file_md5 = file_md5 or self.get_file_md5(item.file)
+                return file_md5 != content_md5, file_md5
+
+        if self.compare_mode == 'size-only':
+            return item.file.size != item.obj.size, None
+
+        if self.compare_mode == 'size+mtime':
+            return abs(item.file.mtime - self.get_remote_mtime(item.obj)) > mtime_tolerance, None
+
+        if ('-' in item.obj.etag or item.obj.appendable) and self.oss_bucket.crc64_header:
+            remote_crc64 = self.get_remote_crc64(item.obj)
+            if remote_crc64 is not None:
+                return self.get_file_crc64(item.file) != remote_crc64, None
+
+        file_md5 = file_md5 or self.get_file_md5(item.file)
+        return not self.is_same_content(item.obj.key, file_md5, item.obj.etag), file_md5
+
+    def get_remote_crc64(self, obj: ObjectInfo) -> Optional[int]:
+        """获取对象内容的 CRC64
+
+        列出对象时不返回 CRC64 ，需要查询对象元信息
+
+        Args:
+            obj: 对象信息
+
+        Returns:
+            对象内容的 CRC64 ，查询失败、服务端没有返回或对象是压缩上传的（ CRC64 是压缩后内容的）时返回 None
+
+        """
+
+        headers = self.oss_bucket.head_object(obj.key)
+        if headers is None or headers.get('content-encoding'):
+            return None
+
+        try:
+            return int(headers[self.oss_bucket.crc64_header])
+        except (KeyError, ValueError):
+            return None
+
+    def get_file_crc64(self, file: FileInfo) -> int:
+        """获取本地文件的 CRC64
+
+        与 get_file_md5 一样优先使用校验索引中的记录，需要读取文件时同时计算 MD5 并记录到索引
+
+        Args:
+            file: 文件信息
+
+        Returns:
+            CRC64
+
+        """
+
+        if self.hash_index is not None:
+            record = self.hash_index.get(self.local_dir.root_dir, file)
+            if record is not None and record.crc64 is not None:
+                return record.crc64
+
+        file_md5, file_crc64 = self.local_dir.checksum_file(file.name, with_crc64=True)
+        self.record_hash(file, file_md5, file_crc64)
+
+        return file_crc64
+
+    def get_file_md5(self, file: FileInfo) -> str:
+        """获取本地文件的 MD5
+
+        文件的大小和修改时间与校验索引中的记录一致时直接使用记录，否则读取文件计算并记录到索引
+
+        Args:
+            file: 文件信息
+
+        Returns:
+            小写十六进制的 MD5
+
+        """
+
+        file_md5 = self.get_indexed_md5(file)
+        if file_md5 is not None:
+            return file_md5
+
+        file_md5 = self.local_dir.hash_file(file.name)
+        self.record_hash(file, file_md5)
+
+        return file_md5
+
+    def get_indexed_md5(self, file: FileInfo) -> Optional[str]:
+        """从校验索引中获取本地文件的 MD5
+
+        Args:
+            file: 文件信息
+
+        Returns:
+            文件的大小和修改时间与记录一致时返回记录的 MD5 ，否则返回 None
+
+        """
+
+        if self.hash_index is None:
+            return None
+
+        record = self.hash_index.get(self.local_dir.root_dir, file)
+        return record.md5 if record is not None else None
+
+    def load_file(self, file: FileInfo) -> Tuple[bytes, str, int]:
+        """占用内存预算后读入整个文件并计算 MD5
+
+        比较内容后需要上传的文件可以直接使用读入的内容，每个文件只读一遍
+
+        Args:
+            file: 文件信息
+
+        Returns:
+            (文件内容, 小写十六进制的 MD5, 占用的内存预算) ，内存预算由调用者释放或转交给上传任务
+
+        """
+
+        reserved = self.memory_budget.acquire(file.size)
+        try:
+            data = self.local_dir.read_file(file.name)
+            file_md5 = md5(data).hexdigest()
+            self.record_hash(file, file_md5)
+        except BaseException:
+            self.memory_budget.release(reserved)
+            raise
+
+        return data, file_md5, reserved
+
+    def record_hash(self, file: FileInfo, file_md5: Optional[str], crc64: Optional[int] = None) -> None:
+        """把本地文件的校验记录到校验索引（如果有）
+
+        Args:
+            file: 计算校验时的文件信息
+            file_md5: 文件的 MD5 ，没有计算时为 None
+            crc64: 文件的 CRC64 （可选）
+
+        """
+
+        if self.hash_index is not None:
+            self.hash_index.put(self.local_dir.root_dir, file, file_md5, crc64)
+
+    def make_put_task(
+            self,
+            file: FileInfo,
+            tag: str,
+            file_md5: Optional[str] = None,
+            data: Optional[bytes] = None,
+            reserved: int = 0
+    ) -> SyncTask:
+        """生成上传任务
+
+        读取本地文件，如果开启了压缩且内容适合压缩，则压缩内容并在元数据中记录原始内容的 MD5 。
+        比较方式为 size+mtime 时，在元数据中记录本地文件的修改时间。
+        任务中会带上实际上传的数据的 MD5 ，供服务端校验
+
+        Args:
+            file: 文件信息
+            tag: 变更类型
+            file_md5: 文件的 MD5 （可选），不指定则根据读取的内容计算
+            data: 已读取的文件内容（可选），不指定则占用内存预算后读取文件
+            reserved: 读取 data 时已占用的内存预算（可选），会转交给上传任务
+
+        Returns:
+            上传任务。试运行时不读取文件，任务中没有数据
+
+        """
+
+        if self.dry_run:
+            return SyncTask('put', file.name, tag, content_md5=file_md5, file=file)
+
+        if data is None:
+            reserved = self.memory_budget.acquire(file.size)
+
+        try:
+            return self._make_put_task(file, tag, file_md5, data)._replace(reserved=reserved)
+        except BaseException:
+            self.memory_budget.release(reserved)
+            raise
+
+    def _make_put_task(
+            self,
+            file: FileInfo,
+            tag: str,
+            file_md5: Optional[str] = None,
+            data: Optional[bytes] = None
+    ) -> SyncTask:
+        """生成上传任务，不处理内存预算，参数同 make_put_task
+        """
+
+        file_name = file.name
+
+        if data is None:
+            data = self.local_dir.read_file(file_name)
+
+        metadata = {}
+        if self.compare_mode == 'size+mtime':
+            metadata[self.oss_bucket.mtime_meta] = repr(file.mtime)
+
+        if file_md5 is None:
+            file_md5 = md5(data).hexdigest()
+
+        if not self.compress or not self.oss_bucket.is_compressible(file_name):
+            return SyncTask('put', file_name, tag, data, metadata=metadata, content_md5=file_md5, file=file)
+
+        buffer = io.BytesIO()
+        # 固定 mtime ，相同内容压缩结果相同
+        with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as gzip_file:
+            gzip_file.write(data)
+        compressed_data = buffer.getvalue()
+
+        # 压缩后没有变小则直接上传原始内容
+        if len(compressed_data) >= len(data):
+            return SyncTask('put', file_name, tag, data, metadata=metadata, content_md5=file_md5, file=file)
+
+        metadata[self.oss_bucket.content_md5_meta] = file_md5
+        return SyncTask(
+            'put',
+            file_name,
+            tag,
+            compressed_data,
+            metadata=metadata,
+            content_encoding='gzip',
+            content_md5=md5(compressed_data).hexdigest(),
+            file=file
+        )
+
+    def is_append_file(self, name: str) -> bool:
+        """判断文件是否以追加上传的方式同步
+
+        压缩上传的内容不能追加，开启压缩时适合压缩的文件仍然整个上传
+
+        Args:
+            name: 基于根目录的文件路径
+
+        Returns:
+            是否匹配追加上传规则
+
+        """
+
+        if self.compress and self.oss_bucket.is_compressible(name):
+            return False
+
+        return any(PathFilter.match_rule(rule, name, False) for rule in self.append_rules)
+
+    def get_prefix_crc64(self, item: SyncItem) -> Optional[int]:
+        """确认对象的内容是本地文件的开头部分
+
+        校验索引中记录的文件上次同步时的大小与对象大小一致，且记录的 CRC64 与对象的 CRC64 一致时，
+        认为文件只是在末尾增加了内容，对象的内容就是文件的开头部分
+
+        Notes:
+            - 与 rsync --append 类似，不会重新读取文件开头部分比较，在原有位置修改的内容不会被发现
+
+        Args:
+            item: 同步列表中本地和 OSS 都有的一项
+
+        Returns:
+            确认时返回对象内容的 CRC64 ，否则返回 None
+
+        """
+
+        if self.hash_index is None or not item.obj.appendable or item.obj.size >= item.file.size:
+            return None
+
+        previous = self.hash_index.get_previous(self.local_dir.root_dir, item.name)
+        if previous is None:
+            return None
+
+        previous_file, record = previous
+        if previous_file.size != item.obj.size or record.crc64 is None:
+            return None
+
+        if self.get_remote_crc64(item.obj) != record.crc64:
+            return None
+
+        return record.crc64
+
+    def make_append_task(self, item: SyncItem, tag: str) -> SyncTask:
+        """生成追加上传任务
+
+        对象的内容是本地文件的开头部分时只读取并上传增加的部分，否则读取整个文件重新创建可追加对象
+
+        Args:
+            item: 同步列表中本地有的一项
+            tag: 变更类型
+
+        Returns:
+            追加上传任务。试运行时不读取文件，任务中没有数据
+
+        """
+
+        file = item.file
+
+        prefix_crc64 = self.get_prefix_crc64(item) if item.obj is not None else None
+        if prefix_crc64 is not None:
+            offset = item.obj.size
+        else:
+            if item.obj is not None:
+                logger.debug(f'{item.name} 不能追加上传，将重新上传整个文件')
+            offset = 0
+
+        if self.dry_run:
+            return SyncTask('append', file.name, tag, obj=item.obj, file=file, crc64=prefix_crc64)
+
+        reserved = self.memory_budget.acquire(file.size - offset)
+        try:
+            data = self.local_dir.read_file(file.name, offset, file.size - offset)
+        except BaseException:
+            self.memory_budget.release(reserved)
+            raise
+
+        return SyncTask(
+            'append',
+            file.name,
+            tag,
+            data,
+            obj=item.obj,
+            content_md5=md5(data).hexdigest(),
+            reserved=reserved,
+            file=file,
+            crc64=prefix_crc64
+        )
+
+    def is_packed_file(self, file: FileInfo) -> bool:
+        """判断文件是否打包上传
+
+        Args:
+            file: 文件信息
+
+        Returns:
+            开启了打包、文件小于阈值且不是追加上传的文件时为 True
+
+        """
+
+        return 0 < self.pack_threshold and file.size < self.pack_threshold and not self.is_append_file(file.name)
+
+    def check_packed_file(self, item: SyncItem) -> Optional[SyncTask]:
+        """检查打包上传的文件是否需要同步
+
+        需要同步时只记录到所在文件夹的变更中，实际上传由推迟执行的 'pack' 任务按文件夹统一完成（见 commit_pack ）
+
+        Args:
+            item: 同步列表中本地有且需要打包的一项
+
+        Returns:
+            需要执行的同步任务，无需同步则返回 None
+
+        """
+
+        dir_prefix = get_dir_prefix(item.name)
+        self.pack_files.setdefault(dir_prefix, {})[item.name] = item.file
+
+        if item.name in self.pack_members:
+            modified, _ = self.is_modified(item)
+            if not modified:
+                # 打包文件没有变化，但还有同名的普通对象
+                if item.name in self.stale_objects:
+                    return SyncTask('del', item.name, '-')
+                self.log_skip(item.name)
+                return None
+        elif item.obj is not None:
+            # 以普通对象上传过的文件，打包后删除普通对象
+            self.stale_objects[item.name] = item.obj
+
+        self.pack_changes.setdefault(dir_prefix, {})[item.name] = item.file
+        return SyncTask('pack', item.name, '+' if item.obj is None else 'M', file=item.file)
+
+    def drop_pack_member(self, name: str) -> Optional[ObjectInfo]:
+        """从索引中删除打包文件（文件已被删除或不再需要打包）
+
+        Args:
+            name: 基于根目录的文件路径
+
+        Returns:
+            同名的普通对象，没有则为 None
+
+        """
+
+        self.pack_members.pop(name, None)
+        self.pack_changes.setdefault(get_dir_prefix(name), {})[name] = None
+        return self.stale_objects.pop(name, None)
+
+    def commit_pack(self, dir_prefix: str) -> Dict[str, bool]:
+        """上传文件夹中变更的打包文件并更新索引
+
+        同一个文件夹只处理一次，之后直接返回缓存的结果
+
+        Args:
+            dir_prefix: 文件夹前缀
+
+        Returns:
+            以文件路径为键的结果
+
+        """
+
+        with self.get_pack_lock(dir_prefix):
+            if dir_prefix not in self._pack_results:
+                self._pack_results[dir_prefix] = self._commit_pack(dir_prefix)
+            return self._pack_results[dir_prefix]
+
+    def _commit_pack(self, dir_prefix: str) -> Dict[str, bool]:
+        """上传文件夹中变更的打包文件并更新索引，参数和返回值同 commit_pack
+
+        依次完成：
+
+        - 把新增和修改的文件（以及需要压缩的打包对象中的其它文件）读入内存，打包成新的打包对象上传
+        - 上传新的索引，文件夹中没有打包文件时删除索引
+        - 删除不再被索引引用的打包对象和与打包文件同名的普通对象
+
+        旧的打包对象在新索引上传后才删除，任何一步失败时原有的索引仍然有效。
+        打包对象中仍被引用的内容不到一半时，从本地文件重新打包其中的文件（压缩），避免打包对象中的无用内容越来越多
+        """
+
+        index = self.pack_indexes.get(dir_prefix) or PackIndex(dir_prefix)
+        changes = self.pack_changes.get(dir_prefix, {})
+        files = self.pack_files.get(dir_prefix, {})
+        results = {name: False for name in changes}
+
+        members = {name: member for name, member in index.members.items() if name not in changes}
+        to_pack = {name: file for name, file in changes.items() if file is not None}
+
+        for pack, used in PackIndex(dir_prefix, members).pack_usage().items():
+            pack_obj = self.pack_objects.get(index.pack_key(pack))
+            if pack_obj is not None and used * 2 >= pack_obj.size:
+                continue
+
+            # 被过滤规则排除的文件没有本地文件信息，不能重新打包
+            names = [name for name, member in members.items() if member.pack == pack]
+            if all(name in files for name in names):
+                logger.debug(f'重新打包 {index.pack_key(pack)} 中的 {len(names)} 个文件')
+                for name in names:
+                    del members[name]
+                    to_pack[name] = files[name]
+
+        for names in split_packs((name, to_pack[name].size) for name in sorted(to_pack)):
+            reserved = self.memory_budget.acquire(2 * sum(to_pack[name].size for name in names))
+            try:
+                try:
+                    pack_data, packed = build_pack(
+                        (name, self.local_dir.read_file(name), to_pack[name].mtime)
+                        for name
+                        in names
+                    )
+                except OSError as err:
+                    logger.error(f'读取 {dir_prefix} 中待打包的文件失败： {err}')
+                    return results
+
+                pack_md5 = md5(pack_data).hexdigest()
+                pack = f'{pack_md5}.tar'
+                headers = self.oss_bucket.put_object(
+                    self.get_obj_key(index.pack_key(pack)),
+                    ThrottledReader(io.BytesIO(pack_data), self.upload_limiters, len(pack_data)),
+                    content_md5=pack_md5
+                )
+            finally:
+                self.memory_budget.release(reserved)
+
+            if headers is None:
+                return results
+
+            error = self.oss_bucket.verify_checksum(headers, pack_md5)
+            if error is not None:
+                logger.error(f'上传打包对象 {index.pack_key(pack)} 后校验失败： {error}')
+                return results
+
+            for name, offset, size, member_md5, mtime in packed:
+                members[name] = PackMember(name, pack, offset, size, member_md5, mtime)
+                self.record_hash(to_pack[name], member_md5)
+
+        new_index = PackIndex(dir_prefix, members)
+        if members:
+            data = new_index.dumps()
+            data_md5 = md5(data).hexdigest()
+            ok = self.oss_bucket.put_object(
+                self.get_obj_key(new_index.index_key),
+                data,
+                content_md5=data_md5
+            ) is not None
+        else:
+            ok = new_index.index_key not in self.pack_objects or self.oss_bucket.del_object(
+                self.get_obj_key(new_index.index_key)
+            )
+        if not ok:
+            logger.error(f'更新打包索引 {new_index.index_key} 失败')
+            return results
+
+        results = {name: True for name in changes}
+
+        # 清理失败不影响结果，留下的对象在下次更新这个文件夹时清理
+        used_packs = {member.pack for member in members.values()}
+        for key in self.pack_objects:
+            if parse_pack_key(key) == dir_prefix and key != new_index.index_key and \
+                    posixpath.basename(key) not in used_packs:
+                self.oss_bucket.del_object(self.get_obj_key(key))
+        for name in changes:
+            obj = self.stale_objects.get(name)
+            if obj is not None:
+                self.oss_bucket.del_object(obj.key)
+
+        return results
+
+    def unpack_member(self, task: SyncTask) -> bool:
+        """从打包对象中下载文件
+
+        同一个打包对象中需要下载的文件由第一个执行的任务一起下载，相邻的文件合并为一次范围下载
+
+        Args:
+            task: 下载任务
+
+        Returns:
+            是否成功
+
+        """
+
+        member = self.pack_members[task.name]
+        pack_key = self.get_obj_key(PackIndex(get_dir_prefix(member.name)).pack_key(member.pack))
+
+        with self.get_pack_lock(pack_key):
+            if pack_key not in self._pack_results:
+                self._pack_results[pack_key] = self._unpack(pack_key)
+            result = self._pack_results[pack_key].get(task.name)
+
+        # 没有预先记录的文件（本地复制失败后改为下载）单独下载
+        if result is None:
+            data = self.oss_bucket.get_object_range(pack_key, member.offset, member.size) if member.size else b''
+            return data is not None and self.write_member(member, data)
+
+        return result
+
+    def _unpack(self, pack_key: str) -> Dict[str, bool]:
+        """下载打包对象中需要下载的所有文件
+
+        Args:
+            pack_key: 打包对象 Key
+
+        Returns:
+            以文件路径为键的结果
+
+        """
+
+        results = {}
+        for members in merge_ranges(self.pack_downloads.get(pack_key, {}).values()):
+            start = members[0].offset
+            end = max(member.offset + member.size for member in members)
+
+            reserved = self.memory_budget.acquire(end - start)
+            try:
+                data = self.oss_bucket.get_object_range(pack_key, start, end - start) if end > start else b''
+                for member in members:
+                    results[member.name] = data is not None and self.write_member(
+                        member,
+                        data[member.offset - start:member.offset - start + member.size]
+                    )
+            finally:
+                self.memory_budget.release(reserved)
+
+        return results
+
+    def write_member(self, member: PackMember, data: bytes) -> bool:
+        """把打包文件的内容写入本地文件
+
+        Args:
+            member: 打包文件
+            data: 从打包对象中读取的内容
+
+        Returns:
+            是否成功
+
+        """
+
+        stream = ChecksumReader(ThrottledReader(io.BytesIO(data), self.download_limiters, len(data)))
+
+        def verify() -> None:
+            if stream.md5 != member.md5:
+                raise ChecksumError(f'MD5 不一致（索引为 {member.md5} ，下载的内容为 {stream.md5} ）')
+
+        try:
+            self.local_dir.write_stream(member.name, stream, verify)
+        except ChecksumError as err:
+            logger.error(f'下载 {member.name} 后校验失败： {err}')
+            return False
+
+        if self.compare_mode == 'size+mtime':
+            self.local_dir.set_mtime(member.name, member.mtime)
+
+        self.record_hash(self.local_dir.get_file_info(member.name), stream.md5)
+        return True
+
+    def get_cache_key(self, obj: ObjectInfo) -> Optional[str]:
+        """获取对象在下载缓存中的键
+
+        Args:
+            obj: 对象信息
+
+        Returns:
+            缓存键，没有下载缓存或对象不能缓存（可追加对象的 ETag 不能标识内容）时返回 None
+
+        """
+
+        if self.download_cache is None or obj.appendable:
+            return None
+
+        return self.download_cache.make_key(obj.etag)
+
+    def copy_from_cache(self, task: SyncTask, cache_key: str) -> bool:
+        """从下载缓存复制文件
+
+        Args:
+            task: 下载任务
+            cache_key: 缓存键
+
+        Returns:
+            是否命中并复制成功
+
+        """
+
+        # 压缩上传的对象大小是压缩后的，不能用于检查缓存
+        size = None if self.oss_bucket.is_compressible(task.name) else task.obj.size
+        cache_path = self.download_cache.get(cache_key, size)
+        if cache_path is None:
+            return False
+
+        try:
+            self.local_dir.import_file(cache_path, task.name)
+        except FileNotFoundError:
+            # 刚好被其它进程淘汰
+            return False
+
+        logger.debug(f'从下载缓存复制 {task.name}')
+
+        if self.compare_mode == 'size+mtime':
+            self.local_dir.set_mtime(task.name, self.get_remote_mtime(task.obj))
+
+        return True
+
+    def make_get_task(self, item: SyncItem, tag: str) -> SyncTask:
+        """生成下载任务
+
+        打包文件生成 'unpack' 任务（ source 为打包对象 Key ），并记录到所在打包对象需要下载的文件中
+
+        Args:
+            item: 同步列表中 OSS 有的一项
+            tag: 变更类型
+
+        Returns:
+            下载任务
+
+        """
+
+        member = self.pack_members.get(item.name)
+        if member is None:
+            return SyncTask('get', item.name, tag, obj=item.obj)
+
+        pack_key = self.get_obj_key(PackIndex(get_dir_prefix(member.name)).pack_key(member.pack))
+        self.pack_downloads.setdefault(pack_key, {})[member.name] = member
+        return SyncTask('unpack', item.name, tag, source=pack_key, obj=item.obj)
+
+    @staticmethod
+    def get_task_size(task: SyncTask) -> int:
+        """获取任务需要传输的字节数
+
+        Args:
+            task: 同步任务
+
+        Returns:
+            上传的数据大小或下载（桶间同步时为转存）的对象大小，不需要传输数据的任务为 0 。
+            试运行得到的上传任务中没有数据，按文件大小（追加上传时为增加部分的大小）计算
+
+        """
+
+        if task.data is not None:
+            return len(task.data)
+        if task.action == 'append' and task.file is not None:
+            return task.file.size - (task.obj.size if task.crc64 is not None else 0)
+        if task.action in ('get', 'put', 'unpack') and task.obj is not None:
+            return task.obj.size
+        if task.action in ('put', 'pack') and task.file is not None:
+            return task.file.size
+        return 0
+
+    def log_skip(self, name: str) -> None:
+        """记录无需同步的文件
+
+        Args:
+            name: 文件名
+
+        """
+
+        if self.verbose:
+            logger.info(f'Skip [S] {name}')
+
+    def log_result(self, task: SyncTask, ok: bool) -> None:
+        """记录任务结果
+
+        结果计入汇总进度，失败的任务总是输出日志，成功的任务只在 verbose 时输出
+
+        Args:
+            task: 同步任务
+            ok: 是否成功
+
+        """
+
+        if self.progress is not None:
+            self.progress.add_done(self.get_task_size(task) if ok else 0, ok)
+
+        if not ok:
+            logger.warning(f'Fail [{task.tag}] {task.name}')
+        elif self.verbose:
+            logger.info(f'OK   [{task.tag}] {task.name}')
+
+    def begin_sync(self, direction: str, plan: Optional[SyncPlan]) -> None:
+        """开始一次同步
+
+        试运行时创建新的同步计划，执行已有的计划时确认计划适用于当前同步
+
+        Args:
+            direction: 同步方向，见 SyncPlan
+            plan: 要执行的计划，不执行计划时为 None
+
+        """
+
+        self.plan = SyncPlan(direction) if self.dry_run else None
+
+        if plan is not None:
+            assert not self.dry_run, '试运行时不能执行计划'
+            assert not self.pack_threshold, '打包小文件时不能执行计划'
+            assert plan.direction == direction, f'计划的同步方向为 {plan.direction} ，不能用于 {direction}'
+
+    def plan_task(self, task: SyncTask, local_copies: Optional[Dict[str, str]] = None) -> bool:
+        """试运行时代替传输方法，把任务记录到 self.plan 中
+
+        同时按阿里云 OSS 的 API 名称估计任务需要的请求数，其它 OSS 的请求数与之大致相同
+
+        Notes:
+            - 压缩上传的文件按压缩前的大小计算
+            - 从打包对象下载时每个打包对象只计算一个请求，实际上不连续的文件会分多次下载
+
+        Args:
+            task: 同步任务
+            local_copies: 下载时本地已有副本的对象（可选），以 ETag 为键，用于确定 'clone' 任务的源文件
+
+        Returns:
+            总是返回 True
+
+        """
+
+        if task.action == 'clone' and task.source is None and local_copies:
+            task = task._replace(source=local_copies.get(task.etag))
+
+        size = self.get_task_size(task)
+        upload, download, group = 0, 0, None
+
+        if task.action == 'put' and self.dest_bucket is not None:
+            # 桶间转存读取后上传，超过分片大小时分片上传
+            upload = download = size
+            if size <= part_size:
+                requests = {'GetObject': 1, 'PutObject': 1}
+            else:
+                requests = {
+                    'GetObject': 1,
+                    'InitiateMultipartUpload': 1,
+                    'UploadPart': (size + part_size - 1) // part_size,
+                    'CompleteMultipartUpload': 1,
+                }
+        elif task.action == 'put':
+            upload, requests = size, {'PutObject': 1}
+        elif task.action == 'append':
+            upload, requests = size, {'AppendObject': 1}
+            # 重新创建时先删除已有的对象
+            if task.crc64 is None and task.obj is not None:
+                requests['DeleteObject'] = 1
+        elif task.action == 'pack':
+            # 每个文件夹上传一次打包对象和索引
+            upload, requests, group = size, {'PutObject': 2}, get_dir_prefix(task.name)
+        elif task.action == 'unpack':
+            download, requests, group = size, {'GetObject': 1}, task.source
+        elif task.action == 'get' or (task.action == 'clone' and task.source is None):
+            size = download = task.obj.size
+            requests = {'GetObject': 1}
+        elif task.action == 'copy':
+            requests = {'CopyObject': 1}
+        elif task.action == 'del':
+            requests = {'DeleteObject': 1}
+        else:
+            requests = {}
+
+        entry = PlanEntry(task.action, task.name, task.tag, size, task.source, task.obj)
+        self.plan.add(entry, requests, upload, download, group)
+
+        if task.action in ('copy', 'clone') and task.source is not None:
+            logger.info(f'Plan [{task.tag}] {task.name} <- {task.source}')
+        else:
+            logger.info(f'Plan [{task.tag}] {task.name}')
+        return True
+
+    def make_plan_task(self, entry: PlanEntry) -> SyncTask:
+        """按计划中的一项生成同步任务，用于代替检查方法执行已有的计划
+
+        上传任务读取文件当前的内容，其它任务按计划执行，不再比较本地和 OSS
+
+        Args:
+            entry: 计划中的一项
+
+        Returns:
+            同步任务
+
+        """
+
+        if entry.action in ('put', 'append') and self.local_dir is not None:
+            file = self.local_dir.get_file_info(entry.name)
+            if entry.action == 'append':
+                return self.make_append_task(SyncItem(entry.name, file, entry.obj), entry.tag)
+            return self.make_put_task(file, entry.tag)
+
+        return SyncTask(
+            entry.action,
+            entry.name,
+            entry.tag,
+            source=entry.source,
+            etag=entry.obj.etag.lower() if entry.obj is not None else None,
+            obj=entry.obj
+        )
+
+    def sync_in_pipeline(
+            self,
+            sync_list: Union[SyncList, BucketSyncList],
+            check_func: Callable[[Union[SyncItem, BucketSyncItem]], Optional[SyncTask]],
+            transfer_func: Callable[[SyncTask], bool],
+            deferred_actions: Container[str] = (),
+            async_transfer_func: Optional[Callable[[SyncTask], Awaitable[bool]]] = None
+    ) -> None:
+        """使用流水线同步
+
+        同步分为两个阶段，各自使用独立的线程池，阶段之间通过有界队列连接：
+
+        - 检查阶段：读本地文件、计算校验，决定需要执行的同步任务，线程数为 io_threads_num
+        - 传输阶段：与 OSS 通信执行同步任务，线程数为 threads_num
+
+        这样本地磁盘读写、校验计算和网络传输可以相互重叠，
+        有界队列保证了检查阶段不会比传输阶段超前太多（也就限制了暂存在队列中的数据量）
+
+        指定了 async_bucket 和 async_transfer_func 时，传输阶段改为在一个线程中运行事件循环，
+        同时执行最多 async_bucket.max_requests 个 async_transfer_func 。
+        事件循环的默认线程池有 threads_num 个线程，用于文件读写等阻塞操作
+
+        两个阶段的结果汇总到 self.progress 中，定期输出进度
+
+        Args:
+            sync_list: 同步列表
+            check_func: 检查方法。输入同步列表中的一项，返回需要执行的同步任务，无需同步则返回 None
+            transfer_func: 传输方法。执行一个同步任务，返回是否成功
+            deferred_actions: 需要推迟执行的操作（可选）。这些任务会在其它任务全部完成后才执行，
+                比如删除操作需要等待以被删除对象为源的复制操作完成
+            async_transfer_func: 异步传输方法（可选），与 transfer_func 相同，只用于 asyncio 传输引擎
+
+        """
+
+        use_async = self.async_bucket is not None and async_transfer_func is not None
+        concurrency = self.async_bucket.max_requests if use_async else self.threads_num
+
+        # 待检查的项
+        check_queue = queue.Queue()
+        for item in sync_list:
+            check_queue.put(item)
+
+        # 待传输的任务，队列满时检查阶段会阻塞等待。上传任务带着整个文件的内容，
+        # 队列长度按线程数而不是 max_requests 确定，否则 asyncio 引擎下会有数千个文件同时在内存中
+        transfer_queue = queue.Queue(maxsize=(self.threads_num + self.io_threads_num) * 2)
+
+        # 推迟执行的任务
+        deferred_tasks = []
+
+        # 传输线程异常退出时设置，此后检查线程和分发任务时不再等待传输队列，避免永远阻塞
+        stopped = threading.Event()
+        failures: List[BaseException] = []
+
+        progress = self.progress = ProgressReporter(len(sync_list), self.progress_interval)
+        progress.start()
+
+        def put_task(task: Optional[SyncTask]) -> bool:
+            # 放入传输队列，传输线程异常退出时放弃并返回 False
+            while not stopped.is_set():
+                try:
+                    transfer_queue.put(task, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def drop_queued_tasks() -> None:
+            # 传输线程异常退出后，释放队列中剩余任务占用的内存预算
+            while True:
+                try:
+                    task = transfer_queue.get_nowait()
+                except queue.Empty:
+                    return
+                if task is not None:
+                    self.memory_budget.release(task.reserved)
+
+        def stop_transfer_threads(threads: List[threading.Thread]) -> None:
+            # 每个传输线程取到一个 None 后退出
+            for _ in threads:
+                if not put_task(None):
+                    break
+            if stopped.is_set():
+                # 异常退出的线程不再消费队列，清空队列后通知其余传输线程退出
+                drop_queued_tasks()
+                for _ in threads:
+                    transfer_queue.put_nowait(None)
+            for t in threads:
+                t.join()
+
+        def check_worker() -> None:
+            while not stopped.is_set():
+                try:
+                    item = check_queue.get_nowait()
+                except queue.Empty:
+                    return
+
+                try:
+                    task = check_func(item)
+                except Exception as err:
+                    logger.exception(f'检查 {item.name} 时发生错误： {err}')
+                    progress.add_checked(False)
+                    progress.add_task(0)
+                    progress.add_done(0, False)
+                    continue
+
+                progress.add_checked(task is None)
+                if task is None:
+                    continue
+
+                progress.add_task(self.get_task_size(task))
+
+                if task.action in deferred_actions:
+                    deferred_tasks.append(task)
+                elif not put_task(task):
+                    self.memory_budget.release(task.reserved)
+                    progress.add_done(0, False)
+
+        def transfer_worker() -> None:
+            while True:
+                task = transfer_queue.get()
+
+                # 当前阶段的任务已全部分发
+                if task is None:
+                    return
+
+                try:
+                    ok = transfer_func(task)
+                except Exception as err:
+                    logger.exception(f'同步 {task.name} 时发生错误： {err}')
+                    ok = False
+                finally:
+                    self.memory_budget.release(task.reserved)
+
+                self.log_result(task, ok)
+
+        async def async_transfer_worker() -> None:
+            import asyncio
+
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=self.threads_num, thread_name_prefix='transfer'))
+
+            # 每个任务占用一个名额，同时进行的请求数不超过名额数
+            slots = asyncio.Semaphore(concurrency)
+            running = set()
+
+            async def run(task: SyncTask) -> None:
+                try:
+                    ok = await async_transfer_func(task)
+                except Exception as err:
+                    logger.exception(f'同步 {task.name} 时发生错误： {err}')
+                    ok = False
+                finally:
+                    self.memory_budget.release(task.reserved)
+                    slots.release()
+
+                self.log_result(task, ok)
+
+            # 队列为空时在单独的线程中等待，既不阻塞事件循环，也不与执行任务的线程池争用线程
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix='transfer-queue') as queue_executor:
+                async with self.async_bucket:
+                    while True:
+                        await slots.acquire()
+                        try:
+                            task = transfer_queue.get_nowait()
+                        except queue.Empty:
+                            task = await loop.run_in_executor(queue_executor, transfer_queue.get)
+
+                        # 当前阶段的任务已全部分发
+                        if task is None:
+                            break
+
+                        future = asyncio.ensure_future(run(task))
+                        running.add(future)
+                        future.add_done_callback(running.discard)
+
+                    if running:
+                        await asyncio.wait(running)
+
+        def run_transfer_worker() -> None:
+            # 单个任务的异常已在传输方法中处理，这里是传输线程本身（比如事件循环或异步客户端）的异常
+            try:
+                if use_async:
+                    import asyncio
+                    asyncio.run(async_transfer_worker())
+                else:
+                    transfer_worker()
+            except BaseException as err:
+                logger.exception(f'传输线程异常退出： {err}')
+                failures.append(err)
+                stopped.set()
+
+        def start_transfer_threads() -> List[threading.Thread]:
+            if use_async:
+                thread = threading.Thread(target=run_transfer_worker, name='transfer-async')
+                thread.start()
+                return [thread]
+
+            threads = [
+                threading.Thread(target=run_transfer_worker, name=f'transfer-{i}')
+                for i
+                in range(min(len(sync_list), self.threads_num) or 1)
+            ]
+            for t in threads:
+                t.start()
+            return threads
+
+        # 生成并启动所有同步线程
+        check_threads = [
+            threading.Thread(target=check_worker, name=f'check-{i}')
+            for i
+            in range(min(len(sync_list), self.io_threads_num) or 1)
+        ]
+        for t in check_threads:
+            t.start()
+        transfer_threads = start_transfer_threads()
+
+        # 等待检查阶段结束后通知传输线程退出
+        for t in check_threads:
+            t.join()
+        stop_transfer_threads(transfer_threads)
+
+        # 执行推迟的任务
+        if deferred_tasks and not stopped.is_set():
+            transfer_threads = start_transfer_threads()
+            for task in deferred_tasks:
+                if not put_task(task):
+                    break
+            stop_transfer_threads(transfer_threads)
+
+        # 协程等待内存预算时使用的线程不再需要
+        if use_async:
+            self.memory_budget.close()
+
+        # 试运行时没有执行任务，汇总由调用者根据计划输出
+        progress.stop(summary=not self.dry_run)
+
+        # 传输线程异常退出时，同步没有完成，向调用者抛出异常
+        if failures:
+            raise failures[0]
+
+    def sync_from_local_to_oss(self, plan: Optional[SyncPlan] = None) -> None:
+        """从本地同步到OSS
+
+        Args:
+            plan: 要执行的同步计划（可选），由之前的试运行得到。若指定，则不再列出和比较，直接执行计划中的任务
+
+        """
+
+        self.begin_sync('local-to-remote', plan)
+        sync_list = self.sync_checking() if plan is None else []
+
+        # 按 ETag 索引可以作为服务端复制源的对象：
+        # - 本地已不存在的对象（比如重命名前的旧对象），它们的删除会推迟到所有复制完成之后
+        # - 检查过程中确认与本地一致的对象，它们在本次同步中不会被修改
+        # 分片上传的对象的 ETag 不是内容的 MD5 ，不能用于匹配
+        # 打包文件不是单独的对象，也不能作为复制源
+        deleted_objs = {
+            item.obj.etag.lower(): item.name
+            for item
+            in sync_list
+            if item.file is None and self.is_md5_etag(item.obj) and item.name not in self.pack_members
+        }
+        unchanged_objs = {}
+
+        # 检查是否需要同步
+        def check(item: SyncItem) -> Optional[SyncTask]:
+
+            # 文件在本地
+            if item.file is not None:
+
+                if self.is_packed_file(item.file):
+                    return self.check_packed_file(item)
+
+                # 之前打包上传的文件不再需要打包，从索引中删除，改为与同名的普通对象（如果有）比较
+                if item.name in self.pack_members:
+                    item = item._replace(obj=self.drop_pack_member(item.name))
+
+                # 本地和 OSS 各有一份
+                if item.obj is not None:
+                    # 比较 MD5 时索引中没有记录的小文件，要么需要计算 MD5 ，要么大小不同需要上传，
+                    # 都直接把文件读入内存：内容不一致时上传读入的内容，不再读第二遍。大文件由 is_modified 流式计算
+                    data, file_md5, reserved = None, None, 0
+                    if (
+                            not self.dry_run
+                            and self.compare_mode == 'checksum'
+                            and item.file.size <= preload_size
+                            and self.is_md5_etag(item.obj)
+                            and not self.is_append_file(item.name)
+                    ):
+                        file_md5 = self.get_indexed_md5(item.file)
+                        if file_md5 is None:
+                            data, file_md5, reserved = self.load_file(item.file)
+
+                    try:
+                        modified, file_md5 = self.is_modified(item, file_md5)
+                    except BaseException:
+                        self.memory_budget.release(reserved)
+                        raise
+
+                    # 内容一致，跳过
+                    if not modified:
+                        self.memory_budget.release(reserved)
+                        if file_md5 == item.obj.etag.lower():
+                            unchanged_objs[file_md5] = item.name
+                        self.log_skip(item.name)
+                        return None
+
+                    # 内容不一致，上传本地文件到 OSS
+                    if self.is_append_file(item.name):
+                        return self.make_append_task(item, 'M')
+                    return self.make_put_task(item.file, 'M', file_md5, data, reserved)
+
+                # 可追加对象不能由服务端复制创建
+                if self.is_append_file(item.name):
+                    return self.make_append_task(item, '+')
+
+                # 只比较大小或修改时间时不计算 MD5 ，也就无法匹配服务端已有的相同内容
+                if self.compare_mode != 'checksum':
+                    return self.make_put_task(item.file, '+')
+
+                # 文件不在 OSS ，如果 OSS 上已有相同内容的对象则使用服务端复制，否则上传本地文件到 OSS 。
+                # 试运行时只计算 MD5 ，不读入整个文件
+                if self.dry_run:
+                    data, file_md5, reserved = None, self.get_file_md5(item.file), 0
+                else:
+                    data, file_md5, reserved = self.load_file(item.file)
+
+                # 超过服务端复制大小上限的文件直接上传
+                source = deleted_objs.get(file_md5) or unchanged_objs.get(file_md5)
+                if source is not None and item.file.size <= self.oss_bucket.copy_size_limit:
+                    self.memory_budget.release(reserved)
+                    return SyncTask('copy', item.name, '+', source=source, file=item.file)
+
+                return self.make_put_task(item.file, '+', file_md5, data, reserved)
+
+            # 文件不在本地，删除 OSS 上的对应对象或打包文件
+            if item.name in self.pack_members:
+                # 同名的普通对象在更新索引后一起删除
+                stale_obj = self.drop_pack_member(item.name)
+                if stale_obj is not None:
+                    self.stale_objects[item.name] = stale_obj
+                return SyncTask('pack', item.name, '-')
+            return SyncTask('del', item.name, '-')
+
+        def verify_put(task: SyncTask, headers: Dict[str, str], data_crc64: Optional[int]) -> bool:
+            error = self.oss_bucket.verify_checksum(headers, task.content_md5, data_crc64)
+            if error is not None:
+                logger.error(f'上传 {task.name} 后校验失败： {error}')
+                return False
+
+            # 上传的内容与文件一致，可以记录文件的校验
+            file_md5 = task.metadata.get(self.oss_bucket.content_md5_meta, task.content_md5)
+            self.record_hash(task.file, file_md5, data_crc64 if task.content_encoding is None else None)
+            return True
+
+        def put_instead_of_copy(task: SyncTask) -> bool:
+            logger.warning(f'服务端复制 {task.name} 失败，改为上传本地文件')
+
+            # 执行计划时复制任务中没有文件信息
+            put_task = self.make_put_task(task.file or self.local_dir.get_file_info(task.name), task.tag)
+            try:
+                return transfer(put_task)
+            finally:
+                self.memory_budget.release(put_task.reserved)
+
+        # 进行同步
+        def transfer(task: SyncTask) -> bool:
+
+            if task.action == 'put':
+                # 服务端根据 Content-MD5 校验内容，没有 Content-MD5 时 CRC64 在上传的同时计算，与响应头比较
+                stream = ChecksumReader(
+                    ThrottledReader(io.BytesIO(task.data), self.upload_limiters, len(task.data)),
+                    with_md5=False,
+                    with_crc64=self.verify_crc64 and task.content_md5 is None
+                )
+                headers = self.oss_bucket.put_object(
+                    self.get_obj_key(task.name),
+                    stream,
+                    task.metadata,
+                    task.content_encoding,
+                    task.content_md5
+                )
+                return headers is not None and verify_put(task, headers, stream.crc64)
+            elif task.action == 'append':
+                obj_key = self.get_obj_key(task.name)
+
+                # 重新创建对象时，已有的对象（可能是普通对象或内容不一致的可追加对象）不能直接追加，需要先删除
+                if task.crc64 is None and task.obj is not None and not self.oss_bucket.del_object(obj_key):
+                    return False
+
+                # 响应头中的 CRC64 是整个对象的，总是需要计算追加部分的 CRC64 来校验
+                stream = ChecksumReader(
+                    ThrottledReader(io.BytesIO(task.data), self.upload_limiters, len(task.data)),
+                    with_md5=False,
+                    with_crc64=True
+                )
+                headers = self.oss_bucket.append_object(
+                    obj_key,
+                    stream,
+                    task.obj.size if task.crc64 is not None else 0,
+                    task.metadata,
+                    task.content_md5
+                )
+                if headers is None:
+                    return False
+
+                file_crc64 = crc64_combine(task.crc64 or 0, stream.crc64, len(task.data))
+                error = self.oss_bucket.verify_checksum(headers, crc64=file_crc64)
+                if error is not None:
+                    logger.error(f'追加上传 {task.name} 后校验失败： {error}')
+                    return False
+
+                # 只上传了增加的部分时不知道整个文件的 MD5 ，只记录 CRC64
+                self.record_hash(task.file, task.content_md5 if task.crc64 is None else None, file_crc64)
+                return True
+            elif task.action == 'copy':
+                logger.debug(f'copy \'{task.source}\' -> \'{task.name}\'')
+                ret = (
+                    self.oss_bucket.copy_object(self.get_obj_key(task.source), self.get_obj_key(task.name))
+                    or put_instead_of_copy(task)
+                )
+            elif task.action == 'pack':
+                ret = self.commit_pack(get_dir_prefix(task.name)).get(task.name, False)
+            else:
+                ret = self.oss_bucket.del_object(self.get_obj_key(task.name))
+
+            return ret
+
+        # asyncio 传输引擎：上传、复制和删除对象使用异步客户端，其它任务在线程池中执行
+        async def async_transfer(task: SyncTask) -> bool:
+            import asyncio
+
+            loop = asyncio.get_running_loop()
+
+            if task.action == 'put':
+                # 没有 Content-MD5 时 CRC64 在线程池中与上传同时计算
+                crc64_future = (
+                    loop.run_in_executor(None, crc64, task.data)
+                    if self.verify_crc64 and task.content_md5 is None
+                    else None
+                )
+
+                await throttle_async(self.upload_limiters, len(task.data))
+                headers = await self.async_bucket.put_object(
+                    self.get_obj_key(task.name),
+                    task.data,
+                    task.metadata,
+                    task.content_encoding,
+                    task.content_md5
+                )
+                data_crc64 = await crc64_future if crc64_future is not None else None
+                if headers is None:
+                    return False
+
+                # 校验索引的写入在线程池中执行
+                return await loop.run_in_executor(None, verify_put, task, headers, data_crc64)
+            elif task.action == 'copy':
+                logger.debug(f'copy \'{task.source}\' -> \'{task.name}\'')
+                if await self.async_bucket.copy_object(self.get_obj_key(task.source), self.get_obj_key(task.name)):
+                    return True
+                return await loop.run_in_executor(None, put_instead_of_copy, task)
+            elif task.action == 'del':
+                return await self.async_bucket.del_object(self.get_obj_key(task.name))
+
+            return await loop.run_in_executor(None, transfer, task)
+
+        if plan is not None:
+            sync_list, check = plan.entries, self.make_plan_task
+        if self.dry_run:
+            transfer, async_transfer = self.plan_task, None
+
+        # 打包任务推迟到检查全部完成、每个文件夹的变更都已确定之后执行
+        self.sync_in_pipeline(
+            sync_list, check, transfer, deferred_actions=('del', 'pack'), async_transfer_func=async_transfer
+        )
+
+        if self.dry_run:
+            return
+
+        # 只有不再需要打包的文件（改为普通对象上传）的文件夹没有打包任务，在这里更新索引
+        for dir_prefix in self.pack_changes:
+            if not all(self.commit_pack(dir_prefix).values()):
+                logger.warning(f'更新 {dir_prefix or "根目录"} 的打包索引失败')
+
+    def sync_from_oss_to_local(self, plan: Optional[SyncPlan] = None) -> None:
+        """从 OSS 同步到本地
+
+        Args:
+            plan: 要执行的同步计划（可选），见 sync_from_local_to_oss
+
+        """
+
+        self.begin_sync('remote-to-local', plan)
+        sync_list = self.sync_checking() if plan is None else []
+
+        # 本地已有副本的对象，以 ETag 为键，值为确认与对象内容一致的本地文件名。
+        # 只有与某个两边都有的对象 ETag 相同的新对象才可能在本地找到副本，
+        # 这些对象的下载会推迟到所有本地文件检查完成之后，再优先从本地复制
+        local_copies = {}
+        candidate_etags = {
+            item.obj.etag.lower()
+            for item
+            in sync_list
+            if item.file is not None and item.obj is not None
+        }
+
+        # 检查是否需要同步
+        def check(item: SyncItem) -> Optional[SyncTask]:
+
+            # 文件在本地
+            if item.file is not None:
+
+                # 本地和OSS各有一份
+                if item.obj is not None:
+                    modified, _ = self.is_modified(item)
+
+                    # 内容一致，跳过（只有比较过 MD5 的文件才能作为本地副本）
+                    if not modified:
+                        if self.compare_mode == 'checksum':
+                            local_copies[item.obj.etag.lower()] = item.name
+                        self.log_skip(item.name)
+                        return None
+
+                    # 内容不一致，下载 OSS 对应文件
+                    return self.make_get_task(item, 'M')
+
+                # 文件不在OSS，删除本地文件
+                return SyncTask('rm', item.name, '-')
+
+            # 文件不在本地，本地可能有相同内容的文件，稍后优先从本地复制
+            if self.compare_mode == 'checksum' and item.obj.etag.lower() in candidate_etags:
+                return SyncTask('clone', item.name, '+', etag=item.obj.etag.lower(), obj=item.obj)
+
+            # 文件不在本地，下载 OSS 上的对应对象
+            return self.make_get_task(item, '+')
+
+        def save_object(task: SyncTask, raw: BinaryIO, headers: Dict[str, str], cache_key: Optional[str]) -> bool:
+            # 写文件的同时计算校验，替换本地文件前与响应头比较。 ETag 是 MD5 时（包括压缩上传的对象）由 MD5 校验，不计算 CRC64
+            stream = ChecksumReader(raw, with_crc64=self.verify_crc64 and not self.is_md5_etag(task.obj))
+
+            def verify() -> None:
+                error = self.oss_bucket.verify_checksum(headers, stream.md5, stream.crc64, decoded=True)
+                if error is not None:
+                    raise ChecksumError(error)
+
+            try:
+                self.local_dir.write_stream(task.name, stream, verify)
+            except ChecksumError as err:
+                logger.error(f'下载 {task.name} 后校验失败： {err}')
+                return False
+            finally:
+                stream.close()
+
+            # 本地文件的修改时间与上传时记录的一致，下次同步时才能判断为未修改
+            if self.compare_mode == 'size+mtime':
+                self.local_dir.set_mtime(task.name, self.get_remote_mtime(task.obj, headers=headers))
+
+            self.record_hash(self.local_dir.get_file_info(task.name), stream.md5, stream.crc64)
+
+            if cache_key is not None:
+                try:
+                    self.download_cache.put(cache_key, os.path.join(self.local_dir.root_dir, task.name))
+                except OSError as err:
+                    logger.warning(f'把 {task.name} 加入下载缓存失败： {err}')
+
+            return True
+
+        # 进行同步
+        def transfer(task: SyncTask) -> bool:
+
+            if task.action == 'rm':
+                self.local_dir.del_file(task.name)
+                if self.hash_index is not None:
+                    self.hash_index.remove(self.local_dir.root_dir, task.name)
+                return True
+
+            if task.action == 'clone':
+                # 执行计划时使用计划中记录的本地副本
+                source = task.source or local_copies.get(task.etag)
+                if source is not None:
+                    logger.debug(f'clone \'{source}\' -> \'{task.name}\'')
+                    self.local_dir.clone_file(source, task.name)
+                    return True
+
+            if task.name in self.pack_members:
+                return self.unpack_member(task)
+
+            # 其它本地目录下载过相同内容时从下载缓存复制
+            cache_key = self.get_cache_key(task.obj)
+            if cache_key is not None and self.copy_from_cache(task, cache_key):
+                return True
+
+            ret = self.oss_bucket.get_object_stream(self.get_obj_key(task.name))
+            if ret is None:
+                return False
+
+            # 下载时只有写文件的缓冲区在内存中
+            reserved = self.memory_budget.acquire(min(task.obj.size, self.local_dir.buffer_size))
+            try:
+                return save_object(task, ThrottledReader(ret[0], self.download_limiters), ret[1], cache_key)
+            finally:
+                self.memory_budget.release(reserved)
+
+        # asyncio 传输引擎：不超过写文件缓冲区大小的对象使用异步客户端整个读入内存，再在线程池中写文件；
+        # 更大的对象和其它任务在线程池中执行
+        async def async_transfer(task: SyncTask) -> bool:
+            import asyncio
+
+            loop = asyncio.get_running_loop()
+
+            if task.action != 'get' or task.obj.size > self.local_dir.buffer_size:
+                return await loop.run_in_executor(None, transfer, task)
+
+            cache_key = self.get_cache_key(task.obj)
+            if cache_key is not None and await loop.run_in_executor(None, self.copy_from_cache, task, cache_key):
+                return True
+
+            reserved = await self.memory_budget.acquire_async(task.obj.size)
+            try:
+                ret = await self.async_bucket.get_object(self.get_obj_key(task.name))
+                if ret is None:
+                    return False
+
+                await throttle_async(self.download_limiters, len(ret[0]))
+                return await loop.run_in_executor(None, save_object, task, io.BytesIO(ret[0]), ret[1], cache_key)
+            finally:
+                self.memory_budget.release(reserved)
+
+        if plan is not None:
+            sync_list, check = plan.entries, self.make_plan_task
+        if self.dry_run:
+            # 'clone' 任务推迟到检查完成后记录，此时本地副本已经确定
+            transfer, async_transfer = lambda task: self.plan_task(task, local_copies), None
+        else:
+            # 检查得到需要写文件的任务后，在检查线程中创建所在的文件夹（已创建过的不再检查），
+            # 传输时不再检查文件夹是否存在；跳过的文件不会产生任何文件夹操作
+            check_item = check
+
+            def check(item: SyncItem) -> Optional[SyncTask]:
+                task = check_item(item)
+                if task is not None and task.action in ('get', 'clone', 'unpack'):
+                    self.local_dir.make_dirs([task.name])
+                return task
+
+        # 从打包对象下载的任务推迟到检查全部完成、每个打包对象中需要下载的文件都已确定之后执行
+        self.sync_in_pipeline(
+            sync_list, check, transfer, deferred_actions=('clone', 'unpack'), async_transfer_func=async_transfer
+        )
+
+        if self.dry_run:
+            return
+
+        # 清理删除过文件的文件夹中的空文件夹，完整遍历时也完整清理。
+        # 多个分片同时同步时只由 0 号分片清理，避免删除其它分片刚创建、还没有写入文件的文件夹
+        if self.shard_count == 1 or self.shard_index == 0:
+            self.local_dir.clear_empty_folder(full=self.full_scan)
+
+    def is_object_modified(self, item: BucketSyncItem) -> bool:
+        """判断源和目标 Bucket 都有的对象内容是否不一致
+
+        对象按原始内容（压缩上传的对象不解压）同步，两边的大小和 ETag 可以直接比较。
+        任意一边的 ETag 不是内容的 MD5 （分片上传或追加上传的对象）时，两边都支持的话改为比较 CRC64 ，否则视为不一致
+
+        Args:
+            item: 桶间同步列表中两边都有的一项
+
+        Returns:
+            内容是否不一致
+
+        """
+
+        src, dst = item.src, item.dst
+
+        if src.size != dst.size:
+            return True
+
+        if self.compare_mode == 'size-only':
+            return False
+
+        # 没有记录修改时间的对象复制后，目标对象的最后修改时间总是更晚，只有源对象更新时才视为不一致
+        if self.compare_mode == 'size+mtime':
+            return self.get_remote_mtime(src) > self.get_remote_mtime(dst, self.dest_bucket) + mtime_tolerance
+
+        if self.is_md5_etag(src) and self.is_md5_etag(dst):
+            return src.etag.lower() != dst.etag.lower()
+
+        if not self.oss_bucket.crc64_header or not self.dest_bucket.crc64_header:
+            return True
+
+        src_headers = self.oss_bucket.head_object(src.key) or {}
+        dst_headers = self.dest_bucket.head_object(dst.key) or {}
+        src_crc64 = src_headers.get(self.oss_bucket.crc64_header)
+        return src_crc64 is None or src_crc64 != dst_headers.get(self.dest_bucket.crc64_header)
+
+    @staticmethod
+    def is_md5_etag(obj: ObjectInfo) -> bool:
+        """判断对象的 ETag 是否是内容的 MD5
+
+        Args:
+            obj: 对象信息
+
+        Returns:
+            不是分片上传或追加上传的对象时为 True
+
+        """
+
+        return '-' not in obj.etag and not obj.appendable
+
+    def transfer_object(self, task: SyncTask) -> bool:
+        """把源 Bucket 中的对象转存到目标 Bucket
+
+        以流的形式读取源对象的原始内容（压缩上传的对象不解压），连同 Content-Encoding 和用户自定义元数据写入目标对象。
+        不超过 part_size 的对象读入内存后上传，更大的对象使用分片上传，同时只有一个分片在内存中。
+        读取的同时计算校验，与源对象的响应头比较，不一致时不会写入（或完成）目标对象
+
+        Args:
+            task: 转存任务， obj 为源对象信息
+
+        Returns:
+            是否成功
+
+        """
+
+        ret = self.oss_bucket.get_object_stream(task.obj.key, decode=False)
+        if ret is None:
+            return False
+
+        # 源对象的 ETag 是 MD5 、目标对象也不分片上传时，两边都由 MD5 校验，不计算 CRC64
+        src_headers = ret[1]
+        stream = ChecksumReader(
+            ThrottledReader(ret[0], self.download_limiters),
+            with_crc64=self.verify_crc64 and (task.obj.size > part_size or not self.is_md5_etag(task.obj))
+        )
+
+        metadata = {
+            key[len(self.oss_bucket.meta_prefix):]: value
+            for key, value
+            in src_headers.items()
+            if key.startswith(self.oss_bucket.meta_prefix)
+        }
+        content_encoding = src_headers.get('content-encoding') or None
+        dst_key = f'{self.dest_prefix}{task.name}'
+
+        def verify() -> Optional[str]:
+            return self.oss_bucket.verify_checksum(src_headers, stream.md5, stream.crc64)
+
+        reserved = self.memory_budget.acquire(min(task.obj.size, part_size))
+        try:
+            if task.obj.size <= part_size:
+                data = stream.read()
+
+                error = verify()
+                if error is not None:
+                    logger.error(f'读取 {task.name} 后校验失败： {error}')
+                    return False
+
+                headers = self.dest_bucket.put_object(
+                    dst_key,
+                    ThrottledReader(io.BytesIO(data), self.upload_limiters, len(data)),
+                    metadata,
+                    content_encoding,
+                    stream.md5
+                )
+            else:
+                headers = self.dest_bucket.put_object_multipart(
+                    dst_key,
+                    ThrottledReader(stream, self.upload_limiters, task.obj.size),
+                    task.obj.size,
+                    part_size,
+                    metadata,
+                    content_encoding,
+                    verify
+                )
+        finally:
+            self.memory_budget.release(reserved)
+            stream.close()
+
+        if headers is None:
+            return False
+
+        error = self.dest_bucket.verify_checksum(headers, crc64=stream.crc64)
+        if error is not None:
+            logger.error(f'转存 {task.name} 后校验失败： {error}')
+            return False
+
+        return True
+
+    def sync_from_oss_to_oss(self, plan: Optional[SyncPlan] = None) -> None:
+        """从 OSS 同步到另一个 OSS
+
+        oss_bucket 为源， dest_bucket 为目标，不经过本地磁盘。
+        两边是同一类型的 OSS 且对象不超过服务端复制的大小限制时使用服务端复制，复制失败（比如跨地域）时改为转存
+
+        Args:
+            plan: 要执行的同步计划（可选），见 sync_from_local_to_oss
+
+        """
+
+        assert self.dest_bucket is not None, '桶间同步需要指定 dest_bucket'
+
+        self.begin_sync('remote-to-remote', plan)
+
+        sync_list = []
+        if plan is None:
+            src_map = self.list_objects_map(self.oss_bucket, self.remote_prefix)
+            dst_map = self.list_objects_map(self.dest_bucket, self.dest_prefix)
+
+            sync_list.extend(BucketSyncItem(name, obj, dst_map.pop(name, None)) for name, obj in src_map.items())
+            sync_list.extend(BucketSyncItem(name, None, obj) for name, obj in dst_map.items())
+
+        same_type = type(self.oss_bucket) is type(self.dest_bucket)
+
+        # 检查是否需要同步
+        def check(item: BucketSyncItem) -> Optional[SyncTask]:
+
+            # 对象不在源 Bucket ，删除目标 Bucket 中的对象
+            if item.src is None:
+                return SyncTask('del', item.name, '-')
+
+            if item.dst is not None and not self.is_object_modified(item):
+                self.log_skip(item.name)
+                return None
+
+            tag = '+' if item.dst is None else 'M'
+            if same_type and item.src.size <= self.dest_bucket.copy_size_limit:
+                return SyncTask('copy', item.name, tag, obj=item.src)
+            return SyncTask('put', item.name, tag, obj=item.src)
+
+        # 进行同步
+        def transfer(task: SyncTask) -> bool:
+
+            if task.action == 'del':
+                return self.dest_bucket.del_object(f'{self.dest_prefix}{task.name}')
+
+            if task.action == 'copy':
+                logger.debug(f'copy \'{task.obj.key}\' -> \'{self.dest_prefix}{task.name}\'')
+                if self.dest_bucket.copy_object(task.obj.key, f'{self.dest_prefix}{task.name}', self.oss_bucket):
+                    return True
+                logger.warning(f'服务端复制 {task.name} 失败，改为读取后上传')
+
+            return self.transfer_object(task)
 
-        self.sync_in_multi_threads(sync)
+        if plan is not None:
+            sync_list, check = plan.entries, self.make_plan_task
+        if self.dry_run:
+            transfer = self.plan_task
 
-        # 清理空文件夹
-        self.local_dir.clear_empty_folder()
+        self.sync_in_pipeline(sync_list, check, transfer)
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+"""小文件打包
+
+该模块定义了把同一文件夹中的小文件打包成一个对象时使用的索引和打包方法
+
+同一文件夹 D 中的小文件打包后，在 OSS 上的布局如下：
+
+- D/.oss-sync-pack/<MD5>.tar ：打包对象，是一个标准的 tar 文件，内容的 MD5 作为对象名
+- D/.oss-sync-pack/index.json ：索引对象，记录每个文件所在的打包对象和内容在其中的偏移量、大小、 MD5 和修改时间
+
+下载时根据索引按范围读取打包对象，不需要下载整个打包对象；打包对象也可以直接用 tar 解开
+"""
+
+import io
+import json
+import logging
+import posixpath
+import tarfile
+from hashlib import md5
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+# 存放打包对象和索引对象的文件夹名
+pack_dir_name: str = '.oss-sync-pack'
+
+# 索引对象名
+index_name: str = 'index.json'
+
+# 单个打包对象的最大大小（字节），超过时拆分为多个打包对象
+pack_size: int = 16 * 1024 * 1024
+
+# 下载时同一个打包对象中两个文件之间的间隔不超过该值（字节）时，合并为一次范围下载
+range_gap: int = 256 * 1024
+
+
+class PackMember(NamedTuple):
+    """打包对象中的一个文件
+    """
+
+    # 基于根目录的文件路径
+    name: str
+
+    # 所在的打包对象名（不含文件夹）
+    pack: str
+
+    # 内容在打包对象中的偏移量（字节）
+    offset: int
+
+    # 内容大小（字节）
+    size: int
+
+    # 内容的 MD5 （小写十六进制）
+    md5: str
+
+    # 文件修改时间（ Unix 时间戳）
+    mtime: float
+
+
+def get_dir_prefix(name: str) -> str:
+    """获取文件所在的文件夹前缀
+
+    Args:
+        name: 基于根目录的文件路径
+
+    Returns:
+        以 '/' 结尾的文件夹路径，根目录为 ''
+
+    """
+
+    return name[:name.rfind('/') + 1]
+
+
+def parse_pack_key(name: str) -> Optional[str]:
+    """判断对象是否是打包对象或索引对象
+
+    Args:
+        name: 基于根目录的对象路径（不含 remote_prefix ）
+
+    Returns:
+        是的话返回所属文件夹前缀，否则返回 None
+
+    """
+
+    dir_prefix = get_dir_prefix(name)
+    if not dir_prefix.endswith(f'{pack_dir_name}/'):
+        return None
+
+    parent = dir_prefix[:-len(pack_dir_name) - 1]
+    return parent if parent == '' or parent.endswith('/') else None
+
+
+class PackIndex(object):
+    def __init__(self, dir_prefix: str, members: Optional[Dict[str, PackMember]] = None) -> None:
+        """初始化
+
+        Args:
+            dir_prefix: 文件夹前缀，以 '/' 结尾，根目录为 ''
+            members: 以文件路径为键的打包文件（可选）
+
+        """
+
+        self.dir_prefix: str = dir_prefix
+        self.members: Dict[str, PackMember] = members or {}
+
+    @property
+    def index_key(self) -> str:
+        """索引对象基于根目录的路径
+        """
+
+        return f'{self.dir_prefix}{pack_dir_name}/{index_name}'
+
+    def pack_key(self, pack: str) -> str:
+        """获取打包对象基于根目录的路径
+
+        Args:
+            pack: 打包对象名
+
+        Returns:
+            打包对象基于根目录的路径
+
+        """
+
+        return f'{self.dir_prefix}{pack_dir_name}/{pack}'
+
+    def pack_usage(self) -> Dict[str, int]:
+        """统计每个打包对象中仍被索引引用的文件占用的大小
+
+        每个文件在 tar 文件中占用一个头部块和补齐到块大小的内容，文件名很长时的扩展头部不计算在内
+
+        Returns:
+            以打包对象名为键的字节数
+        """
+
+        usage = {}
+        for member in self.members.values():
+            size = tarfile.BLOCKSIZE + (member.size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+            usage[member.pack] = usage.get(member.pack, 0) + size
+        return usage
+
+    def dumps(self) -> bytes:
+        """序列化索引
+
+        Returns:
+            JSON 格式的索引内容
+
+        """
+
+        return json.dumps({
+            'version': 1,
+            'members': {
+                posixpath.basename(member.name): [member.pack, member.offset, member.size, member.md5, member.mtime]
+                for member
+                in sorted(self.members.values())
+            },
+        }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def loads(cls, dir_prefix: str, data: bytes) -> 'PackIndex':
+        """反序列化索引
+
+        Args:
+            dir_prefix: 文件夹前缀
+            data: JSON 格式的索引内容
+
+        Returns:
+            索引
+
+        Raises:
+            ValueError: 索引格式不正确
+
+        """
+
+        try:
+            content = json.loads(data.decode('utf-8'))
+            members = {
+                f'{dir_prefix}{name}': PackMember(f'{dir_prefix}{name}', *fields)
+                for name, fields
+                in content['members'].items()
+            }
+        except (KeyError, TypeError, UnicodeDecodeError, json.JSONDecodeError) as err:
+            raise ValueError(f'打包索引格式不正确： {err}')
+
+        return cls(dir_prefix, members)
+
+
+def build_pack(files: Iterable[Tuple[str, bytes, float]]) -> Tuple[bytes, List[Tuple[str, int, int, str, float]]]:
+    """把文件打包为 tar 文件
+
+    Args:
+        files: (基于根目录的文件路径, 内容, 修改时间) 的序列，必须在同一个文件夹中
+
+    Returns:
+        (tar 文件内容, [(文件路径, 内容偏移量, 内容大小, 内容 MD5, 修改时间), ...])
+
+    """
+
+    buffer = io.BytesIO()
+    members = []
+
+    with tarfile.open(fileobj=buffer, mode='w', format=tarfile.PAX_FORMAT) as tar:
+        for name, data, mtime in files:
+            info = tarfile.TarInfo(posixpath.basename(name))
+            info.size = len(data)
+            info.mtime = int(mtime)
+            tar.addfile(info, io.BytesIO(data))
+
+            # addfile 修改的是 info 的副本，内容的位置由写入后的位置减去补齐到块大小的内容长度得到
+            offset = tar.offset - (len(data) + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+            members.append((name, offset, len(data), md5(data).hexdigest(), mtime))
+
+    return buffer.getvalue(), members
+
+
+def split_packs(sizes: Iterable[Tuple[str, int]], limit: int = pack_size) -> List[List[str]]:
+    """按大小把文件分到多个打包对象中
+
+    Args:
+        sizes: (文件路径, 大小) 的序列
+        limit: 单个打包对象的最大大小（字节）
+
+    Returns:
+        每个打包对象包含的文件路径列表
+
+    """
+
+    groups = []
+    current, current_size = [], 0
+    for name, size in sizes:
+        if current and current_size + size > limit:
+            groups.append(current)
+            current, current_size = [], 0
+        current.append(name)
+        current_size += size
+    if current:
+        groups.append(current)
+
+    return groups
+
+
+def merge_ranges(members: Iterable[PackMember], max_gap: int = range_gap) -> List[List[PackMember]]:
+    """把同一个打包对象中需要下载的文件合并为尽量少的范围
+
+    多下载一些间隔中的数据，通常比多发一次请求更快
+
+    Args:
+        members: 同一个打包对象中的文件
+        max_gap: 允许合并的最大间隔（字节）
+
+    Returns:
+        每次范围下载包含的文件列表，按偏移量排序
+
+    """
+
+    groups = []
+    end = 0
+    for member in sorted(members, key=lambda m: m.offset):
+        if groups and member.offset - end <= max_gap:
+            groups[-1].append(member)
+            end = max(end, member.offset + member.size)
+        else:
+            groups.append([member])
+            end = member.offset + member.size
+
+    return groups
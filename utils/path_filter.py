@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""路径过滤
+
+该模块定义了按 glob 规则筛选需要同步的文件和对象的类
+"""
+
+import fnmatch
+import logging
+import re
+from typing import List, NamedTuple, Optional, Pattern
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+# glob 中的特殊字符
+glob_chars: str = '*?['
+
+
+class FilterRule(NamedTuple):
+    """一条过滤规则
+    """
+
+    # 原始规则
+    pattern: str
+
+    # 编译后的正则表达式
+    regex: Pattern
+
+    # 是否只匹配文件夹（规则以 '/' 结尾）
+    dir_only: bool
+
+    # 是否从根目录开始匹配完整路径，否则匹配任意一级的文件或文件夹名
+    anchored: bool
+
+    # 规则开头不含 glob 特殊字符的部分，只对 anchored 规则有意义
+    literal_prefix: str
+
+
+class PathFilter(object):
+    def __init__(self, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None) -> None:
+        """初始化
+
+        规则使用 glob 语法，以 '/' 分隔路径，其中 '*' 也可以匹配 '/' ：
+
+        - 包含规则总是从根目录开始匹配完整路径，比如 'assets/' 、 'docs/*.md'
+        - 排除规则的匹配方式与 .gitignore 类似：不含 '/' （不计结尾的 '/' ）时匹配任意一级的文件或文件夹名，
+          比如 '*.tmp' 、 'node_modules' ，含有 '/' 时从根目录开始匹配完整路径，比如 'build/*.o' 、 '/dist'
+        - 规则以 '/' 结尾时只匹配文件夹，比如 'node_modules/'
+        - 规则匹配某个文件夹时，也就匹配了该文件夹下的所有内容
+
+        Args:
+            include: 包含规则（可选）。若指定，则只同步匹配其中至少一条规则的文件
+            exclude: 排除规则（可选）。匹配其中任意一条规则的文件不会被同步
+
+        """
+
+        self.include: List[FilterRule] = [self.parse_rule(p, anchored=True) for p in include or []]
+        self.exclude: List[FilterRule] = [self.parse_rule(p) for p in exclude or []]
+
+    @staticmethod
+    def parse_rule(pattern: str, anchored: Optional[bool] = None) -> FilterRule:
+        """解析过滤规则
+
+        Args:
+            pattern: glob 规则
+            anchored: 是否从根目录开始匹配（可选），默认根据规则中是否含有 '/' 判断
+
+        Returns:
+            解析后的规则
+
+        """
+
+        dir_only = pattern.endswith('/')
+        if anchored is None:
+            anchored = '/' in pattern.rstrip('/')
+        glob = pattern.strip('/')
+
+        # 不含特殊字符的文件夹规则只会匹配该文件夹下的内容
+        literal_prefix = f'{glob}/' if dir_only else glob
+        for i, char in enumerate(glob):
+            if char in glob_chars:
+                literal_prefix = glob[:i]
+                break
+
+        return FilterRule(
+            pattern=pattern,
+            regex=re.compile(fnmatch.translate(glob)),
+            dir_only=dir_only,
+            anchored=anchored,
+            literal_prefix=literal_prefix
+        )
+
+    @staticmethod
+    def match_rule(rule: FilterRule, path: str, is_dir: bool) -> bool:
+        """判断路径是否匹配规则
+
+        路径本身或它所在的任意一级文件夹匹配即视为匹配
+
+        Args:
+            rule: 规则
+            path: 基于根目录的路径
+            is_dir: 路径是否是文件夹
+
+        Returns:
+            是否匹配
+
+        """
+
+        parts = path.split('/')
+
+        for i in range(len(parts)):
+            # 最后一级是文件本身
+            if rule.dir_only and i == len(parts) - 1 and not is_dir:
+                break
+
+            target = '/'.join(parts[:i + 1]) if rule.anchored else parts[i]
+            if rule.regex.match(target):
+                return True
+
+        return False
+
+    def is_included(self, path: str) -> bool:
+        """判断文件或对象是否需要同步
+
+        Args:
+            path: 文件基于根目录的路径或对象 Key
+
+        Returns:
+            是否需要同步
+
+        """
+
+        if any(self.match_rule(rule, path, False) for rule in self.exclude):
+            return False
+
+        if not self.include:
+            return True
+
+        return any(self.match_rule(rule, path, False) for rule in self.include)
+
+    def is_pruned(self, dir_path: str) -> bool:
+        """判断遍历时是否可以跳过整个文件夹
+
+        文件夹被排除，或者其中不可能有文件匹配任何包含规则时可以跳过
+
+        Args:
+            dir_path: 文件夹基于根目录的路径
+
+        Returns:
+            是否可以跳过
+
+        """
+
+        if any(self.match_rule(rule, dir_path, True) for rule in self.exclude):
+            return True
+
+        if not self.include:
+            return False
+
+        dir_prefix = f'{dir_path}/'
+        for rule in self.include:
+            # 文件夹在规则的固定前缀之下，或者规则的固定前缀在文件夹之下
+            if dir_prefix.startswith(rule.literal_prefix) or rule.literal_prefix.startswith(dir_prefix):
+                return False
+
+        return True
+
+    def list_prefixes(self) -> List[str]:
+        """获取列出对象时可用的 Key 前缀
+
+        把包含规则的固定前缀用于列出对象，从而不必列出整个 Bucket
+
+        Returns:
+            Key 前缀列表，互相之间不会重叠。不能缩小范围时返回 ['']
+
+        """
+
+        if not self.include:
+            return ['']
+
+        prefixes = []
+        for prefix in sorted({rule.literal_prefix for rule in self.include}):
+            # 已经被更短的前缀覆盖
+            if prefixes and prefix.startswith(prefixes[-1]):
+                continue
+            prefixes.append(prefix)
+
+        return prefixes
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""同步进度
+
+该模块定义了汇总同步进度并定期输出的类
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+def format_size(size: float) -> str:
+    """格式化字节数
+
+    Args:
+        size: 字节数
+
+    Returns:
+        带单位的字符串，比如 '1.5 MiB'
+
+    """
+
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if abs(size) < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TiB'
+
+
+def format_duration(seconds: float) -> str:
+    """格式化时长
+
+    Args:
+        seconds: 秒数
+
+    Returns:
+        比如 '1:02:03'
+
+    """
+
+    seconds = int(seconds)
+    return f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+
+class ProgressReporter(object):
+    def __init__(self, total_items: int, interval: float = 0) -> None:
+        """初始化
+
+        各线程只更新计数器，由一个后台线程定期汇总输出，不会为每个文件输出一行日志
+
+        Args:
+            total_items: 同步列表的总项数
+            interval: 输出进度的间隔（秒），小于等于 0 时只在结束时输出汇总
+
+        """
+
+        self.total_items: int = total_items
+        self.interval: float = interval
+
+        self._lock: threading.Lock = threading.Lock()
+        self._stop_event: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_time: float = time.monotonic()
+
+        # 已检查的项数和其中无需同步的项数
+        self.checked: int = 0
+        self.skipped: int = 0
+
+        # 产生的任务数和字节数
+        self.tasks: int = 0
+        self.task_bytes: int = 0
+
+        # 已完成的任务数、字节数和失败的任务数
+        self.done: int = 0
+        self.done_bytes: int = 0
+        self.failed: int = 0
+
+        # 从开始到结束的用时（秒），结束时记录
+        self.elapsed: float = 0
+
+    def start(self) -> None:
+        """开始定期输出进度
+        """
+
+        self._start_time = time.monotonic()
+
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='progress', daemon=True)
+            self._thread.start()
+
+    def stop(self, summary: bool = True) -> None:
+        """停止输出进度并输出汇总
+
+        Args:
+            summary: 是否输出汇总，默认为 True
+
+        """
+
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        self.elapsed = time.monotonic() - self._start_time
+        if summary:
+            logger.info(
+                f'同步完成：共 {self.total_items} 项，跳过 {self.skipped} 项，'
+                f'执行 {self.done} 个任务（失败 {self.failed} 个），'
+                f'传输 {format_size(self.done_bytes)}，用时 {format_duration(self.elapsed)}'
+            )
+
+    def add_checked(self, skipped: bool) -> None:
+        """记录检查了一项
+
+        Args:
+            skipped: 该项是否无需同步
+
+        """
+
+        with self._lock:
+            self.checked += 1
+            if skipped:
+                self.skipped += 1
+
+    def add_task(self, size: int) -> None:
+        """记录产生了一个任务
+
+        Args:
+            size: 任务需要传输的字节数
+
+        """
+
+        with self._lock:
+            self.tasks += 1
+            self.task_bytes += size
+
+    def add_done(self, size: int, ok: bool) -> None:
+        """记录完成了一个任务
+
+        Args:
+            size: 任务传输的字节数
+            ok: 是否成功
+
+        """
+
+        with self._lock:
+            self.done += 1
+            self.done_bytes += size
+            if not ok:
+                self.failed += 1
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.report()
+
+    def report(self) -> None:
+        """输出当前进度
+        """
+
+        with self._lock:
+            checked, tasks, task_bytes = self.checked, self.tasks, self.task_bytes
+            done, done_bytes, failed = self.done, self.done_bytes, self.failed
+
+        elapsed = max(time.monotonic() - self._start_time, 1e-6)
+        files_rate = done / elapsed
+        bytes_rate = done_bytes / elapsed
+
+        # 优先按字节估计剩余时间，没有字节传输时按任务数估计。检查未完成时任务总数还会增加，只是粗略估计
+        if bytes_rate > 0 and task_bytes > done_bytes:
+            eta = format_duration((task_bytes - done_bytes) / bytes_rate)
+        elif files_rate > 0:
+            eta = format_duration((tasks - done) / files_rate)
+        else:
+            eta = '未知'
+
+        logger.info(
+            f'进度：已检查 {checked}/{self.total_items} 项，已完成 {done}/{tasks} 个任务（失败 {failed} 个），'
+            f'{files_rate:.1f} 个/秒，{format_size(bytes_rate)}/s，预计剩余 {eta}'
+        )
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+"""同步计划
+
+该模块定义了试运行（ --dry-run ）得到的同步计划，可以保存到文件，之后不再检查直接执行
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from oss import ObjectInfo
+from .progress import format_size
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+class PlanEntry(NamedTuple):
+    """计划中的一个任务
+    """
+
+    # 操作，同 SyncTask.action
+    action: str
+
+    # 文件名或对象 Key
+    name: str
+
+    # 变更类型： '+' （新增）、 'M' （修改）或 '-' （删除）
+    tag: str
+
+    # 估计需要传输的字节数
+    size: int
+
+    # 复制操作的源对象 Key 或本地文件名，从打包对象下载时为打包对象 Key
+    source: Optional[str] = None
+
+    # 下载或桶间同步时的源对象信息，追加上传时为已有的对象信息
+    obj: Optional[ObjectInfo] = None
+
+
+class SyncPlan(object):
+    def __init__(self, direction: str, created: Optional[float] = None) -> None:
+        """初始化
+
+        Args:
+            direction: 同步方向， 'local-to-remote' 、 'remote-to-local' 或 'remote-to-remote'
+            created: 生成计划的时间（ Unix 时间戳，可选），默认为当前时间
+
+        """
+
+        self.direction: str = direction
+        self.created: float = time.time() if created is None else created
+
+        self.entries: List[PlanEntry] = []
+
+        # 估计的上传和下载字节数，桶间同步时数据经过本机，两者都计入
+        self.upload_bytes: int = 0
+        self.download_bytes: int = 0
+
+        # 以 API 名称为键的请求数
+        self.requests: Dict[str, int] = {}
+
+        self._lock: threading.Lock = threading.Lock()
+        self._groups: Set[str] = set()
+
+    def add(
+            self,
+            entry: PlanEntry,
+            requests: Dict[str, int],
+            upload: int = 0,
+            download: int = 0,
+            group: Optional[str] = None
+    ) -> None:
+        """记录一个任务
+
+        Args:
+            entry: 任务
+            requests: 执行该任务需要的请求数，以 API 名称为键
+            upload: 上传的字节数
+            download: 下载的字节数
+            group: 任务所属的组（可选）。同一组的任务共用请求（比如同一个文件夹的打包任务），请求只计算一次
+
+        """
+
+        with self._lock:
+            self.entries.append(entry)
+            self.upload_bytes += upload
+            self.download_bytes += download
+
+            if group is not None:
+                if group in self._groups:
+                    return
+                self._groups.add(group)
+
+            for api, count in requests.items():
+                self.requests[api] = self.requests.get(api, 0) + count
+
+    def count_changes(self) -> Dict[str, int]:
+        """按变更类型统计任务数
+
+        Returns:
+            以变更类型（ '+' 、 'M' 、 '-' ）为键的任务数
+        """
+
+        changes = {'+': 0, 'M': 0, '-': 0}
+        for entry in self.entries:
+            changes[entry.tag] = changes.get(entry.tag, 0) + 1
+        return changes
+
+    def format_summary(self) -> str:
+        """格式化计划的汇总
+
+        Returns:
+            比如 '新增 3 项，修改 1 项，删除 0 项，上传 1.0 MiB，下载 0.0 B，请求 PutObject 4'
+
+        """
+
+        changes = self.count_changes()
+        requests = '，'.join(f'{api} {count}' for api, count in sorted(self.requests.items())) or '无'
+        return (
+            f'新增 {changes["+"]} 项，修改 {changes["M"]} 项，删除 {changes["-"]} 项，'
+            f'上传 {format_size(self.upload_bytes)}，下载 {format_size(self.download_bytes)}，请求 {requests}'
+        )
+
+    def to_dict(self) -> Dict:
+        """转换为可以序列化为 JSON 的字典
+        """
+
+        return {
+            'direction': self.direction,
+            'created': self.created,
+            'upload_bytes': self.upload_bytes,
+            'download_bytes': self.download_bytes,
+            'requests': self.requests,
+            'entries': [
+                [
+                    entry.action,
+                    entry.name,
+                    entry.tag,
+                    entry.size,
+                    entry.source,
+                    list(entry.obj) if entry.obj is not None else None,
+                ]
+                for entry
+                in self.entries
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, content: Dict) -> 'SyncPlan':
+        """从 to_dict 的结果还原
+
+        Args:
+            content: to_dict 返回的字典
+
+        Returns:
+            同步计划
+
+        Raises:
+            ValueError: 格式不正确
+
+        """
+
+        try:
+            plan = cls(content['direction'], float(content['created']))
+            plan.upload_bytes = int(content['upload_bytes'])
+            plan.download_bytes = int(content['download_bytes'])
+            plan.requests = {str(api): int(count) for api, count in content['requests'].items()}
+            plan.entries = [
+                PlanEntry(action, name, tag, int(size), source, ObjectInfo(*obj) if obj is not None else None)
+                for action, name, tag, size, source, obj
+                in content['entries']
+            ]
+        except (KeyError, TypeError, ValueError, AttributeError) as err:
+            raise ValueError(f'同步计划格式不正确： {err}')
+
+        return plan
+
+
+def dump_plans(plans: Dict[str, SyncPlan], path: str) -> None:
+    """把多个同步单元的计划保存到文件
+
+    Args:
+        plans: 以同步单元描述为键的计划
+        path: 文件路径
+
+    """
+
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({
+            'version': 1,
+            'units': {unit: plan.to_dict() for unit, plan in plans.items()},
+        }, file, ensure_ascii=False)
+
+
+def load_plans(path: str) -> Dict[str, SyncPlan]:
+    """从文件加载 dump_plans 保存的计划
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        以同步单元描述为键的计划
+
+    Raises:
+        OSError: 读取文件失败
+        ValueError: 格式不正确
+
+    """
+
+    with open(path, 'r', encoding='utf-8') as file:
+        try:
+            content = json.load(file)
+        except json.JSONDecodeError as err:
+            raise ValueError(f'同步计划格式不正确： {err}')
+
+    if not isinstance(content, dict) or content.get('version') != 1 or not isinstance(content.get('units'), dict):
+        raise ValueError('同步计划格式不正确或版本不支持')
+
+    return {unit: SyncPlan.from_dict(plan) for unit, plan in content['units'].items()}
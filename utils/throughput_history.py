@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""同步速度记录
+
+该模块定义了记录每个同步单元最近几次同步速度的类，试运行时据此估计执行同步计划的用时
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+
+logger: logging.Logger = logging.getLogger(f'oss_sync.{__name__}')
+
+
+class ThroughputRecord(NamedTuple):
+    """一次同步的记录
+    """
+
+    # 同步结束的时间（ Unix 时间戳）
+    time: float
+
+    # 同步方向，见 SyncPlan
+    direction: str
+
+    # 执行的任务数
+    tasks: int
+
+    # 传输的字节数
+    size: int
+
+    # 同步用时（秒）
+    seconds: float
+
+
+class ThroughputEstimate(NamedTuple):
+    """用时估计
+    """
+
+    # 预计用时（秒）
+    seconds: float
+
+    # 参考的同步次数
+    runs: int
+
+    # 是否参考了其它同步单元（当前同步单元没有记录时，参考同方向的其它同步单元）
+    fallback: bool
+
+
+class ThroughputHistory(object):
+    def __init__(self, path: str, max_records: int = 20) -> None:
+        """初始化
+
+        记录保存在 JSON 文件中，文件不存在或格式不正确时从空记录开始
+
+        Args:
+            path: 记录文件路径
+            max_records: 每个同步单元保留的最近记录数
+
+        """
+
+        self.path: str = path
+        self.max_records: int = max_records
+
+        # 以同步单元描述为键的记录，按时间顺序
+        self.units: Dict[str, List[ThroughputRecord]] = {}
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                content = json.load(file)
+            self.units = {
+                unit: [ThroughputRecord(*record) for record in records]
+                for unit, records
+                in content['units'].items()
+            }
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as err:
+            logger.warning(f'读取同步速度记录 "{self.path}" 失败，将重新记录： {err}')
+
+    def record(self, unit: str, direction: str, tasks: int, size: int, seconds: float) -> None:
+        """记录一次同步并保存到文件
+
+        没有执行任务的同步不能反映速度，不记录
+
+        Args:
+            unit: 同步单元描述
+            direction: 同步方向
+            tasks: 执行的任务数
+            size: 传输的字节数
+            seconds: 同步用时（秒）
+
+        """
+
+        if tasks <= 0 or seconds <= 0:
+            return
+
+        records = self.units.setdefault(unit, [])
+        records.append(ThroughputRecord(time.time(), direction, tasks, size, seconds))
+        del records[:-self.max_records]
+
+        # 先写临时文件再替换，中断时不会留下不完整的记录
+        temp_path = f'{self.path}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({'units': self.units}, file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as err:
+            logger.warning(f'保存同步速度记录 "{self.path}" 失败： {err}')
+
+    def estimate(self, unit: str, direction: str, tasks: int, size: int) -> Optional[ThroughputEstimate]:
+        """估计执行指定数量的任务、传输指定字节数的用时
+
+        分别按记录中平均每秒完成的任务数和字节数估计，取较长的一个：
+        小文件多时受请求数限制，大文件多时受带宽限制
+
+        Args:
+            unit: 同步单元描述
+            direction: 同步方向
+            tasks: 任务数
+            size: 字节数
+
+        Returns:
+            用时估计，没有可以参考的记录时为 None
+
+        """
+
+        records = self.units.get(unit, [])
+        fallback = not records
+        if fallback:
+            records = [
+                record
+                for records in self.units.values()
+                for record in records
+                if record.direction == direction
+            ]
+        if not records:
+            return None
+
+        total_seconds = sum(record.seconds for record in records)
+        tasks_rate = sum(record.tasks for record in records) / total_seconds
+        bytes_rate = sum(record.size for record in records) / total_seconds
+
+        seconds = max(tasks / tasks_rate, size / bytes_rate if bytes_rate > 0 else 0)
+        return ThroughputEstimate(seconds, len(records), fallback)